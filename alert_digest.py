@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Per-recipient coalescing of queued alerts into digest messages
+
+During a heat wave a subscriber can have a weather, a forecast and an
+admin alert queued within minutes, each a separate send under Telegram's
+rate limit. The dispatcher sends each recipient one message covering
+every released alert that reaches them, and can hold non-urgent alerts
+for ALERT_DIGEST_WINDOW seconds so that more of them share a digest. The
+window is off by default: an operator's alert shouldn't sit for a minute
+unless the deployment asked for it. Recipients with the same
+set of alerts share one rendered text. Digests are split into parts at
+alert boundaries to stay under Telegram's 4096-character limit.
+
+Alerts whose severity is in URGENT_SEVERITIES skip the window and go out
+on their own straight away. Scheduled alerts (deliver_at) have waited
+already and skip the window too.
+"""
+
+import os
+from datetime import datetime
+
+ALERT_DIGEST_WINDOW = float(os.getenv('ALERT_DIGEST_WINDOW', 0))
+URGENT_SEVERITIES = {'high', 'extreme'}
+# Telegram's limit on the text of one message
+MAX_MESSAGE_LENGTH = 4096
+
+
+def is_urgent(alert):
+    return alert.get('severity') in URGENT_SEVERITIES
+
+
+def release_at(alert, window=ALERT_DIGEST_WINDOW):
+    """When the dispatcher may send an alert (urgent and scheduled alerts: as soon as queued)"""
+    queued_at = datetime.fromisoformat(alert['timestamp']).timestamp()
+    return queued_at if is_urgent(alert) or alert.get('deliver_at') else queued_at + window
+
+
+def format_alert(alert, now=None):
+    """The message for a single alert"""
+    now = now or datetime.now()
+    return (
+        f"🚨 WEATHER ALERT\n\n"
+        f"{alert['message']}\n\n"
+        f"📍 {alert['taluka'] or 'All talukas'}, {alert['district']}\n"
+        f"🕒 {now.strftime('%Y-%m-%d %H:%M')}"
+    )
+
+
+def _truncate(text, limit):
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def format_digest(alerts, now=None, limit=MAX_MESSAGE_LENGTH):
+    """Message texts (one or more parts, each within `limit`) covering several alerts"""
+    if len(alerts) == 1:
+        return [_truncate(format_alert(alerts[0], now), limit)]
+    now = now or datetime.now()
+    header = f"🚨 {len(alerts)} WEATHER ALERTS"
+    footer = f"🕒 {now.strftime('%Y-%m-%d %H:%M')}"
+    sections = [
+        f"{i}. 📍 {alert['taluka'] or 'All talukas'}, {alert['district']}\n{alert['message']}"
+        for i, alert in enumerate(alerts, start=1)
+    ]
+
+    # Room left for sections once the header (with a part number) and footer are added
+    room = limit - len(header) - len(' (99/99)') - len(footer) - 4
+    parts, current = [], []
+    for section in sections:
+        section = _truncate(section, room)
+        if current and len('\n\n'.join(current + [section])) > room:
+            parts.append(current)
+            current = []
+        current.append(section)
+    parts.append(current)
+
+    texts = []
+    for n, part in enumerate(parts, start=1):
+        title = header if len(parts) == 1 else f"{header} ({n}/{len(parts)})"
+        texts.append('\n\n'.join([title] + part + [footer]))
+    return texts
+
+
+def group_by_recipient(alerts, recipients):
+    """{alert indices: [user ids]} so that users with the same alerts share one digest
+
+    `recipients[i]` is the set of users alerts[i] reaches. Indices are in
+    queue order.
+    """
+    per_user = {}
+    for i, users in enumerate(recipients):
+        for user_id in users:
+            per_user.setdefault(user_id, []).append(i)
+    groups = {}
+    for user_id, indices in per_user.items():
+        groups.setdefault(tuple(indices), []).append(user_id)
+    return groups
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Deduplication, hysteresis and escalation for (area, alert type) pairs
+
+Without this, the same "HIGH TEMPERATURE" alert for a taluka can be queued
+on every check or every admin click, and each one is a full fan-out. State
+is one small list per (area, alert type) in the shared backend (see
+Backend.get_alert_states), so all web and bot nodes see the same episodes:
+
+    [active, level, entered_at, sent_at, sent_level]
+
+- Hysteresis: observe() opens an episode when a reading reaches its enter
+  threshold and closes it only once the reading is ALERT_HYSTERESIS back on
+  the safe side (enter at 40 °C, clear below 38 °C), so readings hovering
+  around a threshold don't start new episodes.
+- Cooldown: claim() allows one alert per episode, plus a reminder every
+  ALERT_COOLDOWN seconds while the episode lasts. If the claimed alert
+  can't be queued, rollback() undoes the claim.
+- Escalation: a higher severity than the one already sent goes out at once.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ALERT_COOLDOWN = float(os.getenv('ALERT_COOLDOWN', 6 * 3600))
+ALERT_HYSTERESIS = float(os.getenv('ALERT_HYSTERESIS', 2.0))
+
+SEVERITY_LEVELS = ('low', 'medium', 'high', 'extreme')
+
+# value rising to `enter` is dangerous (heat) unless rising=False (cold)
+Reading = namedtuple('Reading', 'district taluka alert_type value enter severity rising')
+Reading.__new__.__defaults__ = ('medium', True)
+
+
+def severity_rank(severity):
+    return SEVERITY_LEVELS.index(severity) if severity in SEVERITY_LEVELS else 1
+
+
+def alert_key(district, taluka, alert_type):
+    return f"{alert_type}|{district}_{taluka or '*'}"
+
+
+class AlertEngine:
+    """Decides which alerts are worth a fan-out"""
+
+    def __init__(self, backend=None, cooldown=ALERT_COOLDOWN, hysteresis=ALERT_HYSTERESIS):
+        self._backend = backend
+        self.cooldown = cooldown
+        self.hysteresis = hysteresis
+        self._lock = threading.Lock()
+        # key -> (state before the last claim, its claim id) for rollback()
+        self._claimed = {}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            from shared_data import get_backend
+            self._backend = get_backend()
+        return self._backend
+
+    def observe(self, readings, now=None):
+        """Open and close episodes from the latest readings; returns keys that opened"""
+        now = int(now or time.time())
+        readings = {alert_key(r.district, r.taluka, r.alert_type): r for r in readings}
+        opened = []
+        with self._lock:
+            states = self.backend.get_alert_states(readings)
+            changes = {}
+            for key, reading in readings.items():
+                state = states.get(key)
+                sign = 1 if reading.rising else -1
+                excess = sign * (reading.value - reading.enter)
+                rank = severity_rank(reading.severity)
+
+                if state and state[0]:
+                    if excess < -self.hysteresis:
+                        # Cleared; forget the area unless its cooldown still matters
+                        changes[key] = [0] + state[1:] if now - state[3] < self.cooldown else None
+                    elif rank > state[1]:
+                        changes[key] = [1, rank] + state[2:]
+                elif excess >= 0:
+                    sent_at, sent_level = (state[3], state[4]) if state else (0, -1)
+                    changes[key] = [1, rank, now, sent_at, sent_level]
+                    opened.append(key)
+
+            if changes:
+                self.backend.set_alert_states(changes)
+        return opened
+
+    def claim(self, district, taluka, alert_type, severity='medium', force=False, now=None):
+        """Whether an alert should be queued now; if so it is recorded as sent
+
+        Areas with no open episode (e.g. a manual alert nobody measured)
+        start one now. force=True skips the cooldown check.
+        """
+        now = int(now or time.time())
+        key = alert_key(district, taluka, alert_type)
+        rank = severity_rank(severity)
+        with self._lock:
+            stored = state = self.backend.get_alert_states([key]).get(key)
+            if not state or not state[0]:
+                state = [1, rank, now, 0, -1]
+            active, level, entered_at, sent_at, sent_level = state
+
+            recently_sent = sent_at >= entered_at and now - sent_at < self.cooldown
+            if not recently_sent:
+                sent_level = -1
+            if not force and rank <= sent_level:
+                metrics.ALERT_SUPPRESSED.labels(alert_type).inc()
+                logger.info(f"🔕 Suppressed {alert_type} for {district} -> {taluka} "
+                            f"(sent {(now - sent_at) // 60} min ago)")
+                return False
+
+            # Other nodes share the state but may decide at the same moment
+            claim_id = None
+            if not force:
+                from shared_data import claim_alert
+                claim_id = f"engine:{key}:{rank}:{entered_at}:{int(now // self.cooldown)}"
+                if not claim_alert(claim_id, 'alert-engine', ttl=int(self.cooldown)):
+                    metrics.ALERT_SUPPRESSED.labels(alert_type).inc()
+                    return False
+
+            self._claimed[key] = (stored, claim_id)
+            self.backend.set_alert_states({key: [1, max(level, rank), entered_at, now, max(sent_level, rank)]})
+            return True
+
+    def rollback(self, district, taluka, alert_type):
+        """Undo this process's last claim() for an area and type (its alert wasn't queued)"""
+        key = alert_key(district, taluka, alert_type)
+        with self._lock:
+            if key not in self._claimed:
+                return
+            state, claim_id = self._claimed.pop(key)
+            self.backend.set_alert_states({key: state})
+            if claim_id:
+                from shared_data import release_claim
+                release_claim(claim_id, 'alert-engine')
+
+    def last_sent(self, district, taluka, alert_type):
+        """Epoch seconds of the last alert sent for this area and type (0 if none)"""
+        key = alert_key(district, taluka, alert_type)
+        state = self.backend.get_alert_states([key]).get(key)
+        return state[3] if state else 0
+
+
+_engine = None
+
+
+def get_alert_engine():
+    """Process-wide AlertEngine on the shared backend"""
+    global _engine
+    if _engine is None:
+        _engine = AlertEngine()
+    return _engine
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Severity-aware ordering of alert sends
+
+The dispatcher used to send alerts one after another in queue order, so a
+high-severity alert for a 200-person taluka could wait an hour behind a
+50,000-recipient routine advisory. It now splits every alert (or digest,
+see alert_digest.py) into one job per recipient and asks a
+PriorityScheduler which job to send next:
+
+- Classes: each alert is 'urgent' (high/extreme severity), 'normal'
+  (medium, or no severity) or 'routine' (low).
+- Weighted fair sharing: flows are served by weighted fair queueing over
+  virtual time, so with the default weights an urgent flow gets 16 sends
+  for every routine send and large fan-outs are interleaved rather than
+  run to completion one at a time.
+- Deadlines: every alert must be delivered within its class's deadline
+  (or its own 'deadline' field). A flow that can only just finish in time
+  at ALERT_SEND_INTERVAL per send goes ahead of the fair order, earliest
+  deadline first. It never jumps a more urgent class, so a late routine
+  advisory cannot hold up urgent alerts. A flow already past its deadline
+  is served in the fair order again, so one hopeless flow can't starve
+  the rest.
+
+Picking a job is O(log flows): heaps hold the fair order, the time each
+flow becomes at risk, and the at-risk flows of each class by deadline.
+Entries go stale when a flow is served and are skipped when they surface.
+"""
+
+import os
+import time
+import heapq
+import itertools
+from collections import deque
+from datetime import datetime
+
+PRIORITY_CLASSES = ('urgent', 'normal', 'routine')
+SEVERITY_CLASSES = {'extreme': 'urgent', 'high': 'urgent', 'medium': 'normal', 'low': 'routine'}
+
+# class:value pairs
+ALERT_CLASS_WEIGHTS = os.getenv('ALERT_CLASS_WEIGHTS', 'urgent:16,normal:4,routine:1')
+ALERT_CLASS_DEADLINES = os.getenv('ALERT_CLASS_DEADLINES', 'urgent:300,normal:1800,routine:7200')
+
+
+def parse_class_values(spec):
+    """{class: float} from a 'class:value,...' string"""
+    values = {}
+    for item in spec.split(','):
+        name, value = item.strip().split(':')
+        if name not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown alert class {name!r} in {spec!r}")
+        values[name] = float(value)
+    missing = set(PRIORITY_CLASSES) - set(values)
+    if missing:
+        raise ValueError(f"No value for alert class(es) {', '.join(sorted(missing))} in {spec!r}")
+    return values
+
+
+CLASS_WEIGHTS = parse_class_values(ALERT_CLASS_WEIGHTS)
+CLASS_DEADLINES = parse_class_values(ALERT_CLASS_DEADLINES)
+
+
+def priority_class(alert):
+    return SEVERITY_CLASSES.get(alert.get('severity'), 'normal')
+
+
+def alert_deadline(alert, now=None, deadlines=CLASS_DEADLINES):
+    """Epoch seconds by which the alert should have reached everyone
+
+    The alert's own 'deadline' (ISO time) if it has one, else its class
+    deadline after it was queued (or after `now` if it has no timestamp).
+    """
+    try:
+        if alert.get('deadline'):
+            return datetime.fromisoformat(alert['deadline']).timestamp()
+        queued_at = datetime.fromisoformat(alert['timestamp']).timestamp()
+    except (KeyError, ValueError):
+        queued_at = now if now is not None else time.time()
+    return queued_at + deadlines[priority_class(alert)]
+
+
+class Flow:
+    """The remaining jobs of one alert or digest"""
+
+    def __init__(self, key, priority, deadline, jobs, weight, start_tag, order=0):
+        self.key = key
+        self.priority = priority
+        self.deadline = deadline
+        self.jobs = deque(jobs)
+        self.weight = weight
+        # Virtual finish time of the next job
+        self.tag = start_tag + 1 / weight
+        # Breaks ties between flows: the one added first goes first
+        self.order = order
+        # In its class's at-risk heap
+        self.at_risk = False
+
+    def __len__(self):
+        return len(self.jobs)
+
+
+class PriorityScheduler:
+    """Picks the next job across flows (see the module docstring)
+
+    send_interval is the expected seconds per job, used to tell when a
+    flow can only just meet its deadline.
+    """
+
+    def __init__(self, send_interval=0.1, weights=CLASS_WEIGHTS):
+        self.send_interval = send_interval
+        self.weights = weights
+        self.virtual_time = 0.0
+        self._jobs = 0
+        self._order = itertools.count()
+        # Heap entries end with (flow order, push order, flow)
+        # (tag, ...): fair order
+        self._fair = []
+        # (risk time, ...): when each flow not yet at risk will be
+        self._slack = []
+        # class -> [(deadline, tag, ...)]: at-risk flows, earliest deadline first
+        self._at_risk = {name: [] for name in PRIORITY_CLASSES}
+
+    def _risk_time(self, flow):
+        """When the flow's remaining jobs only just fit before its deadline"""
+        return flow.deadline - len(flow) * self.send_interval
+
+    def _entry(self, flow):
+        return (flow.order, next(self._order), flow)
+
+    def _push(self, flow):
+        heapq.heappush(self._fair, (flow.tag, *self._entry(flow)))
+        if flow.at_risk:
+            heapq.heappush(self._at_risk[flow.priority], (flow.deadline, flow.tag, *self._entry(flow)))
+        else:
+            heapq.heappush(self._slack, (self._risk_time(flow), *self._entry(flow)))
+
+    def add(self, key, priority, deadline, jobs):
+        """Add a flow of jobs; returns it (None if there are no jobs)"""
+        if not jobs:
+            return None
+        # A new flow starts at the current virtual time, with no credit for the past
+        flow = Flow(key, priority, deadline, jobs, self.weights[priority], self.virtual_time, next(self._order))
+        self._jobs += len(flow)
+        self._push(flow)
+        return flow
+
+    def __len__(self):
+        return self._jobs
+
+    def _most_urgent(self, priority, now):
+        """Earliest-deadline at-risk flow of the class, or None
+
+        Drops stale entries, flows past their deadline (back to fair share
+        only) and flows served ahead of time (back to waiting to be at risk).
+        """
+        heap = self._at_risk[priority]
+        while heap:
+            deadline, tag, flow = heap[0][0], heap[0][1], heap[0][-1]
+            if flow.jobs and tag == flow.tag and self._risk_time(flow) <= now < deadline:
+                return heap[0]
+            heapq.heappop(heap)
+            if not flow.jobs or tag != flow.tag:
+                continue
+            flow.at_risk = False
+            if now < deadline:
+                heapq.heappush(self._slack, (self._risk_time(flow), *self._entry(flow)))
+        return None
+
+    def next(self, now):
+        """(flow, job) to send next, or None when every flow is done"""
+        while self._fair and (not self._fair[0][-1].jobs or self._fair[0][0] != self._fair[0][-1].tag):
+            heapq.heappop(self._fair)
+        if not self._fair:
+            return None
+        flow = self._fair[0][-1]
+
+        # Flows whose risk time has come join their class's at-risk heap
+        while self._slack and self._slack[0][0] <= now:
+            entry = heapq.heappop(self._slack)
+            risk_time, waiting = entry[0], entry[-1]
+            if waiting.jobs and not waiting.at_risk and risk_time == self._risk_time(waiting) \
+                    and now < waiting.deadline:
+                waiting.at_risk = True
+                heapq.heappush(self._at_risk[waiting.priority],
+                               (waiting.deadline, waiting.tag, *self._entry(waiting)))
+
+        rank = PRIORITY_CLASSES.index(flow.priority)
+        urgent = [entry for entry in (self._most_urgent(name, now) for name in PRIORITY_CLASSES[:rank + 1])
+                  if entry is not None]
+        if urgent:
+            flow = min(urgent)[-1]
+
+        job = flow.jobs.popleft()
+        self._jobs -= 1
+        self.virtual_time = max(self.virtual_time, flow.tag - 1 / flow.weight)
+        flow.tag += 1 / flow.weight
+        if flow.jobs:
+            self._push(flow)
+        return flow, job
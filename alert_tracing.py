@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Alert lifecycle tracing and time-to-deliver reports
+
+Every alert passes through four stages:
+  queued     - queue_alert() writes it (the alert's 'timestamp' field)
+  picked up  - process_pending_alerts() starts working on it
+  first send - first subscriber message delivered
+  last send  - last subscriber message delivered
+
+The bot appends one trace per processed alert to alert_traces.jsonl.
+Run `python alert_tracing.py report` for p50/p95/p99 latency tables.
+
+A trace keeps its per-recipient send durations as counts in fixed
+SEND_MS_BUCKETS, so a 50,000-recipient alert is still one short line.
+Send percentiles are read off the merged buckets (a bucket's upper bound,
+at most the slowest send). Once the file passes ALERT_TRACES_MAX_BYTES it
+is moved to alert_traces.jsonl.1, replacing the previous one, and
+load_traces parses only the lines appended since its last call.
+"""
+
+import os
+import sys
+import json
+import bisect
+import math
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+ALERT_TRACES_FILE = 'alert_traces.jsonl'
+ALERT_TRACES_MAX_BYTES = int(os.getenv('ALERT_TRACES_MAX_BYTES', 10 * 1024 * 1024))
+
+# Upper bounds (ms) of the send duration buckets; one more counts slower sends
+SEND_MS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Upper bounds (recipients) of the area size buckets used in reports
+AREA_SIZE_BUCKETS = [
+    (10, '1-10'),
+    (100, '11-100'),
+    (1000, '101-1k'),
+    (10000, '1k-10k'),
+]
+AREA_SIZE_LARGEST = '10k+'
+
+
+def area_size_bucket(recipients):
+    """Get the report bucket for an alert with this many recipients"""
+    if recipients <= 0:
+        return '0'
+    for upper, label in AREA_SIZE_BUCKETS:
+        if recipients <= upper:
+            return label
+    return AREA_SIZE_LARGEST
+
+
+class AlertTrace:
+    """Timestamps and per-recipient send durations for one alert"""
+
+    def __init__(self, alert, picked_up_at=None):
+        self.alert_id = alert.get('id', '')
+        self.type = alert.get('type', 'custom')
+        self.district = alert.get('district')
+        self.taluka = alert.get('taluka')
+        self.queued_at = alert.get('timestamp')
+        self.picked_up_at = (picked_up_at or datetime.now()).isoformat()
+        self.first_sent_at = None
+        self.last_sent_at = None
+        self.recipients = 0
+        self.sent = 0
+        self.failed = 0
+        self.send_ms_buckets = [0] * (len(SEND_MS_BUCKETS) + 1)
+        self.send_ms_max = None
+
+    def record_send(self, duration, success=True):
+        """Record one recipient's send (duration in seconds)"""
+        duration_ms = round(duration * 1000, 1)
+        self.send_ms_buckets[bisect.bisect_left(SEND_MS_BUCKETS, duration_ms)] += 1
+        self.send_ms_max = max(self.send_ms_max or 0, duration_ms)
+        if success:
+            now = datetime.now().isoformat()
+            if self.first_sent_at is None:
+                self.first_sent_at = now
+            self.last_sent_at = now
+            self.sent += 1
+        else:
+            self.failed += 1
+
+    def to_dict(self):
+        return {
+            'alert_id': self.alert_id,
+            'type': self.type,
+            'district': self.district,
+            'taluka': self.taluka,
+            'recipients': self.recipients,
+            'sent': self.sent,
+            'failed': self.failed,
+            'queued_at': self.queued_at,
+            'picked_up_at': self.picked_up_at,
+            'first_sent_at': self.first_sent_at,
+            'last_sent_at': self.last_sent_at,
+            'send_ms_buckets': self.send_ms_buckets,
+            'send_ms_max': self.send_ms_max,
+        }
+
+    def save(self):
+        """Append this trace to the traces file, rotating it when full"""
+        try:
+            with open(ALERT_TRACES_FILE, 'a') as f:
+                f.write(json.dumps(self.to_dict()) + '\n')
+                full = f.tell() >= ALERT_TRACES_MAX_BYTES
+            if full:
+                try:
+                    os.replace(ALERT_TRACES_FILE, ALERT_TRACES_FILE + '.1')
+                except FileNotFoundError:
+                    # Another process rotated it first
+                    pass
+            return True
+        except Exception as e:
+            logger.error(f"Error saving alert trace {self.alert_id}: {e}")
+            return False
+
+
+_parsed_lock = threading.Lock()
+# path -> (inode, bytes parsed, traces)
+_parsed = {}
+
+
+def _read_traces(path):
+    """Every trace in the file, parsing only what was appended since the last call"""
+    try:
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            inode, offset, traces = _parsed.get(path, (None, 0, []))
+            if inode != stat.st_ino or stat.st_size < offset:
+                offset, traces = 0, []
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        _parsed.pop(path, None)
+        return []
+
+    # A line still being written has no newline yet; it is read next time
+    end = data.rfind(b'\n') + 1
+    for line in data[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            traces.append(json.loads(line))
+        except ValueError as e:
+            logger.error(f"Skipping bad alert trace in {path}: {e}")
+    _parsed[path] = (stat.st_ino, offset + end, traces)
+    return traces
+
+
+def load_traces(since=None):
+    """Load saved traces, optionally only alerts queued after `since`"""
+    traces = []
+    try:
+        with _parsed_lock:
+            for path in (ALERT_TRACES_FILE + '.1', ALERT_TRACES_FILE):
+                traces.extend(_read_traces(path))
+    except Exception as e:
+        logger.error(f"Error loading alert traces: {e}")
+    if since:
+        traces = [trace for trace in traces if (trace.get('queued_at') or '') >= since.isoformat()]
+    return traces
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def send_ms_histogram(trace):
+    """(bucket counts, max) of a trace's send durations
+
+    Traces saved before the buckets have every duration in send_durations_ms.
+    """
+    if 'send_ms_buckets' in trace:
+        return trace['send_ms_buckets'], trace.get('send_ms_max')
+    durations = trace.get('send_durations_ms', [])
+    counts = [0] * (len(SEND_MS_BUCKETS) + 1)
+    for duration in durations:
+        counts[bisect.bisect_left(SEND_MS_BUCKETS, duration)] += 1
+    return counts, max(durations, default=None)
+
+
+def histogram_percentile(counts, pct, maximum=None):
+    """Nearest-rank percentile from SEND_MS_BUCKETS counts
+
+    The upper bound of the bucket holding that rank, capped at `maximum`
+    (the largest value counted), which also stands in for the last bucket.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = max(1, math.ceil(pct / 100 * total))
+    for bound, count in zip(SEND_MS_BUCKETS + (None,), counts):
+        rank -= count
+        if rank <= 0:
+            break
+    if bound is None:
+        return maximum
+    return bound if maximum is None else min(bound, maximum)
+
+
+def _seconds_between(start, end):
+    if not start or not end:
+        return None
+    return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+
+
+def _summarize(values):
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+    }
+
+
+def build_latency_report(traces):
+    """Group traces by alert type and area size with p50/p95/p99 latencies
+
+    time_to_deliver is queued -> last send, i.e. from the admin clicking
+    Send Alert until the last farmer received it.
+    """
+    groups = {}
+    for trace in traces:
+        key = (trace.get('type', 'custom'), area_size_bucket(trace.get('recipients', 0)))
+        group = groups.setdefault(key, {
+            'alerts': 0, 'recipients': 0, 'failed': 0,
+            'pickup': [], 'first_send': [], 'deliver': [],
+            'send_ms': [0] * (len(SEND_MS_BUCKETS) + 1), 'send_ms_max': None,
+        })
+        group['alerts'] += 1
+        group['recipients'] += trace.get('recipients', 0)
+        group['failed'] += trace.get('failed', 0)
+        counts, maximum = send_ms_histogram(trace)
+        group['send_ms'] = [a + b for a, b in zip(group['send_ms'], counts)]
+        if maximum is not None:
+            group['send_ms_max'] = max(group['send_ms_max'] or 0, maximum)
+
+        for name, start, end in (
+            ('pickup', trace.get('queued_at'), trace.get('picked_up_at')),
+            ('first_send', trace.get('queued_at'), trace.get('first_sent_at')),
+            ('deliver', trace.get('queued_at'), trace.get('last_sent_at')),
+        ):
+            seconds = _seconds_between(start, end)
+            if seconds is not None:
+                group[name].append(seconds)
+
+    size_order = ['0'] + [label for _, label in AREA_SIZE_BUCKETS] + [AREA_SIZE_LARGEST]
+    rows = []
+    for (alert_type, size), group in sorted(groups.items(), key=lambda kv: (kv[0][0], size_order.index(kv[0][1]))):
+        rows.append({
+            'type': alert_type,
+            'area_size': size,
+            'alerts': group['alerts'],
+            'recipients': group['recipients'],
+            'failed': group['failed'],
+            'time_to_pickup': _summarize(group['pickup']),
+            'time_to_first_send': _summarize(group['first_send']),
+            'time_to_deliver': _summarize(group['deliver']),
+            'send_ms': {f'p{pct}': histogram_percentile(group['send_ms'], pct, group['send_ms_max'])
+                        for pct in (50, 95, 99)},
+        })
+    return rows
+
+
+def _fmt(value, unit='s'):
+    if value is None:
+        return '-'
+    return f"{value:.1f}{unit}"
+
+
+def print_report(rows):
+    """Print a latency report as a plain-text table"""
+    header = (
+        f"{'type':<10} {'area':>7} {'alerts':>6} {'recips':>7} "
+        f"{'deliver p50':>11} {'p95':>8} {'p99':>8} {'first p50':>9} {'send p50':>9} {'p99':>8}"
+    )
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        deliver = row['time_to_deliver']
+        print(
+            f"{row['type']:<10} {row['area_size']:>7} {row['alerts']:>6} {row['recipients']:>7} "
+            f"{_fmt(deliver['p50']):>11} {_fmt(deliver['p95']):>8} {_fmt(deliver['p99']):>8} "
+            f"{_fmt(row['time_to_first_send']['p50']):>9} "
+            f"{_fmt(row['send_ms']['p50'], 'ms'):>9} {_fmt(row['send_ms']['p99'], 'ms'):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Alert lifecycle latency report')
+    subparsers = parser.add_subparsers(dest='command')
+    report = subparsers.add_parser('report', help='Print p50/p95/p99 time-to-deliver')
+    report.add_argument('--days', type=int, default=None, help='Only alerts queued in the last N days')
+    report.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    if args.command != 'report':
+        parser.print_help()
+        return 1
+
+    since = datetime.now() - timedelta(days=args.days) if args.days else None
+    rows = build_latency_report(load_traces(since))
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    elif rows:
+        print_report(rows)
+    else:
+        print("No alert traces recorded yet")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
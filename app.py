@@ -1,13 +1,18 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, g, Response, stream_with_context
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SelectField, TextAreaField, SubmitField
-from wtforms.validators import DataRequired, Email
+from wtforms import StringField, PasswordField, SelectField, TextAreaField, SubmitField, DateTimeLocalField
+from wtforms.validators import DataRequired, Email, Optional
 from werkzeug.security import check_password_hash, generate_password_hash
 import pandas as pd
+import numpy as np
 import os
+import time
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import logging
+import metrics
+from backends import delivery_time
 
 load_dotenv()
 
@@ -18,6 +23,20 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.HTTP_REQUEST_SECONDS.labels(
+            request.method, endpoint, response.status_code
+        ).observe(time.perf_counter() - start)
+    return response
+
 # Flask-Login setup
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -29,11 +48,20 @@ class User(UserMixin):
         self.id = id
         self.email = email
 
+# District/taluka pairs, derived once from the shared dataset
+_talukas = None
+
 # Load CSV data
 def load_taluka_data():
+    global _talukas
+    if _talukas is not None:
+        return _talukas
     try:
-        df = pd.read_csv('merged_village_temperature_data.csv')
+        from shared_data import load_location_data
+        
+        df = load_location_data()
         talukas = df[['District Name', 'Taluka Name']].drop_duplicates().sort_values(['District Name', 'Taluka Name'])
+        _talukas = talukas
         return talukas
     except Exception as e:
         logger.error(f"Error loading CSV data: {e}")
@@ -55,6 +83,7 @@ class AlertForm(FlaskForm):
     district = SelectField('District', choices=[], validators=[DataRequired()])
     taluka = SelectField('Taluka', choices=[], validators=[DataRequired()])
     message = TextAreaField('Alert Message', validators=[DataRequired()])
+    deliver_at = DateTimeLocalField('Deliver At (IST)', format='%Y-%m-%dT%H:%M', validators=[Optional()])
     submit = SubmitField('Send Alert')
 
 # Bot status (managed separately)
@@ -65,7 +94,112 @@ TEMP_HOT_THRESHOLD = 40  # Celsius
 TEMP_COLD_THRESHOLD = 5  # Celsius
 
 def check_weather_alerts():
-    """Check for real temperature alerts using Open-Meteo API"""
+    """Check every taluka for temperature alerts using village-level weather
+
+    Falls back to the major-city check if the weather grid can't be fetched.
+    """
+    try:
+        from weather_api import WeatherAPI
+        from weather_field import get_village_weather, summarise_by_taluka
+        from heat_stress import worst_by_taluka
+        from climatology import get_climatology, today
+
+        villages = get_village_weather()
+        if villages is None:
+            return check_city_weather_alerts()
+
+        talukas = summarise_by_taluka(villages)
+        # Per-taluka thresholds for today where the climatology has them
+        talukas['hot_threshold'] = float(TEMP_HOT_THRESHOLD)
+        talukas['cold_threshold'] = float(TEMP_COLD_THRESHOLD)
+        climatology = get_climatology()
+        if climatology is not None:
+            hot, cold = climatology.lookup(talukas['District Name'], talukas['Taluka Name'], today())
+            talukas['hot_threshold'] = np.where(np.isnan(hot), TEMP_HOT_THRESHOLD, hot).round(1)
+            talukas['cold_threshold'] = np.where(np.isnan(cold), TEMP_COLD_THRESHOLD, cold).round(1)
+        observe_temperature_episodes(talukas)
+        talukas = talukas[
+            (talukas['current_temp'] >= talukas['hot_threshold']) | (talukas['max_temp'] >= talukas['hot_threshold']) |
+            (talukas['current_temp'] <= talukas['cold_threshold']) | (talukas['min_temp'] <= talukas['cold_threshold'])
+        ]
+        timestamp = villages['timestamp'].iat[0]
+        alerts = []
+        weather_api = WeatherAPI()
+
+        for row in talukas.to_dict('records'):
+            location = f"{row['Taluka Name']}, {row['District Name']}"
+            if row.get('hottest_village'):
+                location += f" (hottest: {row['hottest_village']})"
+            data = dict(row, location=location)
+            alerts_for_taluka = weather_api.check_temperature_alerts(
+                data, row['hot_threshold'], row['cold_threshold']) or []
+            for alert in alerts_for_taluka:
+                alerts.append({
+                    'type': alert['type'],
+                    'district': row['District Name'],
+                    'taluka': row['Taluka Name'],
+                    'threshold': row['hot_threshold'] if alert['type'] == 'Hot Weather Alert' else row['cold_threshold'],
+                    'temperature': alert['temperature'],
+                    'max_temp': alert.get('max_temp', alert['temperature']),
+                    'min_temp': alert.get('min_temp', alert['temperature']),
+                    'severity': alert['severity'],
+                    'message': alert['message'],
+                    'timestamp': timestamp,
+                    'weather_description': weather_api.get_weather_description(int(row['weather_code'])),
+                    'humidity': row['humidity'],
+                    'wind_speed': row['wind_speed']
+                })
+
+        # Humid heat is dangerous below the raw temperature threshold
+        for row in worst_by_taluka(villages).round(1).to_dict('records'):
+            location = f"{row['Taluka Name']}, {row['District Name']}"
+            if row.get('Village Name'):
+                location += f" (worst: {row['Village Name']})"
+            alerts.append({
+                'type': 'Heat Stress Alert',
+                'district': row['District Name'],
+                'taluka': row['Taluka Name'],
+                'temperature': row['current_temp'],
+                'max_temp': row['max_temp'],
+                'min_temp': row['min_temp'],
+                'heat_index': row['heat_index'],
+                'wet_bulb': row['wet_bulb'],
+                'feels_like': row['feels_like'],
+                'severity': row['tier'],
+                'message': f"🥵 HEAT STRESS ({row['tier'].upper()}): heat index {row['heat_index']}°C, "
+                           f"wet-bulb {row['wet_bulb']}°C at {row['current_temp']}°C and {row['humidity']:.0f}% "
+                           f"humidity in {location}. Rest in shade, drink water often and avoid heavy work "
+                           f"in the afternoon.",
+                'timestamp': timestamp,
+                'weather_description': weather_api.get_weather_description(int(row['weather_code'])),
+                'humidity': row['humidity'],
+                'wind_speed': row['wind_speed']
+            })
+
+        return alerts
+    except Exception as e:
+        logger.error(f"Error checking weather alerts: {e}")
+        return []
+
+def observe_temperature_episodes(talukas):
+    """Feed every taluka's reading to the alert engine so hot/cold episodes open and clear"""
+    from alert_engine import Reading, get_alert_engine
+
+    readings = []
+    for row in talukas[['District Name', 'Taluka Name', 'current_temp', 'max_temp', 'min_temp',
+                        'hot_threshold', 'cold_threshold']].itertuples(index=False):
+        district, taluka, current, high, low, hot, cold = row
+        severity = 'high' if current >= 45 else 'medium'
+        readings.append(Reading(district, taluka, 'Hot Weather Alert', max(current, high), hot, severity))
+        severity = 'high' if current <= 0 else 'medium'
+        readings.append(Reading(district, taluka, 'Cold Weather Alert', min(current, low), cold, severity, False))
+    try:
+        get_alert_engine().observe(readings)
+    except Exception as e:
+        logger.error(f"Error updating alert episodes: {e}")
+
+def check_city_weather_alerts():
+    """Check for real temperature alerts in major cities using Open-Meteo API"""
     try:
         from weather_api import get_weather_for_locations, WeatherAPI
         
@@ -160,11 +294,16 @@ def send_alert():
     # Populate district choices
     districts = [(d, d) for d in talukas['District Name'].unique()]
     form.district.choices = [('', 'Select District')] + districts
+    # Talukas are filled in by the page's script; accept those of the chosen district
+    district_talukas = talukas[talukas['District Name'] == form.district.data]['Taluka Name'].unique()
+    form.taluka.choices = [('', 'Select Taluka')] + [(t, t) for t in district_talukas]
     
     if form.validate_on_submit():
         district = form.district.data
         taluka = form.taluka.data
         message = form.message.data
+        # Typed in Gujarat time (DELIVERY_TIMEZONE), whatever the server's zone
+        deliver_at = delivery_time(form.deliver_at.data) if form.deliver_at.data else None
         
         # Queue alert for bot to send
         try:
@@ -175,8 +314,15 @@ def send_alert():
             
             if subscribers:
                 # Queue the alert
-                if queue_alert(district, taluka, message, "admin"):
-                    flash(f'✅ Alert queued for {len(subscribers)} subscribers in {taluka}, {district}!', 'success')
+                if deliver_at and deliver_at <= datetime.now(deliver_at.tzinfo):
+                    flash('⚠️ Delivery time is in the past; choose a later time or leave it empty.', 'warning')
+                    return render_template('send_alert.html', form=form)
+                if queue_alert(district, taluka, message, "admin", deliver_at=deliver_at):
+                    if deliver_at:
+                        flash(f'⏰ Alert scheduled for {deliver_at:%d %b %H:%M} to {len(subscribers)} '
+                              f'subscribers in {taluka}, {district}', 'success')
+                    else:
+                        flash(f'✅ Alert queued for {len(subscribers)} subscribers in {taluka}, {district}!', 'success')
                     logger.info(f"Alert queued: {district} -> {taluka}: {message}")
                 else:
                     flash('❌ Failed to queue alert. Please try again.', 'error')
@@ -263,24 +409,41 @@ def send_weather_alert():
     alert = data.get('alert')
     
     try:
-        from shared_data import queue_alert, get_subscribers_for_area
+        from shared_data import queue_alert, get_subscribers_for_area, get_subscribers_for_district
+        from alert_engine import get_alert_engine
         
         district = alert['district']
-        taluka = alert['taluka']
+        taluka = alert.get('taluka') or None  # no taluka: whole district
         message = alert['message']
         
         # Check if there are subscribers
-        subscribers = get_subscribers_for_area(district, taluka)
+        if taluka:
+            subscribers = get_subscribers_for_area(district, taluka)
+        else:
+            subscribers = get_subscribers_for_district(district)
+        
+        # Same area and alert type already sent this episode (resend with "force": true)
+        engine = get_alert_engine()
+        if subscribers and not engine.claim(district, taluka, alert.get('type', 'weather'),
+                                            alert.get('severity', 'medium'), force=bool(data.get('force'))):
+            minutes = int(time.time() - engine.last_sent(district, taluka, alert.get('type', 'weather'))) // 60
+            return jsonify({
+                'success': False,
+                'suppressed': True,
+                'message': f'This alert was already sent to {taluka or district} {minutes} min ago'
+            })
         
         if subscribers:
             # Queue the weather alert
-            if queue_alert(district, taluka, message, "weather"):
+            if queue_alert(district, taluka, message, "weather", severity=alert.get('severity')):
                 logger.info(f"Weather alert queued: {district} -> {taluka}: {message}")
                 return jsonify({
                     'success': True, 
                     'message': f'Weather alert queued for {len(subscribers)} subscribers!'
                 })
             else:
+                # Not sent, so it mustn't hold off the next attempt
+                engine.rollback(district, taluka, alert.get('type', 'weather'))
                 return jsonify({'success': False, 'message': 'Failed to queue alert'})
         else:
             return jsonify({
@@ -334,36 +497,113 @@ def weather_map_data():
             'error': 'Failed to fetch weather data'
         })
 
+def fire_date_range():
+    """(start, end) dates from the ?start=&end= query arguments (YYYY-MM-DD, both optional)"""
+    start = request.args.get('start')
+    end = request.args.get('end')
+    return (datetime.strptime(start, '%Y-%m-%d').date() if start else None,
+            datetime.strptime(end, '%Y-%m-%d').date() if end else None)
+
+def bbox_arg():
+    """[south, west, north, east] from the ?bbox= query argument, or None"""
+    bbox = request.args.get('bbox')
+    if not bbox:
+        return None
+    bbox = [float(v) for v in bbox.split(',')]
+    if len(bbox) != 4:
+        raise ValueError("bbox must be south,west,north,east")
+    return bbox
+
+@app.route('/api/fire_density')
+def fire_density():
+    """Fire counts and max confidence per map cell in the viewport
+
+    ?zoom=7&bbox=south,west,north,east&start=YYYY-MM-DD&end=YYYY-MM-DD
+    """
+    from fire_density import get_fire_grid
+
+    try:
+        zoom = request.args.get('zoom', 7, type=int)
+        start, end = fire_date_range()
+        bbox = bbox_arg()
+        grid = get_fire_grid(zoom, start, end)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'zoom': zoom,
+        'max_count': grid.max_count,
+        # Each cell: [lat, lon, fire count, max confidence]
+        'cells': grid.cells(bbox),
+    })
+
+@app.route('/tiles/fires/<int:z>/<int:x>/<int:y>.png')
+def fire_density_tile(z, x, y):
+    """Fire-density map tile (same ?start=&end= as /api/fire_density)"""
+    from fire_density import get_fire_grid
+
+    try:
+        start, end = fire_date_range()
+        grid = get_fire_grid(z, start, end)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not (0 <= x < 1 << z and 0 <= y < 1 << z):
+        return jsonify({'success': False, 'error': 'Tile out of range'}), 404
+
+    response = Response(grid.tile(x, y), mimetype='image/png')
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response
+
+@app.route('/api/export')
+def export_data():
+    """Stream the village dataset as CSV or Parquet
+
+    ?format=csv|parquet&district=&taluka=&bbox=south,west,north,east&weather=1
+    """
+    from shared_data import load_location_data
+    from data_export import EXPORT_FORMATS, export_rows, parquet_available, select_rows
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({'success': False, 'error': 'Parquet export needs pyarrow installed'}), 400
+    try:
+        bbox = bbox_arg()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    df = load_location_data()
+    if df.empty:
+        return jsonify({'success': False, 'error': 'Location data not available'}), 503
+    weather = None
+    if request.args.get('weather', type=int):
+        from weather_field import get_village_weather
+        weather = get_village_weather()
+        if weather is None:
+            return jsonify({'success': False, 'error': 'Weather data not available'}), 503
+
+    rows = select_rows(df, request.args.get('district'), request.args.get('taluka'), bbox)
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    return Response(
+        stream_with_context(export_rows(df, rows, fmt, weather)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=gujarat_weather_data.{extension}'},
+    )
+
 @app.route('/api/subscriber_stats')
 @login_required
 def subscriber_stats():
     """Get subscriber statistics"""
     try:
-        from shared_data import load_subscribers
-        
-        subscribers = load_subscribers()
-        total_subscribers = sum(len(users) for users in subscribers.values())
-        areas_with_subscribers = len([k for k, v in subscribers.items() if v])
+        from shared_data import get_subscriber_stats
         
-        # Get top subscribed areas
-        top_areas = []
-        for key, users in subscribers.items():
-            if users:
-                district, taluka = key.split('_', 1)
-                top_areas.append({
-                    'district': district,
-                    'taluka': taluka,
-                    'count': len(users)
-                })
-        
-        top_areas.sort(key=lambda x: x['count'], reverse=True)
+        # Maintained on every subscribe/unsubscribe, so this does not scan subscribers
+        stats = get_subscriber_stats(top_k=10)
         
-        return jsonify({
-            'success': True,
-            'total_subscribers': total_subscribers,
-            'areas_with_subscribers': areas_with_subscribers,
-            'top_areas': top_areas[:10]
-        })
+        return jsonify(dict(stats, success=True))
         
     except Exception as e:
         logger.error(f"Error getting subscriber stats: {e}")
@@ -372,6 +612,52 @@ def subscriber_stats():
             'error': 'Failed to get subscriber stats'
         })
 
+@app.route('/alert_latency')
+@login_required
+def alert_latency():
+    """Time-to-deliver report for sent alerts"""
+    from alert_tracing import load_traces, build_latency_report
+    
+    days = request.args.get('days', 7, type=int)
+    since = datetime.now() - timedelta(days=days) if days else None
+    rows = build_latency_report(load_traces(since))
+    return render_template('alert_latency.html', rows=rows, days=days)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    try:
+        from shared_data import get_pending_alerts
+        
+        # Queue depth is owned by the bot process, so sample it at scrape time
+        pending = get_pending_alerts()
+        metrics.ALERT_QUEUE_DEPTH.set(len(pending))
+        oldest = min((a['timestamp'] for a in pending if a.get('timestamp')), default=None)
+        age = (datetime.now() - datetime.fromisoformat(oldest)).total_seconds() if oldest else 0
+        metrics.ALERT_OLDEST_AGE_SECONDS.set(age)
+    except Exception as e:
+        logger.error(f"Error sampling alert queue for metrics: {e}")
+    
+    return Response(metrics.generate_latest(), content_type=metrics.CONTENT_TYPE)
+
+# Build read-only data before serving (see preload.py); gunicorn.conf.py turns it on for its master
+WEB_PRELOAD = os.getenv('WEB_PRELOAD', '').lower() in ('1', 'true', 'yes')
+
+def create_app(preload=None):
+    """The WSGI application
+
+    Routes live on the module-level `app`, so `from app import app` keeps
+    working. With preload (default WEB_PRELOAD) the village dataset,
+    weather grid, climatology and fire history are built here and frozen,
+    so processes forked afterwards share them.
+    """
+    if preload is None:
+        preload = WEB_PRELOAD
+    if preload:
+        from preload import preload_shared_data
+        preload_shared_data()
+    return app
+
 if __name__ == '__main__':
     # For local development
-    app.run(debug=True, port=int(os.environ.get('PORT', 5000)), host='0.0.0.0')
\ No newline at end of file
+    create_app().run(debug=True, port=int(os.environ.get('PORT', 5000)), host='0.0.0.0')
\ No newline at end of file
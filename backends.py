@@ -0,0 +1,1267 @@
+#!/usr/bin/env python3
+"""
+Storage backends for shared subscriber/alert state and change notifications
+
+FileBackend keeps everything in local JSON files (the original behaviour) and
+only works when all processes share one disk. RedisBackend keeps the same data
+in Redis so web instances and bot/dispatcher workers can run on different
+nodes. It speaks the Redis protocol directly, so it needs no client library
+and works against any Redis-compatible server, including the embedded
+stand-in in loadtest/fake_redis.py.
+
+Select a backend with SHARED_DATA_BACKEND:
+    SHARED_DATA_BACKEND=file                        (default)
+    SHARED_DATA_BACKEND=redis://:password@host:6379/0
+    SHARED_DATA_BACKEND=rediss://:password@host:6380/0   (TLS)
+
+Copy existing JSON data into Redis with:
+    python backends.py migrate redis://host:6379/0
+
+Check (and repair) the maintained subscriber statistics with:
+    python backends.py rebuild-stats [redis://host:6379/0]
+"""
+
+import os
+import sys
+import json
+import time
+import ssl
+import fcntl
+import socket
+import select
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from urllib.parse import urlparse, unquote
+
+logger = logging.getLogger(__name__)
+
+# Notification channels
+ALERTS_CHANNEL = 'alerts'
+SUBSCRIBERS_CHANNEL = 'subscribers'
+
+# Delivery times are entered in Gujarat's time zone, whatever the server's is
+DELIVERY_TIMEZONE = ZoneInfo('Asia/Kolkata')
+
+
+class Backend:
+    """Interface for subscriber storage, the alert queue and notifications"""
+
+    # Subscribers (a user may follow any number of areas)
+    def load_subscribers(self):
+        """All subscriptions as {"DISTRICT_Taluka": [user_id, ...]}"""
+        raise NotImplementedError
+
+    def save_subscribers(self, subscribers):
+        raise NotImplementedError
+
+    def add_subscriber(self, user_id, district, taluka):
+        """Subscribe a user to one more area; True if newly subscribed"""
+        raise NotImplementedError
+
+    def remove_subscriber(self, user_id, district=None, taluka=None):
+        """Remove a user from one area (or all areas); True if anything was removed"""
+        raise NotImplementedError
+
+    def get_user_areas(self, user_id):
+        """Area keys the user is subscribed to"""
+        raise NotImplementedError
+
+    def get_subscribers_for_area(self, district, taluka):
+        raise NotImplementedError
+
+    def get_subscribers_for_areas(self, area_keys):
+        """Union of the subscribers of several areas, each user once"""
+        raise NotImplementedError
+
+    def get_district_areas(self, district):
+        """Area keys in a district that have (or had) subscribers"""
+        raise NotImplementedError
+
+    def get_subscriber_stats(self, top_k=10):
+        """Totals, per-district counts and the top_k areas from maintained aggregates"""
+        raise NotImplementedError
+
+    def rebuild_subscriber_stats(self):
+        """Recompute the aggregates from the subscriptions; return the stats before and after"""
+        raise NotImplementedError
+
+    # Alert queue
+    def push_alert(self, alert):
+        raise NotImplementedError
+
+    def get_pending_alerts(self):
+        raise NotImplementedError
+
+    def mark_alert_sent(self, alert_id):
+        raise NotImplementedError
+
+    def claim_alert(self, alert_id, owner, ttl=3600):
+        """Claim an alert for sending so only one dispatcher sends it"""
+        return True
+
+    def renew_claim(self, alert_id, owner, ttl=3600):
+        """Extend the owner's claim by ttl seconds; False if the claim is no longer theirs"""
+        return True
+
+    def release_claim(self, alert_id, owner):
+        """Drop the owner's claim (another owner's claim is left alone)"""
+
+    # Scheduled alerts (see delivery_timer.py)
+    def schedule_alert(self, alert):
+        """Hold an alert with a 'deliver_at' time outside the queue until it is due"""
+        raise NotImplementedError
+
+    def get_scheduled_times(self):
+        """[(deliver_at epoch seconds, alert id), ...] for every scheduled alert"""
+        raise NotImplementedError
+
+    def get_schedule_version(self):
+        """A cheap value that changes whenever the schedule does"""
+        raise NotImplementedError
+
+    def release_due_alerts(self, now=None):
+        """Move scheduled alerts that are due into the queue; returns the alerts moved
+
+        Each alert is moved once even with several dispatchers.
+        """
+        raise NotImplementedError
+
+    # Sharded fan-out (see dispatcher_workers.py)
+    def complete_shard(self, alert_id, shard, shards, progress):
+        """Record a shard's final progress on an alert
+
+        Returns every shard's {shard: progress} to the one call that completes
+        the last of `shards` shards, and None to the others.
+        """
+        raise NotImplementedError
+
+    def update_shard_progress(self, alert_id, shard, progress):
+        """Record a shard's progress on an alert while it is sending"""
+        raise NotImplementedError
+
+    def get_shard_progress(self, alert_ids):
+        """{alert_id: {shard: progress}} for alerts any shard has reported on"""
+        raise NotImplementedError
+
+    def take_send_slot(self, name, rate):
+        """Take one send from a budget of `rate` per second shared by all processes
+
+        Returns 0 if the send may go now, otherwise the seconds to wait before
+        asking again.
+        """
+        raise NotImplementedError
+
+    # Alert engine state (see alert_engine.py)
+    def get_alert_states(self, keys):
+        """{key: state} for the given (area, alert type) keys that have state"""
+        raise NotImplementedError
+
+    def set_alert_states(self, states):
+        """Store {key: state}; a state of None deletes the key"""
+        raise NotImplementedError
+
+    # Change notifications
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel, callback):
+        """Call callback(message) for every message published on channel"""
+        raise NotImplementedError
+
+
+def area_key(district, taluka):
+    return f"{district}_{taluka}"
+
+
+def delivery_time(value):
+    """A deliver_at datetime (or ISO string) as an aware time; naive ones are in DELIVERY_TIMEZONE"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value if value.tzinfo is not None else value.replace(tzinfo=DELIVERY_TIMEZONE)
+
+
+def deliver_at_seconds(alert):
+    return delivery_time(alert['deliver_at']).timestamp()
+
+
+def released_alert(alert):
+    """A scheduled alert as it enters the queue: queued at its delivery time
+
+    The queue's timestamps are the server's local time, so the delivery
+    time is converted to that.
+    """
+    queued_at = datetime.fromtimestamp(deliver_at_seconds(alert))
+    return dict(alert, created_at=alert['timestamp'], timestamp=queued_at.isoformat())
+
+
+def split_area_key(key):
+    district, taluka = key.split('_', 1)
+    return district, taluka
+
+
+class RankedCounter:
+    """Counts that change by +/-1, kept in descending order for O(K) top-K
+
+    Keys with equal counts form contiguous blocks of `order`; moving a key
+    to the edge of its block before changing its count keeps the list
+    sorted with O(1) work per update.
+    """
+
+    def __init__(self):
+        self.order = []
+        self.pos = {}
+        self.counts = {}
+        self.start = {}
+        self.end = {}
+
+    def _swap(self, i, j):
+        a, b = self.order[i], self.order[j]
+        self.order[i], self.order[j] = b, a
+        self.pos[a], self.pos[b] = j, i
+
+    def _leave(self, count, index, at_start):
+        if self.start[count] == self.end[count]:
+            del self.start[count], self.end[count]
+        elif at_start:
+            self.start[count] = index + 1
+        else:
+            self.end[count] = index - 1
+
+    def increment(self, key):
+        if key not in self.counts:
+            self.counts[key] = 0
+            self.pos[key] = len(self.order)
+            self.order.append(key)
+            self.start.setdefault(0, len(self.order) - 1)
+            self.end[0] = len(self.order) - 1
+        count = self.counts[key]
+        first = self.start[count]
+        self._swap(self.pos[key], first)
+        self._leave(count, first, at_start=True)
+        if count + 1 in self.end:
+            self.end[count + 1] = first
+        else:
+            self.start[count + 1] = self.end[count + 1] = first
+        self.counts[key] = count + 1
+        return count + 1
+
+    def decrement(self, key):
+        count = self.counts[key]
+        last = self.end[count]
+        self._swap(self.pos[key], last)
+        self._leave(count, last, at_start=False)
+        if count - 1 in self.start:
+            self.start[count - 1] = last
+        else:
+            self.start[count - 1] = self.end[count - 1] = last
+        self.counts[key] = count - 1
+        return count - 1
+
+    def get(self, key):
+        return self.counts.get(key, 0)
+
+    def top(self, k):
+        """The k largest (key, count) pairs with count > 0"""
+        result = []
+        for key in self.order[:k]:
+            count = self.counts[key]
+            if not count:
+                break
+            result.append((key, count))
+        return result
+
+
+def _stats_payload(users, subscriptions, areas, districts, top_areas):
+    return {
+        'total_subscribers': users,
+        'total_subscriptions': subscriptions,
+        'areas_with_subscribers': areas,
+        'districts': {d: c for d, c in sorted(districts.items()) if c},
+        'top_areas': [dict(zip(('district', 'taluka'), split_area_key(key)), count=count)
+                      for key, count in top_areas],
+    }
+
+
+def compute_subscriber_stats(subscribers, top_k=10):
+    """Subscriber statistics from a full scan (used to rebuild and check aggregates)"""
+    districts = {}
+    for key, users in subscribers.items():
+        district = split_area_key(key)[0]
+        districts[district] = districts.get(district, 0) + len(users)
+    ranked = sorted(((k, len(v)) for k, v in subscribers.items() if v), key=lambda kv: (-kv[1], kv[0]))
+    return _stats_payload(
+        len(set().union(*subscribers.values())),
+        sum(len(users) for users in subscribers.values()),
+        len(ranked),
+        districts,
+        ranked[:top_k],
+    )
+
+
+class SubscriberIndex:
+    """Set-based area -> users, user -> areas and district -> areas indexes
+
+    Also keeps subscriber statistics up to date on every change, so they
+    can be served without scanning all subscriptions.
+
+    Changes replace sets (and add keys to dicts) rather than changing
+    them in place, so readers without the writer's lock can iterate what
+    they got. Copying an area's set costs less than writing the file.
+    """
+
+    def __init__(self, subscribers=None):
+        self.areas = {}
+        self.users = {}
+        self.districts = {}
+        self.area_counts = RankedCounter()
+        self.district_counts = {}
+        self.subscriptions = 0
+        self.nonempty_areas = 0
+        # Nobody reads the index yet, so the sets are built in place
+        for key, user_ids in (subscribers or {}).items():
+            if not user_ids:
+                continue
+            members = self.areas.setdefault(key, set())
+            for user_id in user_ids:
+                if user_id not in members:
+                    members.add(user_id)
+                    self.users.setdefault(user_id, set()).add(key)
+                    self._count(key, 1)
+            self.districts.setdefault(split_area_key(key)[0], set()).add(key)
+
+    def _count(self, key, delta):
+        district = split_area_key(key)[0]
+        self.subscriptions += delta
+        if district in self.district_counts:
+            self.district_counts[district] += delta
+        else:
+            self.district_counts = {**self.district_counts, district: delta}
+        if delta > 0:
+            if self.area_counts.increment(key) == 1:
+                self.nonempty_areas += 1
+        elif self.area_counts.decrement(key) == 0:
+            self.nonempty_areas -= 1
+
+    def add(self, user_id, key):
+        members = self.areas.get(key, set())
+        if user_id in members:
+            return False
+        self.areas[key] = members | {user_id}
+        self.users[user_id] = self.users.get(user_id, set()) | {key}
+        district = split_area_key(key)[0]
+        if key not in self.districts.get(district, ()):
+            self.districts[district] = self.districts.get(district, set()) | {key}
+        self._count(key, 1)
+        return True
+
+    def remove(self, user_id, key):
+        members = self.areas.get(key)
+        if not members or user_id not in members:
+            return False
+        self.areas[key] = members - {user_id}
+        user_areas = self.users[user_id] - {key}
+        if user_areas:
+            self.users[user_id] = user_areas
+        else:
+            del self.users[user_id]
+        self._count(key, -1)
+        return True
+
+    def remove_user(self, user_id):
+        keys = self.users.pop(user_id, set())
+        for key in keys:
+            self.areas[key] = self.areas[key] - {user_id}
+            self._count(key, -1)
+        return keys
+
+    def stats(self, top_k=10):
+        return _stats_payload(len(self.users), self.subscriptions, self.nonempty_areas,
+                              self.district_counts, self.area_counts.top(top_k))
+
+    def to_dict(self):
+        """subscribers.json layout: area key -> sorted user ids"""
+        return {key: sorted(members) for key, members in self.areas.items() if members}
+
+
+class FileBackend(Backend):
+    """JSON files on the local disk"""
+
+    def __init__(self, subscribers_file='subscribers.json', alerts_file='pending_alerts.json',
+                 alert_state_file='alert_state.json', scheduled_alerts_file='scheduled_alerts.json',
+                 shard_progress_file='shard_progress.json'):
+        self.subscribers_file = subscribers_file
+        self.alerts_file = alerts_file
+        self.alert_state_file = alert_state_file
+        self.scheduled_alerts_file = scheduled_alerts_file
+        self.shard_progress_file = shard_progress_file
+        self.send_budget_file = f"{alerts_file}.budget"
+        self.claims_file = f"{alerts_file}.claims"
+        # Guards read-modify-write of the JSON files against concurrent handlers
+        self._lock = threading.RLock()
+        # In-process mode (see unified_runtime.py): web app, bot and dispatcher
+        # share one process, so JSON state is served from memory and only
+        # written to disk. Cached entries are keyed by file signature, so
+        # writes from other processes (e.g. send_demo_alert.py) are still seen.
+        self.in_process = False
+        self._file_cache = {}
+        self._index_cache = None
+        self._listeners = {}
+
+    def _file_signature(self, path):
+        stat = os.stat(path)
+        # Files are replaced, not rewritten: a new inode is a new file even
+        # within the same mtime tick and at the same size
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _read_json(self, path, default):
+        """Read a JSON state file (from memory when in in-process mode)
+
+        In in-process mode the result is the cached object itself: build
+        changed copies rather than modifying it, and hand copies to callers
+        outside this class.
+        """
+        if not os.path.exists(path):
+            return default
+        if self.in_process:
+            signature = self._file_signature(path)
+            cached = self._file_cache.get(path)
+            if cached and cached[0] == signature:
+                return cached[1]
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if self.in_process:
+            self._file_cache[path] = (signature, data)
+        return data
+
+    def _write_json(self, path, data):
+        """Write a JSON state file (and keep it in memory when in in-process mode)
+
+        The file is replaced in one step, so readers never see it half written
+        and a failed write leaves both the file and the cache as they were.
+        """
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+        if self.in_process:
+            self._file_cache[path] = (self._file_signature(path), data)
+
+    def load_subscribers(self):
+        return {key: list(users) for key, users in self._read_json(self.subscribers_file, {}).items()}
+
+    def save_subscribers(self, subscribers):
+        with self._lock:
+            self._write_json(self.subscribers_file, {key: list(users) for key, users in subscribers.items()})
+            self._index_cache = None
+
+    def _index(self):
+        """Subscriber index, rebuilt only when subscribers.json changes"""
+        signature = self._file_signature(self.subscribers_file) if os.path.exists(self.subscribers_file) else None
+        if self._index_cache is None or self._index_cache[0] != signature:
+            self._index_cache = (signature, SubscriberIndex(self.load_subscribers()))
+        return self._index_cache[1]
+
+    def _save_index(self, index, undo):
+        """Write the changed index, or undo() the change if the write fails"""
+        try:
+            self._write_json(self.subscribers_file, index.to_dict())
+        except Exception:
+            undo()
+            raise
+        self._index_cache = (self._file_signature(self.subscribers_file), index)
+
+    def add_subscriber(self, user_id, district, taluka):
+        key = area_key(district, taluka)
+        with self._lock:
+            index = self._index()
+            added = index.add(user_id, key)
+            if added:
+                self._save_index(index, lambda: index.remove(user_id, key))
+            return added
+
+    def remove_subscriber(self, user_id, district=None, taluka=None):
+        with self._lock:
+            index = self._index()
+            if district is None:
+                keys = index.remove_user(user_id)
+                if keys:
+                    self._save_index(index, lambda: [index.add(user_id, key) for key in keys])
+                return bool(keys)
+            key = area_key(district, taluka)
+            removed = index.remove(user_id, key)
+            if removed:
+                self._save_index(index, lambda: index.add(user_id, key))
+            return removed
+
+    def get_user_areas(self, user_id):
+        return sorted(self._index().users.get(user_id, ()))
+
+    def get_subscribers_for_area(self, district, taluka):
+        return sorted(self._index().areas.get(area_key(district, taluka), ()))
+
+    def get_subscribers_for_areas(self, area_keys):
+        areas = self._index().areas
+        return set().union(*(areas.get(key, ()) for key in area_keys))
+
+    def get_district_areas(self, district):
+        return set(self._index().districts.get(district, ()))
+
+    def get_subscriber_stats(self, top_k=10):
+        return self._index().stats(top_k)
+
+    def rebuild_subscriber_stats(self):
+        with self._lock:
+            before = self._index().stats(top_k=None)
+            self._index_cache = None
+            return before, self._index().stats(top_k=None)
+
+    def push_alert(self, alert):
+        with self._lock:
+            alerts = self._read_json(self.alerts_file, [])
+            self._write_json(self.alerts_file, alerts + [dict(alert)])
+
+    def get_pending_alerts(self):
+        alerts = self._read_json(self.alerts_file, [])
+        return [dict(alert) for alert in alerts if not alert.get('sent', False)]
+
+    def mark_alert_sent(self, alert_id):
+        with self._lock:
+            if not os.path.exists(self.alerts_file):
+                return False
+            sent_at = datetime.now().isoformat()
+            alerts = [dict(alert, sent=True, sent_at=sent_at) if alert['id'] == alert_id else alert
+                      for alert in self._read_json(self.alerts_file, [])]
+            self._write_json(self.alerts_file, alerts)
+            return True
+
+    def get_alert_states(self, keys):
+        states = self._read_json(self.alert_state_file, {})
+        return {key: list(states[key]) for key in keys if key in states}
+
+    def set_alert_states(self, states):
+        with self._lock:
+            stored = dict(self._read_json(self.alert_state_file, {}))
+            for key, state in states.items():
+                if state is None:
+                    stored.pop(key, None)
+                else:
+                    stored[key] = state
+            self._write_json(self.alert_state_file, stored)
+
+    def schedule_alert(self, alert):
+        with self._lock:
+            scheduled = self._read_json(self.scheduled_alerts_file, [])
+            self._write_json(self.scheduled_alerts_file, scheduled + [dict(alert)])
+
+    def get_scheduled_times(self):
+        return [(deliver_at_seconds(alert), alert['id'])
+                for alert in self._read_json(self.scheduled_alerts_file, [])]
+
+    def get_schedule_version(self):
+        if not os.path.exists(self.scheduled_alerts_file):
+            return None
+        return self._file_signature(self.scheduled_alerts_file)
+
+    def release_due_alerts(self, now=None):
+        now = now if now is not None else time.time()
+        with self._lock:
+            scheduled = self._read_json(self.scheduled_alerts_file, [])
+            due = [alert for alert in scheduled if deliver_at_seconds(alert) <= now]
+            if not due:
+                return []
+            # Queue first: a crash in between repeats an alert rather than losing it
+            released = [released_alert(alert) for alert in due]
+            alerts = self._read_json(self.alerts_file, [])
+            self._write_json(self.alerts_file, alerts + released)
+            self._write_json(self.scheduled_alerts_file,
+                             [alert for alert in scheduled if deliver_at_seconds(alert) > now])
+            return [dict(alert) for alert in released]
+
+    @contextmanager
+    def _process_lock(self, path):
+        """Exclusive lock on a state file shared with other dispatcher processes"""
+        with self._lock, open(f"{path}.lock", 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_unlocked(self, path, default):
+        # Other processes write these files, so the in-process cache can't be used
+        if not os.path.exists(path):
+            return default
+        with open(path) as f:
+            return json.load(f)
+
+    def _store_shard_progress(self, alert_id, shard, progress):
+        stored = self._read_unlocked(self.shard_progress_file, {})
+        # Forget alerts not reported on for two days
+        cutoff = time.time() - 2 * 86400
+        stored = {key: shards for key, shards in stored.items()
+                  if max(p.get('updated', 0) for p in shards.values()) > cutoff}
+        shards = stored.setdefault(alert_id, {})
+        shards[str(shard)] = dict(progress, updated=time.time())
+        self._write_json(self.shard_progress_file, stored)
+        return shards
+
+    def complete_shard(self, alert_id, shard, shards, progress):
+        with self._process_lock(self.shard_progress_file):
+            already_done = self._read_unlocked(self.shard_progress_file, {}).get(alert_id, {}).get(str(shard), {})
+            stored = self._store_shard_progress(alert_id, shard, dict(progress, done=True))
+            done = sum(1 for p in stored.values() if p.get('done'))
+            return stored if done == shards and not already_done.get('done') else None
+
+    def update_shard_progress(self, alert_id, shard, progress):
+        with self._process_lock(self.shard_progress_file):
+            self._store_shard_progress(alert_id, shard, progress)
+
+    def get_shard_progress(self, alert_ids):
+        with self._process_lock(self.shard_progress_file):
+            stored = self._read_unlocked(self.shard_progress_file, {})
+        return {alert_id: stored[alert_id] for alert_id in alert_ids if alert_id in stored}
+
+    def _change_claims(self, change):
+        """Apply change(claims, now) to the unexpired claims {id: [owner, expires_at]}; returns its result"""
+        now = time.time()
+        with self._process_lock(self.claims_file):
+            claims = {alert_id: claim for alert_id, claim in self._read_unlocked(self.claims_file, {}).items()
+                      if claim[1] > now}
+            result = change(claims, now)
+            self._write_json(self.claims_file, claims)
+            return result
+
+    def claim_alert(self, alert_id, owner, ttl=3600):
+        def claim(claims, now):
+            if alert_id in claims:
+                return False
+            claims[alert_id] = [owner, now + ttl]
+            return True
+        return self._change_claims(claim)
+
+    def renew_claim(self, alert_id, owner, ttl=3600):
+        def renew(claims, now):
+            if claims.get(alert_id, [None])[0] != owner:
+                return False
+            claims[alert_id] = [owner, now + ttl]
+            return True
+        return self._change_claims(renew)
+
+    def release_claim(self, alert_id, owner):
+        def release(claims, now):
+            if claims.get(alert_id, [None])[0] == owner:
+                del claims[alert_id]
+        self._change_claims(release)
+
+    def take_send_slot(self, name, rate):
+        now = time.time()
+        window = int(now)
+        with self._process_lock(self.send_budget_file):
+            budget = self._read_unlocked(self.send_budget_file, {})
+            used_window, used = budget.get(name, (window, 0))
+            used = used if used_window == window else 0
+            if used >= rate:
+                return window + 1 - now
+            budget[name] = (window, used + 1)
+            with open(self.send_budget_file, 'w') as f:
+                json.dump(budget, f)
+            return 0
+
+    def publish(self, channel, message):
+        # Files have no change feed; only listeners in this process are told
+        for callback in list(self._listeners.get(channel, [])):
+            try:
+                callback(message)
+            except Exception as e:
+                logger.error(f"Listener for {channel} failed: {e}")
+
+    def subscribe(self, channel, callback):
+        self._listeners.setdefault(channel, []).append(callback)
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+class RespClient:
+    """Minimal thread-safe Redis protocol (RESP2) client
+
+    rediss:// URLs connect over TLS, checking the server's certificate.
+    """
+
+    # Commands that change nothing, so they can be resent after a lost connection
+    READ_COMMANDS = frozenset({
+        'PING', 'GET', 'MGET', 'EXISTS', 'SMEMBERS', 'SISMEMBER', 'SCARD', 'SUNION',
+        'ZRANGE', 'ZREVRANGE', 'ZRANGEBYSCORE', 'ZREVRANGEBYSCORE', 'ZSCORE', 'ZCARD',
+        'HGET', 'HMGET', 'HGETALL', 'HLEN',
+    })
+
+    def __init__(self, url, timeout=5.0):
+        parsed = urlparse(url)
+        self.tls = parsed.scheme == 'rediss'
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.tls:
+            self._sock = ssl.create_default_context().wrap_socket(self._sock, server_hostname=self.host)
+        self._file = self._sock.makefile('rb')
+        if self.password:
+            self._call(('AUTH', self.password))
+        if self.db:
+            self._call(('SELECT', self.db))
+
+    def _closed_by_server(self):
+        """Whether the idle connection has something to read, i.e. the server closed it
+
+        Commands sent on such a connection would never run, so reconnecting
+        first is always safe.
+        """
+        try:
+            readable, _, _ = select.select([self._sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def close(self):
+        if self._sock:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    @staticmethod
+    def encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, bytes):
+                data = arg
+            else:
+                data = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    def read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('Connection closed by server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode('utf-8')
+        if kind == b'-':
+            return RespError(payload.decode('utf-8'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._file.read(length + 2)[:-2]
+            return data.decode('utf-8')
+        if kind == b'*':
+            count = int(payload)
+            if count == -1:
+                return None
+            return [self.read_reply() for _ in range(count)]
+        raise ConnectionError(f"Unexpected reply: {line!r}")
+
+    def _call(self, args):
+        self._sock.sendall(self.encode(args))
+        reply = self.read_reply()
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def execute(self, *args):
+        """Run one command and return its reply"""
+        return self.pipeline([args])[0]
+
+    def _ensure_connected(self):
+        if self._sock is not None and self._closed_by_server():
+            self.close()
+        if self._sock is None:
+            self._connect()
+
+    def pipeline(self, commands):
+        """Send several commands in one round trip and return their replies
+
+        A connection lost before anything was sent is retried once. After
+        that the commands may already have run, so only pipelines of reads
+        are resent; others raise.
+        """
+        if not commands:
+            return []
+        payload = b''.join(self.encode(args) for args in commands)
+        resendable = all(str(args[0]).upper() in self.READ_COMMANDS for args in commands)
+        with self._lock:
+            for attempt in range(2):
+                sent = False
+                try:
+                    self._ensure_connected()
+                    sent = True
+                    self._sock.sendall(payload)
+                    replies = [self.read_reply() for _ in commands]
+                    break
+                except OSError:
+                    self.close()
+                    if attempt or (sent and not resendable):
+                        raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def transaction(self, watch, reads, build, attempts=10):
+        """Run commands atomically, based on reads no one changes meanwhile
+
+        WATCHes the `watch` keys, runs the `reads` and passes their replies
+        to build(), which returns the commands to run in MULTI/EXEC (or None
+        to run nothing). If a watched key changed before EXEC, the reads
+        are repeated. Returns EXEC's replies, or None if build() did.
+        """
+        with self._lock:
+            try:
+                self._ensure_connected()
+                for _ in range(attempts):
+                    self._sock.sendall(b''.join(self.encode(args) for args in [('WATCH', *watch), *reads]))
+                    replies = [self.read_reply() for _ in range(len(reads) + 1)]
+                    for reply in replies:
+                        if isinstance(reply, RespError):
+                            self._call(('UNWATCH',))
+                            raise reply
+                    commands = build(replies[1:])
+                    if commands is None:
+                        self._call(('UNWATCH',))
+                        return None
+                    self._sock.sendall(b''.join(self.encode(args) for args in [('MULTI',), *commands, ('EXEC',)]))
+                    result = [self.read_reply() for _ in range(len(commands) + 2)][-1]
+                    # A command the server refused to queue aborts the whole transaction (EXECABORT)
+                    if isinstance(result, RespError):
+                        raise result
+                    if result is not None:
+                        for reply in result:
+                            if isinstance(reply, RespError):
+                                raise reply
+                        return result
+            except OSError:
+                self.close()
+                raise
+        raise RespError(f"Transaction on {', '.join(watch)} kept conflicting")
+
+
+class RedisBackend(Backend):
+    """Shared state in Redis (or any server speaking the Redis protocol)
+
+    Keys (all under REDIS_KEY_PREFIX):
+        areas                 set of "DISTRICT_Taluka" keys that ever had subscribers
+        area:<key>            set of user ids subscribed to an area
+        user:<user_id>        set of area keys the user is subscribed to
+        district:<district>   set of area keys in a district
+        alert:<id>            alert JSON
+        alerts:pending        sorted set of pending alert ids by queue time
+        alerts:sent           sorted set of sent alert ids by send time
+        alert:<id>:claim      dispatcher that is sending the alert
+        stats                 hash of users / subscriptions / areas totals
+        stats:districts       hash of subscriptions per district
+        stats:areas           sorted set of subscriber counts per area key
+        alert_state           hash of alert engine state per (area, alert type) key
+        alerts:scheduled      sorted set of scheduled alert ids by delivery time
+        alerts:scheduled:version  counter bumped when the schedule changes
+        alert:<id>:shards     hash of per-shard fan-out progress (JSON)
+        alert:<id>:shards:done  hash with a field per shard that finished the alert
+        budget:<name>:<second>  sends taken from a shared per-second budget
+
+    The stats keys are updated on every subscribe/unsubscribe; run
+    `python backends.py rebuild-stats` to recompute them from the sets.
+    """
+
+    def __init__(self, url, prefix=None):
+        self.url = url
+        self.prefix = prefix if prefix is not None else os.getenv('REDIS_KEY_PREFIX', 'villagetemp:')
+        self.client = RespClient(url)
+        self._subscriptions = {}
+
+    def _key(self, *parts):
+        return self.prefix + ':'.join(str(p) for p in parts)
+
+    def load_subscribers(self):
+        areas = sorted(self.client.execute('SMEMBERS', self._key('areas')) or [])
+        members = self.client.pipeline([('SMEMBERS', self._key('area', key)) for key in areas])
+        return {key: sorted(int(u) for u in users) for key, users in zip(areas, members) if users}
+
+    def save_subscribers(self, subscribers):
+        old = self.load_subscribers()
+        commands = [('DEL', self._key('area', key)) for key in old]
+        commands += [('DEL', self._key('user', user_id)) for user_id in set().union(*old.values())]
+        commands += [('DEL', self._key('district', d)) for d in {split_area_key(key)[0] for key in old}]
+        commands.append(('DEL', self._key('areas')))
+        for key, users in subscribers.items():
+            commands += self._add_commands(users, key) if users else []
+        self.client.pipeline(commands)
+        self.rebuild_subscriber_stats()
+
+    def _add_commands(self, user_ids, key):
+        commands = [
+            ('SADD', self._key('areas'), key),
+            ('SADD', self._key('area', key), *user_ids),
+            ('SADD', self._key('district', split_area_key(key)[0]), key),
+        ]
+        commands += [('SADD', self._key('user', user_id), key) for user_id in user_ids]
+        return commands
+
+    def add_subscriber(self, user_id, district, taluka):
+        key = area_key(district, taluka)
+        replies = self.client.pipeline(self._add_commands([user_id], key) + [
+            ('SCARD', self._key('area', key)),
+            ('SCARD', self._key('user', user_id)),
+        ])
+        added, area_size, user_areas = replies[1], replies[-2], replies[-1]
+        if added:
+            self._count(key, 1, area_size == 1, user_areas == 1)
+        return bool(added)
+
+    def _count(self, key, delta, area_changed, user_changed):
+        """Apply one subscription change to the stats keys"""
+        commands = [
+            ('HINCRBY', self._key('stats'), 'subscriptions', delta),
+            ('HINCRBY', self._key('stats', 'districts'), split_area_key(key)[0], delta),
+            ('ZINCRBY', self._key('stats', 'areas'), delta, key),
+        ]
+        if area_changed:
+            commands.append(('HINCRBY', self._key('stats'), 'areas', delta))
+        if user_changed:
+            commands.append(('HINCRBY', self._key('stats'), 'users', delta))
+        self.client.pipeline(commands)
+
+    def remove_subscriber(self, user_id, district=None, taluka=None):
+        if district is None:
+            keys = self.get_user_areas(user_id)
+        else:
+            keys = [area_key(district, taluka)]
+        if not keys:
+            return False
+        commands = []
+        for key in keys:
+            commands += [('SREM', self._key('area', key), user_id), ('SCARD', self._key('area', key))]
+        commands += [('SREM', self._key('user', user_id), *keys), ('SCARD', self._key('user', user_id))]
+        replies = self.client.pipeline(commands)
+        removed = [(key, replies[2 * i + 1]) for i, key in enumerate(keys) if replies[2 * i]]
+        for i, (key, area_size) in enumerate(removed):
+            last = i == len(removed) - 1
+            self._count(key, -1, area_size == 0, last and replies[-1] == 0)
+        return bool(removed)
+
+    def get_user_areas(self, user_id):
+        return sorted(self.client.execute('SMEMBERS', self._key('user', user_id)) or [])
+
+    def get_subscribers_for_area(self, district, taluka):
+        users = self.client.execute('SMEMBERS', self._key('area', area_key(district, taluka))) or []
+        return sorted(int(u) for u in users)
+
+    def get_subscribers_for_areas(self, area_keys):
+        if not area_keys:
+            return set()
+        users = self.client.execute('SUNION', *[self._key('area', key) for key in area_keys]) or []
+        return {int(u) for u in users}
+
+    def get_district_areas(self, district):
+        return set(self.client.execute('SMEMBERS', self._key('district', district)) or [])
+
+    def get_subscriber_stats(self, top_k=10):
+        count = -1 if top_k is None else top_k
+        totals, districts, top = self.client.pipeline([
+            ('HGETALL', self._key('stats')),
+            ('HGETALL', self._key('stats', 'districts')),
+            ('ZREVRANGEBYSCORE', self._key('stats', 'areas'), '+inf', 1, 'WITHSCORES', 'LIMIT', 0, count),
+        ])
+        totals = dict(zip(totals[::2], totals[1::2]))
+        return _stats_payload(
+            int(totals.get('users', 0)),
+            int(totals.get('subscriptions', 0)),
+            int(totals.get('areas', 0)),
+            {d: int(c) for d, c in zip(districts[::2], districts[1::2])},
+            [(key, int(float(score))) for key, score in zip(top[::2], top[1::2])],
+        )
+
+    def rebuild_subscriber_stats(self):
+        before = self.get_subscriber_stats(top_k=None)
+        after = compute_subscriber_stats(self.load_subscribers(), top_k=None)
+        commands = [('DEL', self._key('stats'), self._key('stats', 'districts'), self._key('stats', 'areas')),
+                    ('HSET', self._key('stats'), 'users', after['total_subscribers'],
+                     'subscriptions', after['total_subscriptions'], 'areas', after['areas_with_subscribers'])]
+        if after['districts']:
+            commands.append(('HSET', self._key('stats', 'districts'),
+                             *[x for item in after['districts'].items() for x in item]))
+        if after['top_areas']:
+            commands.append(('ZADD', self._key('stats', 'areas'),
+                             *[x for a in after['top_areas'] for x in (a['count'], area_key(a['district'], a['taluka']))]))
+        self.client.pipeline(commands)
+        return before, after
+
+    def push_alert(self, alert):
+        queued_at = datetime.fromisoformat(alert['timestamp']).timestamp()
+        self.client.pipeline([
+            ('SET', self._key('alert', alert['id']), json.dumps(alert)),
+            ('ZADD', self._key('alerts', 'pending'), queued_at, alert['id']),
+        ])
+
+    def get_pending_alerts(self):
+        ids = self.client.execute('ZRANGE', self._key('alerts', 'pending'), 0, -1)
+        if not ids:
+            return []
+        raw = self.client.execute('MGET', *[self._key('alert', alert_id) for alert_id in ids])
+        return [json.loads(data) for data in raw if data]
+
+    def mark_alert_sent(self, alert_id):
+        data = self.client.execute('GET', self._key('alert', alert_id))
+        if not data:
+            return False
+        alert = json.loads(data)
+        alert['sent'] = True
+        alert['sent_at'] = datetime.now().isoformat()
+        self.client.pipeline([
+            ('SET', self._key('alert', alert_id), json.dumps(alert)),
+            ('ZREM', self._key('alerts', 'pending'), alert_id),
+            ('ZADD', self._key('alerts', 'sent'), time.time(), alert_id),
+        ])
+        return True
+
+    def claim_alert(self, alert_id, owner, ttl=3600):
+        reply = self.client.execute('SET', self._key('alert', alert_id, 'claim'), owner, 'NX', 'EX', ttl)
+        return reply == 'OK'
+
+    def _if_owner(self, alert_id, owner, command, *args):
+        """Run `command key *args` on the claim key only while `owner` holds it"""
+        key = self._key('alert', alert_id, 'claim')
+        replies = self.client.transaction(
+            [key], [('GET', key)], lambda replies: [(command, key, *args)] if replies[0] == owner else None)
+        return replies is not None
+
+    def renew_claim(self, alert_id, owner, ttl=3600):
+        return self._if_owner(alert_id, owner, 'EXPIRE', ttl)
+
+    def release_claim(self, alert_id, owner):
+        self._if_owner(alert_id, owner, 'DEL')
+
+    def schedule_alert(self, alert):
+        self.client.pipeline([
+            ('SET', self._key('alert', alert['id']), json.dumps(alert)),
+            ('ZADD', self._key('alerts', 'scheduled'), deliver_at_seconds(alert), alert['id']),
+            ('INCR', self._key('alerts', 'scheduled', 'version')),
+        ])
+
+    def get_scheduled_times(self):
+        flat = self.client.execute('ZRANGE', self._key('alerts', 'scheduled'), 0, -1, 'WITHSCORES')
+        return [(float(score), alert_id) for alert_id, score in zip(flat[::2], flat[1::2])]
+
+    def get_schedule_version(self):
+        return self.client.execute('GET', self._key('alerts', 'scheduled', 'version'))
+
+    def release_due_alerts(self, now=None):
+        now = now if now is not None else time.time()
+        scheduled = self._key('alerts', 'scheduled')
+        ids = self.client.execute('ZRANGEBYSCORE', scheduled, '-inf', now)
+        if not ids:
+            return []
+        released = []
+
+        def move(replies):
+            # Leaves the schedule, keeps the alert and joins the queue in one
+            # transaction, so a crash can't lose it and only one dispatcher moves it
+            released.clear()
+            due, alerts = set(replies[0]), replies[1]
+            moved = [alert_id for alert_id in ids if alert_id in due]
+            if not moved:
+                return None
+            commands = [('ZREM', scheduled, *moved), ('INCR', self._key('alerts', 'scheduled', 'version'))]
+            for alert_id, data in zip(ids, alerts):
+                if alert_id not in due or not data:
+                    continue
+                alert = released_alert(json.loads(data))
+                commands += [
+                    ('SET', self._key('alert', alert_id), json.dumps(alert)),
+                    ('ZADD', self._key('alerts', 'pending'), deliver_at_seconds(alert), alert_id),
+                ]
+                released.append(alert)
+            return commands
+
+        self.client.transaction([scheduled], [
+            ('ZRANGEBYSCORE', scheduled, '-inf', now),
+            ('MGET', *[self._key('alert', alert_id) for alert_id in ids]),
+        ], move)
+        return released
+
+    def complete_shard(self, alert_id, shard, shards, progress):
+        key = self._key('alert', alert_id, 'shards')
+        replies = self.client.pipeline([
+            ('MULTI',),
+            ('HSET', key, shard, json.dumps(dict(progress, done=True, updated=time.time()))),
+            ('HSETNX', f"{key}:done", shard, 1),
+            ('HLEN', f"{key}:done"),
+            ('EXPIRE', key, 2 * 86400),
+            ('EXPIRE', f"{key}:done", 2 * 86400),
+            ('HGETALL', key),
+            ('EXEC',),
+        ])
+        # Each shard is counted once (a repeated call adds nothing), and with
+        # MULTI exactly one newly counted shard sees the last count
+        _, newly_done, done, _, _, flat = replies[-1]
+        if not newly_done or int(done) != shards:
+            return None
+        return {field: json.loads(value) for field, value in zip(flat[::2], flat[1::2])}
+
+    def update_shard_progress(self, alert_id, shard, progress):
+        key = self._key('alert', alert_id, 'shards')
+        self.client.pipeline([
+            ('HSET', key, shard, json.dumps(dict(progress, updated=time.time()))),
+            ('EXPIRE', key, 2 * 86400),
+        ])
+
+    def get_shard_progress(self, alert_ids):
+        alert_ids = list(alert_ids)
+        replies = self.client.pipeline([('HGETALL', self._key('alert', alert_id, 'shards'))
+                                        for alert_id in alert_ids])
+        return {alert_id: {field: json.loads(value) for field, value in zip(flat[::2], flat[1::2])}
+                for alert_id, flat in zip(alert_ids, replies) if flat}
+
+    def take_send_slot(self, name, rate):
+        now = time.time()
+        window = int(now)
+        key = self._key('budget', name, window)
+        used, _ = self.client.pipeline([('INCR', key), ('EXPIRE', key, 2)])
+        return 0 if int(used) <= rate else window + 1 - now
+
+    def get_alert_states(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        raw = self.client.execute('HMGET', self._key('alert_state'), *keys)
+        return {key: json.loads(data) for key, data in zip(keys, raw) if data}
+
+    def set_alert_states(self, states):
+        stored = [x for key, state in states.items() if state is not None
+                  for x in (key, json.dumps(state, separators=(',', ':')))]
+        deleted = [key for key, state in states.items() if state is None]
+        commands = []
+        if stored:
+            commands.append(('HSET', self._key('alert_state'), *stored))
+        if deleted:
+            commands.append(('HDEL', self._key('alert_state'), *deleted))
+        if commands:
+            self.client.pipeline(commands)
+
+    def publish(self, channel, message):
+        self.client.execute('PUBLISH', self._key('events', channel), json.dumps(message))
+
+    def subscribe(self, channel, callback):
+        callbacks = self._subscriptions.setdefault(channel, [])
+        callbacks.append(callback)
+        if len(callbacks) == 1:
+            thread = threading.Thread(target=self._listen, args=(channel,),
+                                      name=f"redis-sub-{channel}", daemon=True)
+            thread.start()
+
+    def _listen(self, channel):
+        """Deliver pub/sub messages to callbacks, reconnecting on failure"""
+        backoff = 1
+        while True:
+            client = RespClient(self.url, timeout=None)
+            try:
+                client._connect()
+                client._sock.sendall(client.encode(('SUBSCRIBE', self._key('events', channel))))
+                backoff = 1
+                while True:
+                    reply = client.read_reply()
+                    if not (isinstance(reply, list) and reply and reply[0] == 'message'):
+                        continue
+                    try:
+                        message = json.loads(reply[2])
+                    except ValueError as e:
+                        logger.error(f"Ignoring malformed message on {channel}: {e}")
+                        continue
+                    for callback in list(self._subscriptions.get(channel, [])):
+                        try:
+                            callback(message)
+                        except Exception as e:
+                            logger.error(f"Listener for {channel} failed: {e}")
+            except Exception as e:
+                # Including garbled replies: the thread must outlive any one connection
+                logger.warning(f"Redis subscription to {channel} lost ({e}), retrying in {backoff}s")
+            finally:
+                client.close()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+def create_backend(spec=None, subscribers_file='subscribers.json', alerts_file='pending_alerts.json',
+                   alert_state_file='alert_state.json', scheduled_alerts_file='scheduled_alerts.json',
+                   shard_progress_file='shard_progress.json'):
+    """Create the backend named by spec (or SHARED_DATA_BACKEND)"""
+    spec = spec or os.getenv('SHARED_DATA_BACKEND', 'file')
+    if spec.startswith(('redis://', 'rediss://')):
+        logger.info(f"🗄️ Using Redis backend at {urlparse(spec).hostname}")
+        return RedisBackend(spec)
+    if spec != 'file':
+        raise ValueError(f"Unknown SHARED_DATA_BACKEND: {spec}")
+    return FileBackend(subscribers_file, alerts_file, alert_state_file, scheduled_alerts_file,
+                       shard_progress_file)
+
+
+def migrate(source, target):
+    """Copy subscribers and pending alerts from one backend to another"""
+    subscribers = source.load_subscribers()
+    target.save_subscribers(subscribers)
+    pending = source.get_pending_alerts()
+    for alert in pending:
+        target.push_alert(alert)
+    scheduled = source._read_json(source.scheduled_alerts_file, []) if isinstance(source, FileBackend) else []
+    for alert in scheduled:
+        target.schedule_alert(alert)
+    users = sum(len(v) for v in subscribers.values())
+    print(f"✅ Migrated {users} subscriptions in {len(subscribers)} areas, {len(pending)} pending "
+          f"and {len(scheduled)} scheduled alerts")
+
+
+def rebuild_stats(backend):
+    """Recompute subscriber statistics and report any drift in the maintained ones"""
+    before, after = backend.rebuild_subscriber_stats()
+    # Areas with equal counts may be ranked in any order
+    for stats in (before, after):
+        stats['top_areas'] = sorted(stats['top_areas'], key=lambda a: (a['district'], a['taluka']))
+    drift = [field for field in after if before[field] != after[field]]
+    if drift:
+        print(f"⚠️ Subscriber stats had drifted ({', '.join(drift)}); rebuilt from subscriptions")
+    else:
+        print("✅ Subscriber stats are consistent")
+    print(f"   {after['total_subscribers']} subscribers, {after['total_subscriptions']} subscriptions, "
+          f"{after['areas_with_subscribers']} areas")
+    return not drift
+
+
+def main():
+    usage = ("Usage: python backends.py migrate redis://host:6379/0\n"
+             "       python backends.py rebuild-stats [backend]")
+    if len(sys.argv) == 3 and sys.argv[1] == 'migrate':
+        logging.basicConfig(level=logging.INFO)
+        migrate(FileBackend(), create_backend(sys.argv[2]))
+        return 0
+    if len(sys.argv) in (2, 3) and sys.argv[1] == 'rebuild-stats':
+        return 0 if rebuild_stats(create_backend(sys.argv[2] if len(sys.argv) == 3 else None)) else 1
+    print(usage)
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
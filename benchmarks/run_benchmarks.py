@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the project's hot paths
+
+Runs against synthetic data in a temporary directory (the real data files
+are never touched) with the HTTP layer and Telegram bot stubbed out, and
+writes results as JSON so runs can be compared between commits.
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # full run
+    python benchmarks/run_benchmarks.py --quick              # small sizes
+    python benchmarks/run_benchmarks.py --only subscribers
+    python benchmarks/run_benchmarks.py compare OLD.json NEW.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import platform
+import argparse
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic  # noqa: E402
+
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+# Relative change above which `compare` flags a benchmark
+REGRESSION_THRESHOLD = 0.10
+
+SIZES = {
+    'full': {
+        'villages': synthetic.DEFAULT_VILLAGES,
+        'subscribers': [1000, 100000, 1000000],
+        'alert_history': [1000, 10000, 100000],
+        'fires': [5, 20],
+        'fanout_recipients': [100, 1000],
+    },
+    'quick': {
+        'villages': 5000,
+        'subscribers': [1000, 10000],
+        'alert_history': [1000, 10000],
+        'fires': [5],
+        'fanout_recipients': [100],
+    },
+}
+
+
+class BenchmarkRunner:
+    """Times callables and collects results"""
+
+    def __init__(self, repeats=5, max_seconds=20.0):
+        self.repeats = repeats
+        self.max_seconds = max_seconds
+        self.results = []
+
+    def run(self, name, fn, params=None, setup=None, repeats=None, warmup=True):
+        """Time fn() `repeats` times, calling setup() untimed before each run"""
+        repeats = repeats or self.repeats
+        if warmup:
+            # Fill import, file-system and allocator caches before timing
+            if setup:
+                setup()
+            fn()
+        timings = []
+        budget_start = time.perf_counter()
+        for _ in range(repeats):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+            # Very slow cases still get at least one sample
+            if time.perf_counter() - budget_start > self.max_seconds:
+                break
+
+        result = {
+            'name': name,
+            'params': params or {},
+            'runs': len(timings),
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.fmean(timings),
+            'max': max(timings),
+        }
+        self.results.append(result)
+        label = ', '.join(f"{k}={v}" for k, v in (params or {}).items())
+        print(f"  {name:<32} {label:<28} median {result['median'] * 1000:>10.3f} ms  ({len(timings)} runs)")
+        return result
+
+
+class _StubResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+def _stub_requests_get(url, params=None, timeout=None):
+    if isinstance(params['latitude'], str):
+        # Batched request: comma-separated coordinates, one body per location
+        bodies = [synthetic.make_open_meteo_response(float(lat), float(lon), hourly=params.get('hourly'),
+                                                     forecast_days=params.get('forecast_days', 1))
+                  for lat, lon in zip(params['latitude'].split(','), params['longitude'].split(','))]
+        return _StubResponse(bodies if len(bodies) > 1 else bodies[0])
+    return _StubResponse(synthetic.make_open_meteo_response(params['latitude'], params['longitude']))
+
+
+class FakeBot:
+    """Stands in for telegram.Bot; records calls without network I/O"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+
+
+class FakeApplication:
+    def __init__(self):
+        self.bot = FakeBot()
+
+
+def bench_load_taluka_data(runner, sizes):
+    import app
+    import shared_data
+    print("load_taluka_data")
+
+    def drop_caches():
+        app._talukas = None
+        shared_data._location_df = None
+
+    runner.run('load_taluka_data', app.load_taluka_data, {'villages': sizes['villages'], 'cache': 'cold'},
+               setup=drop_caches)
+    runner.run('load_taluka_data', app.load_taluka_data, {'villages': sizes['villages'], 'cache': 'warm'})
+
+
+def bench_weather(runner, sizes):
+    import weather_api
+    print("get_weather_for_taluka")
+    location_df = synthetic.make_location_frame(villages=sizes['villages'])
+    district, taluka = synthetic.area_keys(location_df)[-1]
+
+    original_get = weather_api.requests.get
+    weather_api.requests.get = _stub_requests_get
+    try:
+        runner.run('get_weather_for_taluka', lambda: weather_api.get_weather_for_taluka(district, taluka),
+                   {'villages': sizes['villages'], 'cache': 'cold'}, setup=weather_api._weather_cache.clear)
+        runner.run('get_weather_for_taluka', lambda: weather_api.get_weather_for_taluka(district, taluka),
+                   {'villages': sizes['villages'], 'cache': 'warm'})
+    finally:
+        weather_api.requests.get = original_get
+
+
+def bench_weather_field(runner, sizes):
+    import weather_field
+    print("village weather field")
+    location_df = synthetic.make_location_frame(villages=sizes['villages'])
+    lats = location_df['Village Latitude'].to_numpy()
+    lons = location_df['Village Longitude'].to_numpy()
+    runner.run('build_weather_field', lambda: weather_field.WeatherField(lats, lons), {'villages': sizes['villages']})
+    field = weather_field.WeatherField(lats, lons)
+
+    original_get = weather_field.requests.get
+    weather_field.requests.get = _stub_requests_get
+    try:
+        runner.run('fetch_weather_field', field.fetch, {'villages': sizes['villages'], 'nodes': field.node_count})
+    finally:
+        weather_field.requests.get = original_get
+    runner.run('interpolate_weather_field', field.interpolate, {'villages': sizes['villages']})
+
+
+def bench_forecast(runner, sizes):
+    import forecast
+    import weather_field
+    print("forecast lookahead")
+    field, _ = weather_field.get_weather_field()
+    rng = np.random.default_rng(0)
+    values = rng.normal(35, 5, size=(field.node_count, forecast.FORECAST_DAYS * 24,
+                                     len(forecast.HOURLY_VARIABLES))).astype(np.float32)
+    start = datetime.combine(forecast.tomorrow(), datetime.min.time()) - timedelta(days=1)
+    forecast.HourlyForecast(values, start, field.node_lats, field.node_lons).save('forecast.npy')
+    params = {'villages': sizes['villages'], 'nodes': field.node_count}
+    runner.run('load_forecast', lambda: forecast.HourlyForecast.load('forecast.npy'), params)
+    saved = forecast.HourlyForecast.load('forecast.npy')
+    runner.run('expected_heat', lambda: forecast.expected_heat(forecast=saved), params)
+
+
+def bench_heat_stress(runner, sizes):
+    import heat_stress
+    print("heat stress")
+    rng = np.random.default_rng(0)
+    count = sizes['villages']
+    temp = rng.uniform(25, 46, count).astype(np.float32)
+    humidity = rng.uniform(10, 95, count).astype(np.float32)
+    wind = rng.uniform(0, 30, count).astype(np.float32)
+    tiers = heat_stress.parse_tiers()
+    runner.run('heat_stress_evaluate', lambda: heat_stress.evaluate(temp, humidity, wind, tiers),
+               {'villages': count})
+
+
+def bench_climatology(runner, sizes):
+    import climatology
+    print("climatology thresholds")
+    location_df = synthetic.make_location_frame(villages=sizes['villages'])
+    areas = synthetic.area_keys(location_df)
+    days = pd.date_range('2024-01-01', '2024-12-31')
+    rng = np.random.default_rng(0)
+    history = pd.DataFrame({
+        'date': np.tile(days.strftime('%Y-%m-%d'), len(areas)),
+        'district': np.repeat([d for d, _ in areas], len(days)),
+        'taluka': np.repeat([t for _, t in areas], len(days)),
+        'max_temp': rng.normal(36, 4, len(areas) * len(days)).round(1),
+    })
+    history['min_temp'] = history['max_temp'] - 12
+    params = {'talukas': len(areas), 'history_days': len(days)}
+    runner.run('build_climatology', lambda: climatology.build_climatology(location_df, history), params,
+               repeats=3, warmup=False)
+    table = climatology.build_climatology(location_df, history)
+    day = datetime(2025, 5, 15).date()
+    runner.run('climatology_lookup x1000', lambda: [table.thresholds(d, t, day) for d, t in (areas * 5)[:1000]],
+               params)
+
+
+def bench_subscribers(runner, sizes):
+    import shared_data
+    print("subscribers")
+    areas = synthetic.area_keys(synthetic.make_location_frame(villages=sizes['villages']))
+    for users in sizes['subscribers']:
+        subscribers = synthetic.write_subscribers(shared_data.SUBSCRIBERS_FILE, users, areas)
+        # The last user of the last area (worst case for list-based scans)
+        last_key = [k for k, v in subscribers.items() if v][-1]
+        last_user = subscribers[last_key][-1]
+        district, taluka = last_key.split('_', 1)
+        busiest = max(subscribers, key=lambda k: len(subscribers[k])).split('_', 1)
+        repeats = 3 if users >= 1000000 else None
+
+        runner.run('get_user_subscription', lambda: shared_data.get_user_subscription(last_user),
+                   {'subscribers': users}, repeats=repeats)
+        runner.run('get_subscribers_for_area', lambda: shared_data.get_subscribers_for_area(*busiest),
+                   {'subscribers': users}, repeats=repeats)
+        runner.run('get_subscribers_for_district', lambda: shared_data.get_subscribers_for_district(busiest[0]),
+                   {'subscribers': users}, repeats=repeats)
+        runner.run('get_subscriber_stats', lambda: shared_data.get_subscriber_stats(top_k=10),
+                   {'subscribers': users}, repeats=repeats)
+        new_user = [10]
+        def add_next():
+            new_user[0] += 1
+            shared_data.add_subscriber(new_user[0], district, taluka)
+        runner.run('add_subscriber', add_next, {'subscribers': users}, repeats=repeats)
+
+
+def bench_alert_queue(runner, sizes):
+    import shared_data
+    print("alert queue")
+    areas = synthetic.area_keys(synthetic.make_location_frame(villages=sizes['villages']))
+    for history in sizes['alert_history']:
+        synthetic.write_alert_history(shared_data.ALERTS_FILE, history, areas)
+        runner.run('queue_alert', lambda: shared_data.queue_alert(*areas[0], 'Benchmark alert', 'weather'),
+                   {'history': history})
+        pending = [a['id'] for a in shared_data.get_pending_alerts()]
+        runner.run('get_pending_alerts', shared_data.get_pending_alerts, {'history': history})
+        runner.run('mark_alert_sent', lambda: pending and shared_data.mark_alert_sent(pending.pop()),
+                   {'history': history})
+
+
+def bench_fire_mapping(runner, sizes):
+    import nasa_fire_fetcher
+    print("map_fires_to_districts")
+    location_df = synthetic.make_location_frame(villages=sizes['villages'])
+    for fires in sizes['fires']:
+        fire_df = synthetic.make_fire_frame(fires)
+        runner.run('map_fires_to_districts', lambda: nasa_fire_fetcher.map_fires_to_districts(fire_df, location_df),
+                   {'fires': fires, 'villages': sizes['villages']}, repeats=3, warmup=False)
+
+
+def bench_nearest_location(runner, sizes):
+    from spatial_index import GridIndex
+    print("nearest location")
+    location_df = synthetic.make_location_frame(villages=sizes['villages'])
+    lats = location_df['Village Latitude'].to_numpy()
+    lons = location_df['Village Longitude'].to_numpy()
+    runner.run('build_location_index', lambda: GridIndex(lats, lons), {'villages': sizes['villages']})
+    index = GridIndex(lats, lons)
+    rng = np.random.default_rng(0)
+    queries = list(zip(rng.uniform(lats.min(), lats.max(), 1000), rng.uniform(lons.min(), lons.max(), 1000)))
+    runner.run('nearest_location x1000', lambda: [index.nearest(lat, lon, max_km=50) for lat, lon in queries],
+               {'villages': sizes['villages']})
+
+
+def bench_process_pending_alerts(runner, sizes):
+    import shared_data
+    import bot_host
+    print("process_pending_alerts")
+    bot_host.ALERT_SEND_INTERVAL = 0
+    # Release queued alerts at once; the five alerts still coalesce into one digest per user
+    bot_host.ALERT_DIGEST_WINDOW = 0
+    district, taluka = 'DISTRICT00', 'Taluka 000'
+    for recipients in sizes['fanout_recipients']:
+        with open(shared_data.SUBSCRIBERS_FILE, 'w') as f:
+            json.dump({f"{district}_{taluka}": list(range(1, recipients + 1))}, f)
+
+        def setup():
+            with open(shared_data.ALERTS_FILE, 'w') as f:
+                json.dump([], f)
+            for _ in range(5):
+                shared_data.queue_alert(district, taluka, 'Benchmark alert', 'weather')
+
+        application = FakeApplication()
+        runner.run('process_pending_alerts', lambda: asyncio.run(bot_host.process_pending_alerts(application)),
+                   {'alerts': 5, 'recipients': recipients}, setup=setup, repeats=3)
+
+
+def bench_fanout_send(runner, sizes):
+    """Per-message cost of sending an alert, through python-telegram-bot and through fanout.py"""
+    sys.path.insert(0, os.path.join(REPO_ROOT, 'loadtest'))
+    from fake_telegram import FakeTelegramServer
+    from telegram import Bot
+    from fanout import FanoutClient, RenderedMessage
+    print("fanout_send")
+    server = FakeTelegramServer().start()
+    text = "🚨 WEATHER ALERT\n\n" + "Heat wave expected, stay indoors between noon and 4 PM. " * 4
+    messages = sizes['fanout_recipients'][-1]
+
+    async def via_bot():
+        async with Bot('123:bench', base_url=server.base_url) as bot:
+            for chat_id in range(1, messages + 1):
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML')
+
+    async def via_fanout():
+        client = FanoutClient(Bot('123:bench', base_url=server.base_url))
+        message = RenderedMessage(text)
+        for chat_id in range(1, messages + 1):
+            await client.send(chat_id, message)
+        await client.close()
+
+    try:
+        for path, send_all in (('telegram.Bot', via_bot), ('fanout', via_fanout)):
+            # The fake server runs in other threads, so this thread's CPU is the sender's
+            cpu = []
+
+            def timed():
+                start = time.thread_time()
+                asyncio.run(send_all())
+                cpu.append(time.thread_time() - start)
+
+            result = runner.run('fanout_send', timed, {'path': path, 'messages': messages}, repeats=3)
+            result['cpu_per_message_us'] = statistics.median(cpu) / messages * 1e6
+            print(f"  {'':<32} {'':<28} {result['cpu_per_message_us']:>10.1f} µs CPU per message")
+    finally:
+        server.stop()
+
+
+BENCHMARKS = {
+    'load_taluka_data': bench_load_taluka_data,
+    'weather': bench_weather,
+    'weather_field': bench_weather_field,
+    'forecast': bench_forecast,
+    'heat_stress': bench_heat_stress,
+    'climatology': bench_climatology,
+    'subscribers': bench_subscribers,
+    'alert_queue': bench_alert_queue,
+    'fire_mapping': bench_fire_mapping,
+    'process_pending_alerts': bench_process_pending_alerts,
+    'fanout_send': bench_fanout_send,
+    'nearest_location': bench_nearest_location,
+}
+
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def run_suite(args):
+    sizes = SIZES['quick' if args.quick else 'full']
+    runner = BenchmarkRunner(repeats=args.repeats)
+    selected = args.only or list(BENCHMARKS)
+
+    # Benchmarks log per call; keep the output readable
+    logging.disable(logging.CRITICAL)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='villagetemp-bench-') as workdir:
+        os.chdir(workdir)
+        try:
+            synthetic.write_location_csv('merged_village_temperature_data.csv', villages=sizes['villages'])
+            for name in selected:
+                BENCHMARKS[name](runner, sizes)
+        finally:
+            os.chdir(cwd)
+
+    revision = git_revision()
+    report = {
+        'revision': revision,
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'profile': 'quick' if args.quick else 'full',
+        'results': runner.results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+    return 0
+
+
+def _result_key(result):
+    return (result['name'], json.dumps(result['params'], sort_keys=True))
+
+
+def compare(old_path, new_path, threshold=REGRESSION_THRESHOLD, stat='min'):
+    """Print timing changes between two result files; return 1 on regression
+
+    `min` is the default statistic because it is the least sensitive to
+    noise from other processes on the machine.
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    old_results = {_result_key(r): r for r in old['results']}
+    regressions = 0
+    print(f"{old['revision']} -> {new['revision']} ({stat})")
+    for result in new['results']:
+        key = _result_key(result)
+        label = f"{result['name']} {', '.join(f'{k}={v}' for k, v in result['params'].items())}"
+        if key not in old_results:
+            print(f"  {label:<60} new")
+            continue
+        before = old_results[key][stat]
+        after = result[stat]
+        change = (after - before) / before if before else 0.0
+        marker = ''
+        if change > threshold:
+            marker = '  REGRESSION'
+            regressions += 1
+        elif change < -threshold:
+            marker = '  faster'
+        print(f"  {label:<60} {before * 1000:>10.3f} -> {after * 1000:>10.3f} ms  {change:+7.1%}{marker}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark suite')
+    subparsers = parser.add_subparsers(dest='command')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    compare_parser.add_argument('--stat', choices=['min', 'median', 'mean'], default='min')
+
+    parser.add_argument('--quick', action='store_true', help='Use small sizes')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='Run selected benchmarks')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<git sha>.json)')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        return compare(args.old, args.new, args.threshold, args.stat)
+    return run_suite(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic data for benchmarks and load tests
+
+Everything is generated from a fixed seed so results are comparable
+between runs and commits without the real dataset or network access.
+"""
+
+import json
+import numpy as np
+import pandas as pd
+
+# Gujarat bounding box (same as nasa_fire_fetcher.filter_gujarat_fires)
+LAT_MIN, LAT_MAX = 20.0, 24.75
+LON_MIN, LON_MAX = 68.0, 74.5
+
+# Shape of the real merged_village_temperature_data.csv
+DEFAULT_DISTRICTS = 33
+DEFAULT_TALUKAS = 235
+DEFAULT_VILLAGES = 72620
+
+
+def make_location_frame(villages=DEFAULT_VILLAGES, districts=DEFAULT_DISTRICTS,
+                        talukas=DEFAULT_TALUKAS, seed=0):
+    """Village rows with district/taluka names and coordinates"""
+    rng = np.random.default_rng(seed)
+
+    taluka_district = np.sort(rng.integers(0, districts, size=talukas))
+    taluka_district[:districts] = np.arange(districts)  # every district has a taluka
+    taluka_district.sort()
+    taluka_lat = rng.uniform(LAT_MIN + 0.3, LAT_MAX - 0.3, size=talukas)
+    taluka_lon = rng.uniform(LON_MIN + 0.3, LON_MAX - 0.3, size=talukas)
+
+    village_taluka = rng.integers(0, talukas, size=villages)
+    village_lat = taluka_lat[village_taluka] + rng.normal(0, 0.08, size=villages)
+    village_lon = taluka_lon[village_taluka] + rng.normal(0, 0.08, size=villages)
+
+    district_names = np.array([f"DISTRICT{d:02d}" for d in range(districts)])
+    taluka_names = np.array([f"Taluka {t:03d}" for t in range(talukas)])
+
+    return pd.DataFrame({
+        'District Name': district_names[taluka_district[village_taluka]],
+        'Taluka Name': taluka_names[village_taluka],
+        'Village Name': [f"Village {v:05d}" for v in range(villages)],
+        'Taluka Latitude': taluka_lat[village_taluka],
+        'Taluka Longitude': taluka_lon[village_taluka],
+        'Village Latitude': village_lat,
+        'Village Longitude': village_lon,
+        'Temperature': rng.normal(32, 4, size=villages).round(1),
+    })
+
+
+def write_location_csv(path, **kwargs):
+    """Write a synthetic merged_village_temperature_data.csv"""
+    df = make_location_frame(**kwargs)
+    df.to_csv(path, index=False)
+    return df
+
+
+def area_keys(location_df):
+    """Sorted (district, taluka) pairs present in a location frame"""
+    pairs = location_df[['District Name', 'Taluka Name']].drop_duplicates()
+    return sorted(map(tuple, pairs.itertuples(index=False)))
+
+
+def make_subscribers(users, areas, seed=0):
+    """subscribers.json content with `users` users spread over `areas`"""
+    rng = np.random.default_rng(seed)
+    # Skewed like real sign-ups: a few areas hold most subscribers
+    weights = rng.pareto(1.2, size=len(areas)) + 1
+    assignment = rng.choice(len(areas), size=users, p=weights / weights.sum())
+    subscribers = {f"{d}_{t}": [] for d, t in areas}
+    keys = list(subscribers)
+    for user_id, area in enumerate(assignment.tolist()):
+        subscribers[keys[area]].append(100000000 + user_id)
+    return subscribers
+
+
+def write_subscribers(path, users, areas, seed=0):
+    subscribers = make_subscribers(users, areas, seed)
+    with open(path, 'w') as f:
+        json.dump(subscribers, f)
+    return subscribers
+
+
+def make_alert_history(count, areas, sent_ratio=0.99, seed=0):
+    """pending_alerts.json content with mostly already-sent alerts"""
+    rng = np.random.default_rng(seed)
+    alerts = []
+    for i in range(count):
+        district, taluka = areas[int(rng.integers(0, len(areas)))]
+        sent = bool(rng.random() < sent_ratio)
+        alert = {
+            'id': f"{1700000000 + i}.{i % 1000000:06d}",
+            'district': district,
+            'taluka': taluka,
+            'message': 'Synthetic benchmark alert',
+            'type': 'weather',
+            'timestamp': '2025-01-01T00:00:00',
+            'sent': sent,
+        }
+        if sent:
+            alert['sent_at'] = '2025-01-01T00:01:00'
+        alerts.append(alert)
+    return alerts
+
+
+def write_alert_history(path, count, areas, sent_ratio=0.99, seed=0):
+    alerts = make_alert_history(count, areas, sent_ratio, seed)
+    with open(path, 'w') as f:
+        json.dump(alerts, f)
+    return alerts
+
+
+def make_fire_frame(count, seed=0):
+    """NASA FIRMS-like fire detections inside the Gujarat bounding box"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'latitude': rng.uniform(LAT_MIN, LAT_MAX, size=count),
+        'longitude': rng.uniform(LON_MIN, LON_MAX, size=count),
+        'brightness': rng.uniform(300, 360, size=count).round(1),
+        'acq_date': '2025-03-01',
+        'acq_time': rng.integers(0, 2400, size=count),
+        'confidence': rng.integers(30, 100, size=count),
+        'type': rng.integers(0, 4, size=count),
+    })
+
+
+def make_open_meteo_response(latitude, longitude, seed=0, hourly=None, forecast_days=1):
+    """Minimal Open-Meteo /v1/forecast JSON body for current weather
+
+    `hourly` (comma-separated variable names) adds an hourly block covering
+    forecast_days days from today's midnight, with a daily temperature cycle.
+    """
+    rng = np.random.default_rng((seed, int(abs(latitude) * 1000), int(abs(longitude) * 1000)))
+    temp = float(round(rng.normal(33, 5), 1))
+    body = {
+        'latitude': latitude,
+        'longitude': longitude,
+        'current': {
+            'temperature_2m': temp,
+            'relative_humidity_2m': int(rng.integers(20, 95)),
+            'wind_speed_10m': float(round(rng.uniform(0, 30), 1)),
+            'weather_code': int(rng.choice([0, 1, 2, 3, 61, 95])),
+        },
+        'daily': {
+            'temperature_2m_max': [round(temp + 4, 1)],
+            'temperature_2m_min': [round(temp - 8, 1)],
+            'weather_code': [0],
+        },
+    }
+    if hourly:
+        hours = np.arange(int(forecast_days) * 24)
+        midnight = pd.Timestamp.now().normalize()
+        # Coolest around 05:00, hottest around 15:00, drifting day to day
+        cycle = 6 * np.sin((hours % 24 - 9) / 24 * 2 * np.pi) + rng.normal(0, 1.5) * hours / 24
+        series = {
+            'temperature_2m': temp + cycle,
+            'apparent_temperature': temp + 1.2 * cycle + 2,
+            'relative_humidity_2m': np.clip(60 - 3 * cycle + rng.normal(0, 5, hours.size), 5, 100),
+            'wind_speed_10m': rng.uniform(0, 30, hours.size),
+        }
+        body['hourly'] = {'time': [(midnight + pd.Timedelta(hours=int(h))).strftime('%Y-%m-%dT%H:%M') for h in hours]}
+        for name in hourly.split(','):
+            body['hourly'][name] = np.round(series.get(name, np.zeros(hours.size)), 1).tolist()
+    return body
@@ -5,13 +5,27 @@ This keeps the bot running 24/7 independently
 """
 
 import os
+import time
+import socket
 import asyncio
+import numpy as np
 import pandas as pd
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
+import metrics
+from alert_tracing import AlertTrace
+from conversation_store import ConversationStore, STEP_DISTRICT, STEP_TALUKA
+from spatial_index import GridIndex
+from forecast import FORECAST_REFRESH_INTERVAL, queue_forecast_alerts
+from alert_digest import ALERT_DIGEST_WINDOW, format_digest, group_by_recipient, is_urgent, release_at
+from alert_scheduler import PRIORITY_CLASSES, PriorityScheduler, alert_deadline, priority_class
+from delivery_timer import DeliveryTimer
+from fanout import CpuMeter, RenderedMessage, get_sender
+import dispatcher_workers as shards
 
 # Load environment variables
 load_dotenv()
@@ -26,54 +40,184 @@ logger = logging.getLogger(__name__)
 # Bot configuration
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '8235992714:AAED7tTjm6waV6Ak-L-_LgRz37ZfnuEnE4w')
 PORT = int(os.environ.get('PORT', 8080))
+# Point at a local stand-in server for load testing (see loadtest/)
+TELEGRAM_API_BASE_URL = os.environ.get('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot')
+# How often the bot checks the queue for alerts from the website
+ALERT_POLL_INTERVAL = float(os.environ.get('ALERT_POLL_INTERVAL', 30))
+# Pause between alert messages to stay under Telegram's rate limit
+ALERT_SEND_INTERVAL = float(os.environ.get('ALERT_SEND_INTERVAL', 0.1))
+# Optional port for the bot's own /metrics endpoint (the web app serves its own)
+METRICS_PORT = os.environ.get('BOT_METRICS_PORT')
+# Identifies this dispatcher when several share one backend
+DISPATCHER_ID = f"{socket.gethostname()}:{os.getpid()}"
+# A dispatcher's claim on an alert lapses this long after its last renewal
+# (renewed every third of it while sending), so a dead dispatcher's alerts
+# are picked up by another
+ALERT_CLAIM_TTL = float(os.environ.get('ALERT_CLAIM_TTL', 300))
+# Shared locations farther than this from every village are rejected
+MAX_LOCATION_DISTANCE_KM = float(os.environ.get('MAX_LOCATION_DISTANCE_KM', 50))
 
 # Global data
-user_data = {}
+conversations = ConversationStore()
 districts = []
 talukas_data = {}
+# Case-folded name -> position in districts / talukas_data[district], used as compact IDs
+district_ids = {}
+taluka_ids = {}
+# Inline keyboard pages for the /subscribe flow, built once by load_data()
+district_pages = []
+taluka_pages = {}
+
+# Nearest-village lookup for shared locations, built once by load_data():
+# point i lies in districts[location_areas[i, 0]] / taluka location_areas[i, 1]
+location_index = None
+location_areas = None
+location_names = []
+
+# Buttons per keyboard page and per row
+KEYBOARD_PAGE_SIZE = 12
+KEYBOARD_COLUMNS = 2
 
 # Import shared data system
 from shared_data import (
     load_subscribers, save_subscribers, add_subscriber, remove_subscriber,
-    get_user_subscription, get_subscribers_for_area, queue_alert,
-    get_pending_alerts, mark_alert_sent, send_alert_to_subscribers
+    get_user_subscription, get_user_subscriptions, get_subscribers_for_area,
+    get_alert_recipients, queue_alert,
+    get_pending_alerts, mark_alert_sent,
+    get_schedule_version, get_scheduled_alert_times, release_due_alerts,
+    load_location_data, claim_alert, renew_claim, release_claim, add_alert_listener
 )
 
+# Alert processing is triggered by the job queue and by user commands;
+# only one run may work through the queue at a time
+_alert_processing_lock = asyncio.Lock()
+# Timer that reruns the dispatcher when held (digest) alerts become due
+_digest_wakeup = None
+# Set when alerts arrive during a run so it admits them before its next send
+_admission_requested = False
+# Alerts scheduled for later (deliver_at): a heap of due times, re-read when the schedule changes
+_delivery_timer = DeliveryTimer()
+_schedule_version = None
+_delivery_wakeup = None
+
 def load_data():
     """Load CSV data"""
     global districts, talukas_data
     try:
-        # Try to load from different possible locations
-        csv_files = [
-            'merged_village_temperature_data.csv',
-            'static/merged_village_temperature_data.csv',
-            '/app/merged_village_temperature_data.csv'
-        ]
-        
-        df = None
-        for csv_file in csv_files:
-            try:
-                df = pd.read_csv(csv_file)
-                logger.info(f"✅ Loaded data from {csv_file}")
-                break
-            except FileNotFoundError:
-                continue
+        df = load_location_data()
         
-        if df is None:
-            logger.error("❌ Could not find CSV data file")
+        if df.empty:
             return
         
-        districts = sorted(df['District Name'].unique())
+        # One pass over the distinct areas; names are the dataset's interned strings, not copies
+        areas = df[['District Name', 'Taluka Name']].dropna().drop_duplicates()
+        districts = sorted(areas['District Name'].unique())
         
         # Create district -> talukas mapping
-        for district in districts:
-            district_talukas = df[df['District Name'] == district]['Taluka Name'].unique()
-            talukas_data[district] = sorted(district_talukas)
+        for district, group in areas.groupby('District Name', observed=True):
+            talukas_data[district] = sorted(group['Taluka Name'])
+            taluka_ids[district] = {taluka.casefold(): i for i, taluka in enumerate(talukas_data[district])}
+        district_ids.update((district.casefold(), i) for i, district in enumerate(districts))
+        build_keyboards()
+        build_location_index(df)
         
         logger.info(f"✅ Loaded {len(districts)} districts and {len(df)} location records")
     except Exception as e:
         logger.error(f"❌ Error loading data: {e}")
 
+def build_location_index(df):
+    """Index village coordinates (or taluka centres if the dataset has none) for /subscribe by location"""
+    global location_index, location_areas, location_names
+    df = df.dropna(subset=['District Name', 'Taluka Name'])
+    if {'Village Latitude', 'Village Longitude'} <= set(df.columns):
+        points = df.dropna(subset=['Village Latitude', 'Village Longitude'])
+        lats, lons = points['Village Latitude'], points['Village Longitude']
+        names = points['Village Name'].tolist() if 'Village Name' in points else []
+    else:
+        points = df.dropna(subset=['Taluka Latitude', 'Taluka Longitude'])
+        points = points.drop_duplicates(subset=['District Name', 'Taluka Name'])
+        lats, lons = points['Taluka Latitude'], points['Taluka Longitude']
+        names = []
+    if points.empty:
+        return
+    
+    area_ids = {
+        (district, taluka): (district_id, i)
+        for district_id, district in enumerate(districts)
+        for i, taluka in enumerate(talukas_data[district])
+    }
+    location_areas = np.array(
+        [area_ids[area] for area in zip(points['District Name'], points['Taluka Name'])], dtype=np.int32)
+    location_names = names
+    location_index = GridIndex(lats.to_numpy(), lons.to_numpy())
+    logger.info(f"📍 Indexed {len(location_areas)} locations for location sharing")
+
+def _paged_keyboard(labels, choice_data, page_data, footer):
+    """Inline keyboard pages offering labels, KEYBOARD_PAGE_SIZE per page"""
+    page_count = max(1, -(-len(labels) // KEYBOARD_PAGE_SIZE))
+    pages = []
+    for page in range(page_count):
+        first = page * KEYBOARD_PAGE_SIZE
+        buttons = [
+            InlineKeyboardButton(labels[i], callback_data=choice_data(i))
+            for i in range(first, min(first + KEYBOARD_PAGE_SIZE, len(labels)))
+        ]
+        rows = [buttons[i:i + KEYBOARD_COLUMNS] for i in range(0, len(buttons), KEYBOARD_COLUMNS)]
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("◀ Prev", callback_data=page_data(page - 1)))
+        if page < page_count - 1:
+            navigation.append(InlineKeyboardButton("More ▶", callback_data=page_data(page + 1)))
+        if navigation:
+            rows.append(navigation)
+        rows.append(footer)
+        pages.append(InlineKeyboardMarkup(rows))
+    return pages
+
+def build_keyboards():
+    """Precompute every district and taluka keyboard page
+
+    callback_data holds only IDs (positions in districts / talukas_data):
+      dp:<page>           district page
+      d:<d>               district chosen
+      tp:<d>:<page>       taluka page of district d
+      t:<d>:<t>           taluka chosen (subscribes)
+      x                   cancel
+    """
+    cancel = InlineKeyboardButton("❌ Cancel", callback_data="x")
+    district_pages[:] = _paged_keyboard(
+        districts, lambda i: f"d:{i}", lambda page: f"dp:{page}", [cancel])
+    
+    back = InlineKeyboardButton("◀ Back", callback_data="dp:0")
+    taluka_pages.clear()
+    for district_id, district in enumerate(districts):
+        taluka_pages[district_id] = _paged_keyboard(
+            talukas_data[district],
+            lambda i, d=district_id: f"t:{d}:{i}",
+            lambda page, d=district_id: f"tp:{d}:{page}",
+            [back, cancel])
+
+def parse_callback_data(data):
+    """Split and validate subscribe callback_data; None if stale or malformed"""
+    kind, _, rest = (data or '').partition(':')
+    try:
+        ids = [int(part) for part in rest.split(':')] if rest else []
+    except ValueError:
+        return None
+    if kind == 'x' and not ids:
+        return kind, ids
+    if kind == 'dp' and len(ids) == 1 and 0 <= ids[0] < len(district_pages):
+        return kind, ids
+    if kind in ('d', 'tp', 't') and ids and 0 <= ids[0] < len(districts):
+        district_id = ids[0]
+        if kind == 'd' and len(ids) == 1:
+            return kind, ids
+        if kind == 'tp' and len(ids) == 2 and 0 <= ids[1] < len(taluka_pages[district_id]):
+            return kind, ids
+        if kind == 't' and len(ids) == 2 and 0 <= ids[1] < len(talukas_data[districts[district_id]]):
+            return kind, ids
+    return None
+
 def get_fire_alerts_for_area(district, taluka):
     """Get fire alerts for specific area"""
     try:
@@ -143,7 +287,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 Commands:
 /start - Start the bot
 /subscribe - Subscribe to weather alerts
-/unsubscribe - Unsubscribe from alerts
+/unsubscribe - Unsubscribe from all areas
+/unsubscribe <taluka> - Stop alerts for one taluka
 /mystatus - Check subscription status
 /weather - Get current weather for your area
 /fire - Check recent fire alerts in your area
@@ -151,11 +296,12 @@ Commands:
 
 How to subscribe:
 1. Send /subscribe
-2. Choose your district
-3. Choose your taluka
-4. Confirm subscription
+2. Tap (or type) your district
+3. Tap (or type) your taluka - that's it!
 
-You'll get real-time weather alerts for your selected area!"""
+Or just share your location (📎 → Location) to subscribe to the nearest taluka.
+
+Repeat /subscribe to follow more talukas. You'll get real-time weather alerts for every area you follow!"""
     
     await update.message.reply_text(help_text)
 
@@ -173,115 +319,137 @@ async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Sorry, location data is not available. Please try again later.")
         return
     
-    # Show first 10 districts
-    keyboard = [[district] for district in districts[:10]]
-    if len(districts) > 10:
-        keyboard.append(["Show More Districts"])
-    
-    reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
-    user_data[user_id] = {'step': 'district'}
+    conversations.set(user_id, STEP_DISTRICT)
     
     await update.message.reply_text(
-        "📍 Please select your district:",
-        reply_markup=reply_markup
+        "📍 Please select your district (or type its name).\n"
+        "📎 Tip: share your location to subscribe in one step.",
+        reply_markup=district_pages[0]
     )
 
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle text messages"""
+def _taluka_prompt(district_id):
+    return f"✅ Selected: {districts[district_id]}\n📍 Now select your taluka (or type its name):"
+
+async def _subscribe_user(user_id, district_id, taluka_id):
+    """Save the subscription and get the confirmation text"""
+    district = districts[district_id]
+    taluka = talukas_data[district][taluka_id]
+    conversations.pop(user_id)
+    
+    # Save subscription using shared data system
+    await asyncio.to_thread(add_subscriber, user_id, district, taluka)
+    subscriptions = await asyncio.to_thread(get_user_subscriptions, user_id)
+    areas = "\n".join(f"   {s['taluka']}, {s['district']}" for s in subscriptions)
+    logger.info(f"User {user_id} subscribed to {district} -> {taluka}")
+    
+    return (
+        f"🎉 Successfully subscribed!\n\n"
+        f"📍 You'll receive weather alerts for:\n"
+        f"{areas}\n\n"
+        f"Commands:\n"
+        f"/subscribe - Add another area\n"
+        f"/mystatus - Check subscription\n"
+        f"/unsubscribe {taluka} - Stop alerts for {taluka}"
+    )
+
+async def subscribe_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle district/taluka keyboard presses by editing the keyboard message in place"""
+    query = update.callback_query
     user_id = update.effective_user.id
-    text = update.message.text
+    await query.answer()
     
-    if user_id not in user_data:
-        await update.message.reply_text("Please use /subscribe to start.")
+    parsed = parse_callback_data(query.data)
+    if parsed is None:
+        await query.edit_message_text("⌛ This menu has expired. Please use /subscribe again.")
         return
+    kind, ids = parsed
+    
+    if kind == 'x':
+        conversations.pop(user_id)
+        await query.edit_message_text("❌ Subscription cancelled.")
+    elif kind == 'dp':
+        conversations.set(user_id, STEP_DISTRICT)
+        await query.edit_message_text("📍 Please select your district (or type its name):",
+                                      reply_markup=district_pages[ids[0]])
+    elif kind in ('d', 'tp'):
+        district_id = ids[0]
+        page = ids[1] if kind == 'tp' else 0
+        conversations.set(user_id, STEP_TALUKA, district_id)
+        await query.edit_message_text(_taluka_prompt(district_id),
+                                      reply_markup=taluka_pages[district_id][page])
+    elif kind == 't':
+        await query.edit_message_text(await _subscribe_user(user_id, *ids))
+
+async def handle_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Subscribe to the taluka of the village nearest to a shared location"""
+    user_id = update.effective_user.id
+    location = update.message.location
     
-    step = user_data[user_id]['step']
+    if location_index is None:
+        await update.message.reply_text("❌ Sorry, location data is not available. Please use /subscribe.")
+        return
     
-    if step == 'district':
-        if text == "Show More Districts":
-            keyboard = [[district] for district in districts[10:]]
-            reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
-            await update.message.reply_text("📍 Select your district:", reply_markup=reply_markup)
-            return
-        
-        if text not in districts:
-            await update.message.reply_text("Please select a valid district from the options.")
-            return
-        
-        # Show talukas for selected district
-        district_talukas = talukas_data[text][:15]  # First 15 talukas
-        keyboard = [[taluka] for taluka in district_talukas]
-        if len(talukas_data[text]) > 15:
-            keyboard.append(["Show More Talukas"])
-        
-        reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
-        user_data[user_id] = {'step': 'taluka', 'district': text, 'all_talukas': talukas_data[text]}
-        
+    point, distance_km = location_index.nearest(location.latitude, location.longitude,
+                                                max_km=MAX_LOCATION_DISTANCE_KM)
+    if point is None:
         await update.message.reply_text(
-            f"✅ Selected: {text}\n📍 Now select your taluka:",
-            reply_markup=reply_markup
+            f"📍 That location is more than {MAX_LOCATION_DISTANCE_KM:.0f} km from any village we cover.\n"
+            f"Please use /subscribe to choose your taluka."
         )
+        return
     
-    elif step == 'taluka':
-        district = user_data[user_id]['district']
-        all_talukas = user_data[user_id]['all_talukas']
-        
-        if text == "Show More Talukas":
-            remaining_talukas = all_talukas[15:]
-            keyboard = [[taluka] for taluka in remaining_talukas]
-            reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
-            await update.message.reply_text("📍 Select your taluka:", reply_markup=reply_markup)
+    district_id, taluka_id = (int(i) for i in location_areas[point])
+    nearest = f"📍 Nearest village: {location_names[point]} ({distance_km:.1f} km away)\n\n" if location_names else ""
+    await update.message.reply_text(nearest + await _subscribe_user(user_id, district_id, taluka_id))
+
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle typed district/taluka names during /subscribe"""
+    user_id = update.effective_user.id
+    text = update.message.text.strip().casefold()
+    
+    state = conversations.get(user_id)
+    # A state restored from an older dataset may point past the current lists
+    if state is None or state.district_id >= len(districts):
+        await update.message.reply_text("Please use /subscribe to start.")
+        return
+    
+    if state.step == STEP_DISTRICT:
+        district_id = district_ids.get(text)
+        if district_id is None:
+            await update.message.reply_text("Please select a valid district from the options.",
+                                            reply_markup=district_pages[0])
             return
         
-        if text not in all_talukas:
-            await update.message.reply_text("Please select a valid taluka from the options.")
+        conversations.set(user_id, STEP_TALUKA, district_id)
+        await update.message.reply_text(_taluka_prompt(district_id),
+                                        reply_markup=taluka_pages[district_id][0])
+    
+    elif state.step == STEP_TALUKA:
+        taluka_id = taluka_ids[districts[state.district_id]].get(text)
+        if taluka_id is None:
+            await update.message.reply_text("Please select a valid taluka from the options.",
+                                            reply_markup=taluka_pages[state.district_id][0])
             return
         
-        # Confirmation
-        keyboard = [["✅ Yes, Subscribe"], ["❌ Cancel"]]
-        reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
-        user_data[user_id] = {'step': 'confirm', 'district': district, 'taluka': text}
-        
-        await update.message.reply_text(
-            f"📋 Confirm subscription:\n\n"
-            f"📍 District: {district}\n"
-            f"📍 Taluka: {text}\n\n"
-            f"You'll receive weather alerts for this location.",
-            reply_markup=reply_markup
-        )
-    
-    elif step == 'confirm':
-        if text == "✅ Yes, Subscribe":
-            district = user_data[user_id]['district']
-            taluka = user_data[user_id]['taluka']
-            
-            # Save subscription using shared data system
-            add_subscriber(user_id, district, taluka)
-            
-            await update.message.reply_text(
-                f"🎉 Successfully subscribed!\n\n"
-                f"📍 You'll receive weather alerts for:\n"
-                f"   {taluka}, {district}\n\n"
-                f"Commands:\n"
-                f"/mystatus - Check subscription\n"
-                f"/unsubscribe - Unsubscribe",
-                reply_markup=ReplyKeyboardRemove()
-            )
-            
-            logger.info(f"User {user_id} subscribed to {district} -> {taluka}")
-        else:
-            await update.message.reply_text(
-                "❌ Subscription cancelled.",
-                reply_markup=ReplyKeyboardRemove()
-            )
-        
-        del user_data[user_id]
+        await update.message.reply_text(await _subscribe_user(user_id, state.district_id, taluka_id))
 
 async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Unsubscribe command"""
+    """Unsubscribe command (/unsubscribe <taluka> leaves one area)"""
     user_id = update.effective_user.id
     
-    if remove_subscriber(user_id):
+    if context.args:
+        name = " ".join(context.args).lower()
+        subscriptions = await asyncio.to_thread(get_user_subscriptions, user_id)
+        matches = [s for s in subscriptions if s['taluka'].lower() == name]
+        if not matches:
+            await update.message.reply_text(f"You are not subscribed to {' '.join(context.args)}. Check /mystatus.")
+            return
+        for subscription in matches:
+            await asyncio.to_thread(remove_subscriber, user_id, subscription['district'], subscription['taluka'])
+        await update.message.reply_text(f"✅ Unsubscribed from {matches[0]['taluka']}, {matches[0]['district']}.")
+        return
+    
+    if await asyncio.to_thread(remove_subscriber, user_id):
         await update.message.reply_text("✅ Successfully unsubscribed from all alerts!")
         logger.info(f"User {user_id} unsubscribed")
     else:
@@ -291,18 +459,20 @@ async def mystatus(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Status command"""
     user_id = update.effective_user.id
     
-    subscription = get_user_subscription(user_id)
+    subscriptions = await asyncio.to_thread(get_user_subscriptions, user_id)
     
-    if subscription:
-        district = subscription['district']
-        taluka = subscription['taluka']
-        
-        status_text = f"📊 Your Subscription Status:\n\n📍 {taluka}, {district}"
+    if subscriptions:
+        status_text = "📊 Your Subscription Status:\n"
         
-        # Check for recent fire alerts in subscribed area
-        fire_alerts = get_fire_alerts_for_area(district, taluka)
-        if fire_alerts:
-            status_text += f"\n🔥 {len(fire_alerts)} recent fire incident(s)"
+        for subscription in subscriptions:
+            district = subscription['district']
+            taluka = subscription['taluka']
+            status_text += f"\n📍 {taluka}, {district}"
+            
+            # Check for recent fire alerts in subscribed area
+            fire_alerts = get_fire_alerts_for_area(district, taluka)
+            if fire_alerts:
+                status_text += f"\n   🔥 {len(fire_alerts)} recent fire incident(s)"
     else:
         status_text = "📊 You are not subscribed to any alerts.\n\nUse /subscribe to get started!"
     
@@ -312,16 +482,14 @@ async def fire_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Fire alerts command"""
     user_id = update.effective_user.id
     
-    # Check user's subscribed area
-    subscription = get_user_subscription(user_id)
+    # Check user's subscribed areas
+    subscriptions = await asyncio.to_thread(get_user_subscriptions, user_id)
     
-    if not subscription:
+    if not subscriptions:
         await update.message.reply_text("You are not subscribed to any areas. Use /subscribe first!")
         return
     
-    district = subscription['district']
-    taluka = subscription['taluka']
-    user_areas = [(district, taluka)]
+    user_areas = [(s['district'], s['taluka']) for s in subscriptions]
     
     # Get fire alerts for user's areas
     all_alerts = []
@@ -344,42 +512,21 @@ async def fire_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(alert_text)
 
 async def send_weather_alert_to_subscribers(district, taluka, message):
-    """Send weather alert to subscribers of a specific area"""
-    try:
-        key = f"{district}_{taluka}"
-        if key in subscribers and subscribers[key]:
-            # Get bot application
-            application = Application.builder().token(TOKEN).build()
-            
-            for user_id in subscribers[key]:
-                try:
-                    await application.bot.send_message(
-                        chat_id=user_id,
-                        text=f"⚠️ WEATHER ALERT\n\n{message}\n\n📍 Location: {taluka}, {district}\n🕐 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                    )
-                    logger.info(f"Weather alert sent to user {user_id}")
-                except Exception as e:
-                    logger.error(f"Failed to send alert to user {user_id}: {e}")
-            
-            return True
-    except Exception as e:
-        logger.error(f"Error sending weather alert: {e}")
-        return False
+    """Queue a weather alert for an area's subscribers (sent by the alert dispatcher)"""
+    return await asyncio.to_thread(queue_alert, district, taluka, message, 'weather')
 
 async def weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Get current weather for subscribed area"""
     user_id = update.effective_user.id
     
-    # Check user's subscribed area
-    subscription = get_user_subscription(user_id)
+    # Check user's subscribed areas
+    subscriptions = await asyncio.to_thread(get_user_subscriptions, user_id)
     
-    if not subscription:
+    if not subscriptions:
         await update.message.reply_text("You are not subscribed to any areas. Use /subscribe first!")
         return
     
-    district = subscription['district']
-    taluka = subscription['taluka']
-    user_areas = [(district, taluka)]
+    user_areas = [(s['district'], s['taluka']) for s in subscriptions]
     
     # Get weather for user's areas
     try:
@@ -408,67 +555,303 @@ async def weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error getting weather: {e}")
         await update.message.reply_text("❌ Error fetching weather data. Please try again later.")
 
-async def process_pending_alerts(application):
-    """Process pending alerts from the website"""
+def _retry_after_seconds(error):
+    """Get the flood-control wait from a RetryAfter error in seconds"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+async def send_alert_message(sender, chat_id, message, max_retries=3):
+    """Send one rendered alert message (see fanout.py), waiting out Telegram flood control"""
+    for attempt in range(max_retries + 1):
+        start = time.perf_counter()
+        try:
+            await sender.send(chat_id, message)
+            metrics.FANOUT_SEND_SECONDS.observe(time.perf_counter() - start)
+            metrics.FANOUT_SENDS.labels('sent').inc()
+            return True
+        except RetryAfter as e:
+            wait = _retry_after_seconds(e)
+            metrics.FANOUT_RETRY_AFTER.inc()
+            metrics.FANOUT_RETRY_AFTER_SECONDS.inc(wait)
+            if attempt == max_retries:
+                metrics.FANOUT_SENDS.labels('failed').inc()
+                raise
+            logger.warning(f"Flood control for {chat_id}, waiting {wait}s")
+            await asyncio.sleep(wait)
+        except Exception:
+            metrics.FANOUT_SENDS.labels('failed').inc()
+            raise
+
+async def check_forecast_alerts(context=None):
+    """Refresh the hourly forecast and queue "heat expected tomorrow" alerts"""
+    try:
+        await asyncio.to_thread(queue_forecast_alerts, owner=DISPATCHER_ID)
+    except Exception as e:
+        logger.error(f"Error checking forecast alerts: {e}")
+
+async def process_pending_alerts(application, wait=False):
+    """Process pending alerts from the website
+
+    If another run is already working through the queue, it picks up new
+    alerts straight away; return at once (or, with wait=True, run again
+    after it finishes).
+    """
+    global _admission_requested
+    # In worker mode (see dispatcher_workers.py) only the workers send
+    if shards.sharded() and not shards.is_worker():
+        return
+    await release_scheduled_alerts(application)
+    if _alert_processing_lock.locked():
+        _admission_requested = True
+        if not wait:
+            return
+    async with _alert_processing_lock:
+        await _process_pending_alerts(application)
+
+async def release_scheduled_alerts(application):
+    """Queue scheduled alerts that are due and set a timer for the next one"""
+    global _schedule_version, _delivery_wakeup
+    try:
+        version = await asyncio.to_thread(get_schedule_version)
+        if version != _schedule_version:
+            _schedule_version = version
+            _delivery_timer.reset(await asyncio.to_thread(get_scheduled_alert_times))
+            metrics.ALERTS_SCHEDULED.set(len(_delivery_timer))
+        
+        if _delivery_timer.pop_due(time.time()):
+            released = await asyncio.to_thread(release_due_alerts)
+            if released:
+                logger.info(f"⏰ {len(released)} scheduled alerts are due")
+            else:
+                # Released by another dispatcher (or failed); re-read the schedule next time
+                _schedule_version = None
+        
+        if _delivery_wakeup is not None:
+            _delivery_wakeup.cancel()
+            _delivery_wakeup = None
+        next_due = _delivery_timer.next_due()
+        if next_due is not None:
+            loop = asyncio.get_running_loop()
+            _delivery_wakeup = loop.call_later(
+                max(0, next_due - time.time()),
+                lambda: asyncio.create_task(process_pending_alerts(application, wait=True)))
+    except Exception as e:
+        logger.error(f"Error releasing scheduled alerts: {str(e)}")
+
+def _schedule_digest_wakeup(application, delay):
+    """Run the dispatcher again when the next alert held for a digest is due"""
+    global _digest_wakeup
+    loop = asyncio.get_running_loop()
+    due = loop.time() + delay
+    if _digest_wakeup is not None and loop.time() < _digest_wakeup.when() <= due:
+        return
+    if _digest_wakeup is not None:
+        _digest_wakeup.cancel()
+    _digest_wakeup = loop.call_later(
+        delay, lambda: asyncio.create_task(process_pending_alerts(application, wait=True)))
+
+async def _send_to_users(bot, user_ids, messages, traces):
+    """Send the rendered messages to each user, recording every delivery on each alert's trace"""
+    sender = get_sender(bot)
+    for user_id in user_ids:
+        send_start = time.perf_counter()
+        try:
+            for message in messages:
+                if shards.is_worker():
+                    await shards.take_send_slot()  # Shared by all workers
+                    await send_alert_message(sender, int(user_id), message)
+                    continue
+                await send_alert_message(sender, int(user_id), message)
+                await asyncio.sleep(ALERT_SEND_INTERVAL)  # Prevent rate limiting
+            for trace in traces:
+                trace.record_send(time.perf_counter() - send_start)
+        except Exception as e:
+            for trace in traces:
+                trace.record_send(time.perf_counter() - send_start, success=False)
+            logger.error(f"Failed to send alert to {user_id}: {str(e)}")
+
+def _renew_claims(alert_ids):
+    """Keep this dispatcher's claims on the alerts it is still sending"""
+    for alert_id in alert_ids:
+        if not renew_claim(shards.claim_id(alert_id), DISPATCHER_ID, int(ALERT_CLAIM_TTL)):
+            logger.warning(f"Claim on alert {alert_id} lapsed; another dispatcher may send it too")
+
+def _finish_alert(alert, trace):
+    metrics.ALERT_QUEUE_DEPTH.dec()
+    # In worker mode the last shard to finish completes the alert for all of them
+    if shards.is_worker() and not shards.complete_shard(trace):
+        logger.info(f"Alert {alert.get('id', '')} shard {shards.DISPATCHER_SHARD}: "
+                    f"Sent to {trace.sent} users, Failed: {trace.failed}")
+        return
+    logger.info(f"Alert {alert.get('id', '')}: Sent to {trace.sent} users, Failed: {trace.failed}")
+    # Mark as sent even if some failed
+    mark_alert_sent(alert.get('id', ''))
+    release_claim(shards.claim_id(alert.get('id', '')), DISPATCHER_ID)
+    trace.save()
+
+def _admit_alerts(scheduler, active):
+    """Claim newly due alerts and add their sends to the scheduler
+
+    `active` maps alert id -> [alert, trace, sends left] for the alerts this
+    run is sending. Returns the seconds until the next alert held for a
+    digest is due (None if there is none). Runs in a worker thread, since
+    it reads and writes the backend.
+    """
+    pending_alerts = get_pending_alerts()
+    metrics.ALERT_QUEUE_DEPTH.set(len(pending_alerts))
+    if shards.is_worker():
+        # Pending until every shard is done; skip those this shard has finished
+        finished = shards.finished_here([alert.get('id', '') for alert in pending_alerts])
+        pending_alerts = [alert for alert in pending_alerts if alert.get('id', '') not in finished]
+    
+    # Non-urgent alerts wait out the digest window so later ones can join them
+    now = time.time()
+    due = []
+    next_release = None
+    for alert in pending_alerts:
+        if alert.get('id', '') in active:
+            continue
+        try:
+            release = release_at(alert, ALERT_DIGEST_WINDOW)
+        except (KeyError, ValueError):
+            release = now
+        if release <= now:
+            due.append(alert)
+        else:
+            next_release = min(next_release or release, release)
+    
+    batch = []
+    for alert in due:
+        # Another dispatcher sharing the backend may already be sending it
+        if not claim_alert(shards.claim_id(alert.get('id', '')), DISPATCHER_ID, int(ALERT_CLAIM_TTL)):
+            continue
+        
+        trace = AlertTrace(alert)
+        
+        try:
+            age = (datetime.now() - datetime.fromisoformat(alert['timestamp'])).total_seconds()
+            metrics.ALERT_AGE_SECONDS.labels(alert.get('type', 'custom')).observe(age)
+        except (KeyError, ValueError):
+            pass
+        
+        # Everyone following an area the alert covers, each user once
+        recipients = get_alert_recipients(alert)
+        if shards.is_worker():
+            recipients = {user_id for user_id in recipients if shards.shard_of(user_id) == shards.DISPATCHER_SHARD}
+        trace.recipients = len(recipients)
+        if not recipients:
+            logger.info(f"No subscribers found for {alert['district']} -> {alert['taluka']}")
+        active[alert.get('id', '')] = [alert, trace, 0]
+        batch.append((alert, recipients))
+    if batch:
+        logger.info(f"Processing {len(batch)} pending alerts...")
+    
+    # Urgent alerts go out on their own; the rest as one digest per recipient,
+    # where users with the same alerts share the rendered text
+    flows = [([alert], recipients) for alert, recipients in batch if is_urgent(alert)]
+    regular = [(alert, recipients) for alert, recipients in batch if not is_urgent(alert)]
+    groups = group_by_recipient([alert for alert, _ in regular], [r for _, r in regular])
+    flows.extend(([regular[i][0] for i in indices], user_ids) for indices, user_ids in groups.items())
+    
+    for alerts, user_ids in flows:
+        # Rendered and serialized once for all of the flow's recipients
+        with CpuMeter():
+            texts = [RenderedMessage(text) for text in format_digest(alerts)]
+        if len(alerts) > len(texts):
+            metrics.FANOUT_COALESCED.inc((len(alerts) - len(texts)) * len(user_ids))
+        key = tuple(alert.get('id', '') for alert in alerts)
+        priority = min(map(priority_class, alerts), key=PRIORITY_CLASSES.index)
+        deadline = min(alert_deadline(alert, now) for alert in alerts)
+        scheduler.add(key, priority, deadline, [(user_id, texts) for user_id in sorted(user_ids)])
+        for alert_id in key:
+            active[alert_id][2] += len(user_ids)
+    
+    for alert, _ in batch:
+        if active[alert.get('id', '')][2] == 0:
+            _finish_alert(alert, active.pop(alert.get('id', ''))[1])
+    return None if next_release is None else next_release - now
+
+async def _process_pending_alerts(application):
+    global _admission_requested
     try:
-        pending_alerts = get_pending_alerts()
-        logger.info(f"Processing {len(pending_alerts)} pending alerts...")
+        if shards.is_worker():
+            scheduler = PriorityScheduler(shards.DISPATCHER_SHARDS / shards.ALERT_SEND_RATE)
+        else:
+            scheduler = PriorityScheduler(ALERT_SEND_INTERVAL)
+        active = {}
+        _admission_requested = True
+        last_admitted = 0
+        last_reported = 0
+        last_renewed = time.monotonic()
+        cpu_start = metrics.FANOUT_CPU_SECONDS.value()
+        messages = 0
         
-        for alert in pending_alerts:
-            district = alert['district']
-            taluka = alert['taluka']
-            message = alert['message']
-            alert_id = alert.get('id', '')
+        while True:
+            # New alerts join the running fan-out instead of waiting for it to end
+            if _admission_requested or time.monotonic() - last_admitted >= ALERT_POLL_INTERVAL:
+                _admission_requested = False
+                last_admitted = time.monotonic()
+                # The backend calls block, so they run off the event loop
+                digest_due = await asyncio.to_thread(_admit_alerts, scheduler, active)
+                if digest_due is not None:
+                    _schedule_digest_wakeup(application, digest_due)
+            if shards.is_worker() and time.monotonic() - last_reported >= shards.SHARD_PROGRESS_INTERVAL:
+                last_reported = time.monotonic()
+                await asyncio.to_thread(shards.report_progress, [trace for _, trace, _ in active.values()])
+            if time.monotonic() - last_renewed >= ALERT_CLAIM_TTL / 3:
+                last_renewed = time.monotonic()
+                await asyncio.to_thread(_renew_claims, list(active))
             
-            # Get subscribers for this area
-            subscribers_list = get_subscribers_for_area(district, taluka)
+            picked = scheduler.next(time.time())
+            if picked is None:
+                break
+            flow, (user_id, texts) = picked
+            entries = [active[alert_id] for alert_id in flow.key]
+            for alert, trace, _ in entries:
+                if trace.sent or trace.failed:
+                    continue
+                try:
+                    wait = time.time() - datetime.fromisoformat(alert['timestamp']).timestamp()
+                    metrics.ALERT_QUEUE_WAIT_SECONDS.labels(priority_class(alert)).observe(wait)
+                except (KeyError, ValueError):
+                    pass
             
-            if subscribers_list:
-                sent_count = 0
-                failed_count = 0
-                
-                # Format alert message
-                alert_text = (
-                    f"🚨 WEATHER ALERT\n\n"
-                    f"{message}\n\n"
-                    f"📍 {taluka}, {district}\n"
-                    f"🕒 {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-                )
-                
-                for user_id in subscribers_list:
-                    try:
-                        await application.bot.send_message(
-                            chat_id=int(user_id),  # Convert to int
-                            text=alert_text,
-                            parse_mode='HTML'
-                        )
-                        sent_count += 1
-                        await asyncio.sleep(0.1)  # Prevent rate limiting
-                    except Exception as e:
-                        failed_count += 1
-                        logger.error(f"Failed to send alert to {user_id}: {str(e)}")
-                
-                logger.info(f"Alert {alert_id}: Sent to {sent_count} users, Failed: {failed_count}")
-            else:
-                logger.info(f"No subscribers found for {district} -> {taluka}")
+            await _send_to_users(application.bot, [user_id], texts, [trace for _, trace, _ in entries])
+            messages += len(texts)
             
-            # Mark as sent even if some failed
-            mark_alert_sent(alert_id)
+            for entry in entries:
+                entry[2] -= 1
+                if entry[2] == 0:
+                    alert, trace, _ = entry
+                    if time.time() > alert_deadline(alert):
+                        metrics.ALERT_DEADLINE_MISSED.labels(priority_class(alert)).inc()
+                    del active[alert.get('id', '')]
+                    await asyncio.to_thread(_finish_alert, alert, trace)
+            
+        if messages:
+            cpu_seconds = metrics.FANOUT_CPU_SECONDS.value() - cpu_start
+            logger.info(f"Fan-out: {messages} messages, {cpu_seconds / messages * 1000:.3f} ms "
+                        f"render/serialize CPU per message")
             
     except Exception as e:
         logger.error(f"Error processing alerts: {str(e)}")
 
-def main():
-    """Run the bot"""
-    logger.info("🚀 Starting Gujarat Weather Alert Bot...")
-    logger.info("🤖 Bot Username: @VillaegWarningbot")
-    logger.info("🔗 Bot Link: https://t.me/VillaegWarningbot")
-    
-    # Load data
-    load_data()
-    
-    # Create application
-    application = Application.builder().token(TOKEN).build()
+async def save_conversations(application):
+    """Keep unfinished /subscribe flows across restarts (if CONVERSATION_STATE_FILE is set)"""
+    conversations.save()
+
+def build_application():
+    """Create the bot application with all handlers registered"""
+    conversations.load()
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(TELEGRAM_API_BASE_URL)
+        .post_shutdown(save_conversations)
+        .build()
+    )
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
@@ -478,22 +861,51 @@ def main():
     application.add_handler(CommandHandler("mystatus", mystatus))
     application.add_handler(CommandHandler("fire", fire_alerts))
     application.add_handler(CommandHandler("weather", weather_command))
+    application.add_handler(CallbackQueryHandler(subscribe_button, pattern=r"^(x|dp|d|tp|t)(:|$)"))
+    application.add_handler(MessageHandler(filters.LOCATION, handle_location))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     
-    # Add job to process pending alerts every 30 seconds
+    return application
+
+def main():
+    """Run the bot"""
+    logger.info("🚀 Starting Gujarat Weather Alert Bot...")
+    logger.info("🤖 Bot Username: @VillaegWarningbot")
+    logger.info("🔗 Bot Link: https://t.me/VillaegWarningbot")
+    
+    # Load data
+    load_data()
+    
+    if METRICS_PORT:
+        metrics.start_http_server(int(METRICS_PORT))
+    
+    # Create application
+    application = build_application()
+    
+    # Add job to process pending alerts (every 30 seconds by default)
     job_queue = application.job_queue
     job_queue.run_repeating(
         lambda context: asyncio.create_task(process_pending_alerts(application)),
-        interval=30,
-        first=10
+        interval=ALERT_POLL_INTERVAL,
+        first=min(10, ALERT_POLL_INTERVAL)
     )
+    # Look ahead for heat on every forecast refresh (FORECAST_REFRESH_INTERVAL=0 disables)
+    if FORECAST_REFRESH_INTERVAL > 0:
+        job_queue.run_repeating(check_forecast_alerts, interval=FORECAST_REFRESH_INTERVAL, first=60)
     
     logger.info("✅ Bot is now LIVE and responding!")
     logger.info("📨 Alert processing system active!")
     logger.info(f"🌐 Running on port {PORT}")
     
+    # Alerts queued on other nodes (Redis backend) wake the dispatcher at once
+    async def listen_for_alerts(application):
+        loop = asyncio.get_running_loop()
+        add_alert_listener(lambda alert: loop.call_soon_threadsafe(
+            lambda: asyncio.create_task(process_pending_alerts(application, wait=True))))
+    application.post_init = listen_for_alerts
+    
     # Run the bot
     application.run_polling()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
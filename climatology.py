@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Per-taluka, per-day-of-year temperature alert thresholds
+
+A single 40 °C / 5 °C trigger is too low for Kutch in May and too high for
+the Dangs. This builds, offline, a (taluka x day-of-year) table of hot and
+cold thresholds and saves it to CLIMATOLOGY_FILE; check_weather_alerts
+loads it once and looks each taluka up by row and day index.
+
+Thresholds come from, in order of preference:
+
+1. the stored daily history (WEATHER_HISTORY_FILE, recorded from every
+   weather refresh): the HOT_PERCENTILE of daily maxima and COLD_PERCENTILE
+   of daily minima within +/- CLIMATOLOGY_WINDOW_DAYS of the day, across
+   years, where there are at least CLIMATOLOGY_MIN_SAMPLES days
+2. the temperature columns of the village dataset, which carry no dates:
+   the global thresholds shifted by how much warmer or cooler the taluka
+   is than the state average
+3. the global thresholds
+
+Usage:
+    python climatology.py build [--hot 40] [--cold 5]
+"""
+
+import os
+import json
+import fcntl
+import logging
+import argparse
+import threading
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CLIMATOLOGY_FILE = os.getenv('CLIMATOLOGY_FILE', 'taluka_climatology.npz')
+WEATHER_HISTORY_FILE = os.getenv('WEATHER_HISTORY_FILE', 'weather_history.csv')
+CLIMATOLOGY_WINDOW_DAYS = int(os.getenv('CLIMATOLOGY_WINDOW_DAYS', 7))
+CLIMATOLOGY_MIN_SAMPLES = int(os.getenv('CLIMATOLOGY_MIN_SAMPLES', 10))
+HOT_PERCENTILE = 95
+COLD_PERCENTILE = 5
+
+# Day-of-year axis: a leap year, so 29 Feb has its own column
+DAYS_PER_YEAR = 366
+AREA_COLUMNS = ['District Name', 'Taluka Name']
+HISTORY_COLUMNS = ['date', 'district', 'taluka', 'max_temp', 'min_temp']
+
+
+def day_index(day):
+    """Column of a date in the day-of-year tables (0 = 1 Jan, 59 = 29 Feb)"""
+    return (date(2000, day.month, day.day) - date(2000, 1, 1)).days
+
+
+def today():
+    return datetime.now(ZoneInfo('Asia/Kolkata')).date()
+
+
+class Climatology:
+    """Hot/cold thresholds: float32 arrays (taluka, day of year)"""
+
+    def __init__(self, areas, hot, cold):
+        self.areas = [tuple(area) for area in areas]
+        self.rows = {area: i for i, area in enumerate(self.areas)}
+        self.hot = hot
+        self.cold = cold
+
+    def thresholds(self, district, taluka, day):
+        """(hot, cold) for one taluka on a date, or (None, None) if it isn't covered"""
+        row = self.rows.get((district, taluka))
+        if row is None:
+            return None, None
+        column = day_index(day)
+        return round(float(self.hot[row, column]), 1), round(float(self.cold[row, column]), 1)
+
+    def lookup(self, districts, talukas, day):
+        """Hot and cold threshold arrays for parallel district/taluka sequences (NaN if not covered)"""
+        rows = np.array([self.rows.get(area, -1) for area in zip(districts, talukas)], dtype=np.int64)
+        column = day_index(day)
+        covered = rows >= 0
+        hot = np.where(covered, self.hot[rows, column], np.nan)
+        cold = np.where(covered, self.cold[rows, column], np.nan)
+        return hot, cold
+
+    def save(self, path=CLIMATOLOGY_FILE):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, hot=self.hot, cold=self.cold,
+                     districts=np.array([d for d, _ in self.areas]),
+                     talukas=np.array([t for _, t in self.areas]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CLIMATOLOGY_FILE):
+        """Tables written by save(); None if there are none yet"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            areas = zip(data['districts'].tolist(), data['talukas'].tolist())
+            return cls(list(areas), data['hot'], data['cold'])
+
+
+def _dataset_offsets(location_df, areas):
+    """How much warmer each taluka is than the state in the dataset's temperature columns"""
+    columns = [c for c in location_df.columns
+               if 'temp' in c.lower() and pd.api.types.is_numeric_dtype(location_df[c])]
+    if not columns:
+        return np.zeros(len(areas))
+    village_temp = location_df[columns].mean(axis=1)
+    taluka_temp = village_temp.groupby([location_df[c] for c in AREA_COLUMNS], observed=True).mean()
+    offsets = taluka_temp.reindex(pd.MultiIndex.from_tuples(areas)) - village_temp.mean()
+    return offsets.fillna(0).to_numpy()
+
+
+def build_climatology(location_df, history, hot_base=40.0, cold_base=5.0,
+                      window=CLIMATOLOGY_WINDOW_DAYS, min_samples=CLIMATOLOGY_MIN_SAMPLES):
+    """Threshold tables for every taluka in location_df (see the module docstring)"""
+    areas = sorted(set(map(tuple, location_df[AREA_COLUMNS].drop_duplicates().itertuples(index=False))))
+    offsets = _dataset_offsets(location_df, areas)
+    hot = np.repeat((hot_base + offsets)[:, None], DAYS_PER_YEAR, axis=1).astype(np.float32)
+    cold = np.repeat((cold_base + offsets)[:, None], DAYS_PER_YEAR, axis=1).astype(np.float32)
+
+    rows = {area: i for i, area in enumerate(areas)}
+    if history is not None and not history.empty:
+        history = history.assign(
+            row=[rows.get(area, -1) for area in zip(history['district'], history['taluka'])],
+            day=[day_index(d) for d in pd.to_datetime(history['date']).dt.date],
+        )
+        history = history[history['row'] >= 0]
+        # Each observation counts towards every day within the window around it
+        pooled = pd.concat([
+            history.assign(day=(history['day'] + shift) % DAYS_PER_YEAR)
+            for shift in range(-window, window + 1)
+        ], ignore_index=True)
+        grouped = pooled.groupby(['row', 'day'])
+        stats = pd.DataFrame({
+            'hot': grouped['max_temp'].quantile(HOT_PERCENTILE / 100),
+            'cold': grouped['min_temp'].quantile(COLD_PERCENTILE / 100),
+            'samples': grouped.size(),
+        })
+        stats = stats[stats['samples'] >= min_samples]
+        row_index = stats.index.get_level_values('row').to_numpy()
+        day_column = stats.index.get_level_values('day').to_numpy()
+        hot[row_index, day_column] = stats['hot'].to_numpy()
+        cold[row_index, day_column] = stats['cold'].to_numpy()
+        logger.info(f"📊 Climatology: {len(stats)} taluka-days from {len(history)} history rows")
+
+    return Climatology(areas, hot, cold)
+
+
+def load_history(path=WEATHER_HISTORY_FILE):
+    """Recorded daily extremes (see record_observations); None if there are none"""
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path)
+
+
+_climatology = None
+_climatology_loaded = False
+_history_lock = threading.Lock()
+
+
+def get_climatology():
+    """CLIMATOLOGY_FILE's tables, loaded once per process; None if not built"""
+    global _climatology, _climatology_loaded
+    if not _climatology_loaded:
+        try:
+            _climatology = Climatology.load()
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading climatology: {e}")
+        _climatology_loaded = True
+    return _climatology
+
+
+def _today_path():
+    """Running extremes for the current day: {'date': iso, 'areas': {district: {taluka: [max, min]}}}"""
+    return f"{WEATHER_HISTORY_FILE}.today.json"
+
+
+def _load_today():
+    try:
+        with open(_today_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Error loading today's weather extremes: {e}")
+        return None
+
+
+def _append_history(running):
+    """Append a finished day's extremes, leaving out areas already recorded for it"""
+    rows = pd.DataFrame([(running['date'], district, taluka, high, low)
+                         for district, talukas in running['areas'].items()
+                         for taluka, (high, low) in talukas.items()], columns=HISTORY_COLUMNS)
+    exists = os.path.exists(WEATHER_HISTORY_FILE)
+    if exists:
+        recorded = pd.read_csv(WEATHER_HISTORY_FILE, usecols=['date', 'district', 'taluka'])
+        recorded = recorded[recorded['date'] == running['date']]
+        seen = set(zip(recorded['district'], recorded['taluka']))
+        rows = rows[[area not in seen for area in zip(rows['district'], rows['taluka'])]]
+    if not rows.empty:
+        rows.to_csv(WEATHER_HISTORY_FILE, mode='a', index=False, header=not exists)
+
+
+def record_observations(talukas, day=None):
+    """Fold a refresh's per-taluka max/min into today's extremes
+
+    When the date changes, the previous day's extremes are appended to
+    WEATHER_HISTORY_FILE. The running day is kept in a small side file so a
+    restart doesn't lose it. The bot and every web worker record their
+    refreshes, so the side file is re-read and rewritten under a file lock
+    and each (date, district, taluka) is appended once. `talukas` has
+    District Name, Taluka Name, max_temp and min_temp (see
+    weather_field.summarise_by_taluka).
+    """
+    day = (day or today()).isoformat()
+    with _history_lock, open(f"{_today_path()}.lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            running = _load_today()
+            if running is not None and running['date'] > day:
+                # Another process has already moved on to the next day
+                return
+            if running is not None and running['date'] != day:
+                _append_history(running)
+                running = None
+            if running is None:
+                running = {'date': day, 'areas': {}}
+
+            areas = running['areas']
+            for district, taluka, high, low in talukas[AREA_COLUMNS + ['max_temp', 'min_temp']].itertuples(index=False):
+                if np.isnan(high) or np.isnan(low):
+                    continue
+                extremes = areas.setdefault(district, {}).get(taluka)
+                if extremes is None:
+                    areas[district][taluka] = [float(high), float(low)]
+                else:
+                    extremes[0] = max(extremes[0], float(high))
+                    extremes[1] = min(extremes[1], float(low))
+
+            tmp_path = f"{_today_path()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(running, f)
+            os.replace(tmp_path, _today_path())
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build per-taluka temperature alert thresholds')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--hot', type=float, default=40.0, help='threshold where there is no history (°C)')
+    parser.add_argument('--cold', type=float, default=5.0, help='threshold where there is no history (°C)')
+    parser.add_argument('--output', default=CLIMATOLOGY_FILE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from shared_data import load_location_data
+
+    location_df = load_location_data()
+    if location_df.empty:
+        raise SystemExit("No location data to build thresholds for")
+    climatology = build_climatology(location_df, load_history(), args.hot, args.cold)
+    climatology.save(args.output)
+    print(f"Wrote thresholds for {len(climatology.areas)} talukas x {DAYS_PER_YEAR} days to {args.output}")
+    print(f"Hot: {climatology.hot.min():.1f}-{climatology.hot.max():.1f} °C, "
+          f"cold: {climatology.cold.min():.1f}-{climatology.cold.max():.1f} °C")
+
+
+if __name__ == '__main__':
+    main()
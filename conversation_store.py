@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Bounded store for in-progress bot conversations (e.g. the /subscribe flow)
+
+Each user part-way through a flow gets one small slotted record holding the
+current step and a district ID (its position in bot_host's sorted district
+list), never copies of the district or taluka lists. Records expire
+after CONVERSATION_TTL seconds of inactivity and the store never holds more
+than CONVERSATION_MAX_ENTRIES; the least recently active users are dropped
+first. Set CONVERSATION_STATE_FILE to keep records across restarts.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_TTL = float(os.environ.get('CONVERSATION_TTL', 900))
+CONVERSATION_MAX_ENTRIES = int(os.environ.get('CONVERSATION_MAX_ENTRIES', 20000))
+CONVERSATION_STATE_FILE = os.environ.get('CONVERSATION_STATE_FILE')
+
+# Steps of the /subscribe flow
+STEP_DISTRICT = 0
+STEP_TALUKA = 1
+
+
+class ConversationState:
+    """Where one user is in a flow"""
+
+    __slots__ = ('step', 'district_id', 'expires_at')
+
+    def __init__(self, step, district_id=-1, expires_at=0.0):
+        self.step = step
+        self.district_id = district_id
+        self.expires_at = expires_at
+
+
+class ConversationStore:
+    """user_id -> ConversationState with TTL expiry and a size cap
+
+    Entries are kept in order of last activity, so both expired and
+    over-capacity entries are found at the front in O(1).
+    """
+
+    def __init__(self, ttl=CONVERSATION_TTL, max_entries=CONVERSATION_MAX_ENTRIES, path=CONVERSATION_STATE_FILE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries:
+            user_id, state = next(iter(entries.items()))
+            if state.expires_at > now:
+                break
+            del entries[user_id]
+            metrics.CONVERSATIONS_EVICTED.labels('expired').inc()
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            metrics.CONVERSATIONS_EVICTED.labels('capacity').inc()
+        metrics.CONVERSATIONS_ACTIVE.set(len(entries))
+
+    def get(self, user_id):
+        """The user's current state, or None if they have none (or it expired)"""
+        with self._lock:
+            state = self._entries.get(user_id)
+            if state is not None and state.expires_at <= time.time():
+                self._evict(time.time())
+                return None
+            return state
+
+    def set(self, user_id, step, district_id=-1):
+        """Move a user to a step, refreshing their TTL"""
+        now = time.time()
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._entries[user_id] = ConversationState(step, district_id, now + self.ttl)
+            self._evict(now)
+
+    def pop(self, user_id):
+        """End a user's conversation"""
+        with self._lock:
+            state = self._entries.pop(user_id, None)
+            metrics.CONVERSATIONS_ACTIVE.set(len(self._entries))
+            return state
+
+    def save(self):
+        """Write unexpired entries to CONVERSATION_STATE_FILE (if configured)"""
+        if not self.path:
+            return
+        with self._lock:
+            self._evict(time.time())
+            rows = [[user_id, s.step, s.district_id, round(s.expires_at, 1)]
+                    for user_id, s in self._entries.items()]
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(rows, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            logger.info(f"💾 Saved {len(rows)} bot conversations")
+        except OSError as e:
+            logger.error(f"Error saving conversations: {e}")
+
+    def load(self):
+        """Restore entries saved by a previous run (expired ones are skipped)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                rows = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading conversations: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for user_id, step, district_id, expires_at in sorted(rows, key=lambda r: r[3]):
+                if expires_at > now:
+                    self._entries[user_id] = ConversationState(step, district_id, expires_at)
+            self._evict(now)
+        logger.info(f"💾 Restored {len(self._entries)} bot conversations")
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Streaming export of the village dataset, optionally with current weather
+
+The map's Download button used to build a CSV in the browser, so only what
+the page had loaded could be exported. GET /api/export streams the rows
+matching district/taluka/bbox filters from the server instead. Rows are
+selected with one vectorised mask over the already-loaded dataset. They
+are then formatted EXPORT_CHUNK_ROWS at a time by a generator: one CSV
+block, or one Parquet row group, per chunk. The response is sent as it is
+produced, so the memory an export uses does not grow with its size.
+
+With weather=1 each row gets the latest interpolated weather snapshot
+(see weather_field.get_village_weather) for its village, or for its taluka
+when the dataset has no village coordinates.
+"""
+
+import os
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', 5000))
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+WEATHER_COLUMNS = ['current_temp', 'max_temp', 'min_temp', 'humidity', 'wind_speed', 'weather_code', 'timestamp']
+
+
+def parquet_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def coordinate_columns(df):
+    """(lat, lon) columns to filter on: village coordinates, else taluka centres"""
+    if {'Village Latitude', 'Village Longitude'} <= set(df.columns):
+        return 'Village Latitude', 'Village Longitude'
+    return 'Taluka Latitude', 'Taluka Longitude'
+
+
+def select_rows(df, district=None, taluka=None, bbox=None):
+    """Positions of the rows matching every given filter
+
+    bbox is (south, west, north, east) in degrees.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if district:
+        mask &= (df['District Name'] == district).to_numpy()
+    if taluka:
+        mask &= (df['Taluka Name'] == taluka).to_numpy()
+    if bbox is not None:
+        south, west, north, east = bbox
+        lat_col, lon_col = coordinate_columns(df)
+        lats = df[lat_col].to_numpy()
+        lons = df[lon_col].to_numpy()
+        mask &= (lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)
+    return np.flatnonzero(mask)
+
+
+class WeatherJoin:
+    """Adds the latest weather snapshot's columns to chunks of the dataset"""
+
+    def __init__(self, df, weather):
+        from weather_field import location_points
+
+        columns = [c for c in WEATHER_COLUMNS if c in weather]
+        if 'Village Name' in weather:
+            # One weather row per village with coordinates, in dataset order
+            points, _, _ = location_points(df)
+            self.keys = None
+            self.weather = weather[columns].set_axis(points.index)
+        else:
+            self.keys = ['District Name', 'Taluka Name']
+            self.weather = weather[self.keys + columns]
+
+    def __call__(self, chunk):
+        if self.keys is None:
+            return chunk.join(self.weather, how='left')
+        return chunk.merge(self.weather, on=self.keys, how='left').set_axis(chunk.index)
+
+
+def iter_chunks(df, rows, join=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """DataFrames of at most chunk_rows of df's rows at `rows`, passed through join"""
+    for start in range(0, len(rows), chunk_rows):
+        chunk = df.iloc[rows[start:start + chunk_rows]]
+        yield join(chunk) if join else chunk
+
+
+def stream_csv(chunks, empty):
+    """CSV text blocks: the header (from the empty frame `empty`), then one block per chunk"""
+    yield empty.to_csv(index=False)
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=False)
+
+
+class _ChunkSink:
+    """Write-only file that hands written bytes out in pieces
+
+    Parquet footers record byte offsets, so tell() counts everything ever
+    written even though the buffer is emptied by take().
+    """
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_parquet(chunks, empty):
+    """Parquet file bytes, one row group per chunk (`empty` gives the columns if there are none)
+
+    Needs pyarrow, which is imported on first use so CSV exports work
+    without it.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def schema_of(table):
+        # Columns that are all missing in the first chunk are text in later ones
+        return pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                          for field in table.schema])
+
+    sink = _ChunkSink()
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, schema_of(table))
+        writer.write_table(table.cast(writer.schema))
+        yield sink.take()
+    if writer is None:
+        # No matching rows: an empty file with the export's columns
+        table = pa.Table.from_pandas(empty, preserve_index=False)
+        writer = pq.ParquetWriter(sink, schema_of(table))
+    writer.close()
+    yield sink.take()
+
+
+def export_rows(df, rows, fmt='csv', weather=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Generator of the export file's bytes or text for df's rows at `rows`"""
+    join = WeatherJoin(df, weather) if weather is not None else None
+    empty = join(df.iloc[:0]) if join else df.iloc[:0]
+    chunks = iter_chunks(df, rows, join, chunk_rows)
+    if fmt == 'parquet':
+        return stream_parquet(chunks, empty)
+    return stream_csv(chunks, empty)
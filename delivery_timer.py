@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Timer for alerts scheduled for later delivery
+
+queue_alert(..., deliver_at=...) stores an alert in the backend's schedule
+instead of the queue (see Backend.schedule_alert), so scheduled alerts
+survive restarts and are invisible to the dispatcher's queue scans. Each
+dispatcher keeps only (deliver_at, alert id) pairs in a min-heap, re-read
+when the schedule's version changes. It sleeps until the heap's head is
+due, so thousands of scheduled alerts cost nothing until then. Due alerts
+are then moved into the queue (Backend.release_due_alerts) and sent as
+usual.
+"""
+
+import heapq
+
+
+class DeliveryTimer:
+    """Min-heap of (deliver_at epoch seconds, alert id)"""
+
+    def __init__(self, entries=()):
+        self.reset(entries)
+
+    def reset(self, entries):
+        """Replace the contents with (deliver_at, alert id) pairs"""
+        self._heap = list(entries)
+        heapq.heapify(self._heap)
+
+    def add(self, deliver_at, alert_id):
+        heapq.heappush(self._heap, (deliver_at, alert_id))
+
+    def next_due(self):
+        """Earliest deliver_at, or None if nothing is scheduled"""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Remove and return the ids of alerts due at `now`, earliest first"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def __len__(self):
+        return len(self._heap)
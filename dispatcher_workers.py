@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Sharded alert fan-out across several dispatcher processes
+
+One process that renders, serializes and sends to 50,000 recipients is
+CPU-bound well below Telegram's limit. In worker mode the bot (or unified
+runtime) stops sending, and N worker processes each send every alert to
+the recipients whose chat id hashes to their shard:
+
+- Each worker claims (shard, alert) pairs, so any number of hosts can run
+  workers for the same shards. A claim is a lease of ALERT_CLAIM_TTL
+  seconds that the worker renews while sending, so if it dies mid-alert
+  its shard is taken over (and sent again from the start) when the lease
+  runs out: by `run`, which restarts dead workers, or by another host's
+  worker for the shard.
+- All workers take sends from one budget of ALERT_SEND_RATE per second,
+  kept in the shared backend (Redis, or a locked file next to the queue
+  for the file backend), so adding workers never exceeds Telegram's limit.
+- Each worker reports its progress on every alert (recipients, sent,
+  failed) every SHARD_PROGRESS_INTERVAL seconds. The worker that finishes
+  an alert's last shard marks it sent and saves one trace with the totals.
+  Its send durations are that shard's only.
+
+Usage:
+    python dispatcher_workers.py run [--workers 4]   (set DISPATCHER_SHARDS=4 for the bot too)
+    python dispatcher_workers.py status
+"""
+
+import os
+import sys
+import time
+import zlib
+import signal
+import asyncio
+import logging
+import argparse
+import multiprocessing
+import multiprocessing.connection
+from types import SimpleNamespace
+
+from shared_data import get_backend, get_pending_alerts, add_alert_listener
+
+logger = logging.getLogger(__name__)
+
+# Total shards; the bot and every worker must agree on it
+DISPATCHER_SHARDS = int(os.getenv('DISPATCHER_SHARDS', 1))
+# Shard this process sends for (-1: not a worker)
+DISPATCHER_SHARD = int(os.getenv('DISPATCHER_SHARD', -1))
+# Sends per second across all workers
+ALERT_SEND_RATE = float(os.getenv('ALERT_SEND_RATE', 25))
+SHARD_PROGRESS_INTERVAL = float(os.getenv('SHARD_PROGRESS_INTERVAL', 5))
+# Shortest time between restarts of a shard's worker
+WORKER_RESTART_DELAY = 10
+
+
+def sharded():
+    """Whether alerts are sent by worker processes rather than the bot"""
+    return DISPATCHER_SHARDS > 1
+
+
+def is_worker():
+    return sharded() and DISPATCHER_SHARD >= 0
+
+
+def shard_of(user_id, shards=None):
+    """Shard that sends to a chat id (stable across processes and restarts)"""
+    return zlib.crc32(str(user_id).encode()) % (shards or DISPATCHER_SHARDS)
+
+
+def claim_id(alert_id):
+    """What this process claims to send an alert (its shard of it, when sharded)"""
+    return f"{alert_id}:shard{DISPATCHER_SHARD}/{DISPATCHER_SHARDS}" if is_worker() else alert_id
+
+
+def progress(trace):
+    return {
+        'recipients': trace.recipients,
+        'sent': trace.sent,
+        'failed': trace.failed,
+        'picked_up_at': trace.picked_up_at,
+        'first_sent_at': trace.first_sent_at,
+        'last_sent_at': trace.last_sent_at,
+    }
+
+
+def finished_here(alert_ids):
+    """Alert ids this worker's shard has already finished"""
+    try:
+        shards = get_backend().get_shard_progress(alert_ids)
+    except Exception as e:
+        logger.error(f"Error loading shard progress: {e}")
+        return set()
+    return {alert_id for alert_id, reports in shards.items()
+            if reports.get(str(DISPATCHER_SHARD), {}).get('done')}
+
+
+def report_progress(traces):
+    """Record this shard's progress on the alerts it is sending"""
+    backend = get_backend()
+    for trace in traces:
+        try:
+            backend.update_shard_progress(trace.alert_id, DISPATCHER_SHARD, progress(trace))
+        except Exception as e:
+            logger.error(f"Error reporting shard progress: {e}")
+
+
+def complete_shard(trace):
+    """Record that this shard is done with an alert
+
+    True if it was the alert's last shard; the trace then holds every
+    shard's totals.
+    """
+    try:
+        shards = get_backend().complete_shard(trace.alert_id, DISPATCHER_SHARD, DISPATCHER_SHARDS, progress(trace))
+    except Exception as e:
+        logger.error(f"Error completing shard of alert {trace.alert_id}: {e}")
+        return False
+    if shards is None:
+        return False
+    reports = shards.values()
+    trace.recipients = sum(r['recipients'] for r in reports)
+    trace.sent = sum(r['sent'] for r in reports)
+    trace.failed = sum(r['failed'] for r in reports)
+    trace.picked_up_at = min(r['picked_up_at'] for r in reports)
+    first = [r['first_sent_at'] for r in reports if r['first_sent_at']]
+    last = [r['last_sent_at'] for r in reports if r['last_sent_at']]
+    trace.first_sent_at = min(first) if first else None
+    trace.last_sent_at = max(last) if last else None
+    return True
+
+
+async def take_send_slot():
+    """Wait until the shared budget allows one more send"""
+    while True:
+        try:
+            wait = await asyncio.to_thread(get_backend().take_send_slot, 'telegram', ALERT_SEND_RATE)
+        except Exception as e:
+            logger.error(f"Error taking from the send budget: {e}")
+            wait = DISPATCHER_SHARDS / ALERT_SEND_RATE
+        if not wait:
+            return
+        await asyncio.sleep(wait)
+
+
+async def run_worker():
+    """Send this shard's part of every alert until cancelled"""
+    import bot_host
+    from telegram import Bot
+
+    bot_host.load_data()
+    wake = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    add_alert_listener(lambda alert: loop.call_soon_threadsafe(wake.set))
+
+    bot = Bot(bot_host.TOKEN, base_url=bot_host.TELEGRAM_API_BASE_URL)
+    async with bot:
+        application = SimpleNamespace(bot=bot)
+        logger.info(f"📤 Dispatcher shard {DISPATCHER_SHARD + 1}/{DISPATCHER_SHARDS} running")
+        while True:
+            await bot_host.process_pending_alerts(application, wait=True)
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=bot_host.ALERT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+
+
+def _worker_main(shard, shards):
+    # Set before bot_host is imported so its configuration sees the shard
+    os.environ['DISPATCHER_SHARD'] = str(shard)
+    os.environ['DISPATCHER_SHARDS'] = str(shards)
+    global DISPATCHER_SHARD, DISPATCHER_SHARDS
+    DISPATCHER_SHARD, DISPATCHER_SHARDS = shard, shards
+    logging.basicConfig(format=f'%(asctime)s - shard {shard} - %(name)s - %(levelname)s - %(message)s',
+                        level=logging.INFO)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        asyncio.run(run_worker())
+    except (KeyboardInterrupt, SystemExit):
+        pass
+
+
+def run(workers):
+    """Run one process per shard until stopped, restarting any that die"""
+    def start(shard):
+        process = multiprocessing.Process(target=_worker_main, args=(shard, workers), name=f"dispatcher-{shard}")
+        process.start()
+        return process, time.monotonic()
+
+    processes = {shard: start(shard) for shard in range(workers)}
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for process, _ in processes.values():
+            process.terminate()
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while not stopping:
+            multiprocessing.connection.wait([process.sentinel for process, _ in processes.values()
+                                             if process.is_alive()], timeout=1)
+            for shard, (process, started) in list(processes.items()):
+                # Restart at most every WORKER_RESTART_DELAY so a crashing worker doesn't spin
+                if stopping or process.is_alive() or time.monotonic() - started < WORKER_RESTART_DELAY:
+                    continue
+                logger.warning(f"Dispatcher shard {shard} exited with code {process.exitcode}; restarting it")
+                processes[shard] = start(shard)
+    except KeyboardInterrupt:
+        stop()
+    for process, _ in processes.values():
+        process.join()
+
+
+def status():
+    """Print every pending alert's progress per shard"""
+    pending = get_pending_alerts()
+    if not pending:
+        print("No pending alerts")
+        return
+    reports = get_backend().get_shard_progress([alert['id'] for alert in pending])
+    for alert in pending:
+        shards = reports.get(alert['id'], {})
+        print(f"{alert['id']}  {alert['taluka'] or 'All talukas'}, {alert['district']}  "
+              f"({len([r for r in shards.values() if r.get('done')])}/{DISPATCHER_SHARDS} shards done)")
+        for shard, report in sorted(shards.items(), key=lambda item: int(item[0])):
+            age = time.time() - report.get('updated', time.time())
+            print(f"    shard {shard}: {report['sent']}/{report['recipients']} sent, {report['failed']} failed"
+                  f"{' (done)' if report.get('done') else ''}, updated {age:.0f}s ago")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharded alert dispatcher workers')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='start the worker processes')
+    run_parser.add_argument('--workers', type=int, default=DISPATCHER_SHARDS if sharded() else os.cpu_count(),
+                            help='number of shards (default DISPATCHER_SHARDS or the CPU count)')
+    subparsers.add_parser('status', help="show pending alerts' progress per shard")
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        status()
+        return 0
+    if args.workers < 2:
+        parser.error('worker mode needs at least 2 workers; the bot sends alerts itself otherwise')
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"🚀 Starting {args.workers} dispatcher workers")
+    run(args.workers)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
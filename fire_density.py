@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Fire-density grid aggregates and map tiles
+
+Drawing every row of the fire history as a Leaflet marker gets slower with
+every day of history. The web app instead serves fires aggregated into
+cells of CELL_PIXELS × CELL_PIXELS screen pixels in Web Mercator, the
+projection of the map tiles:
+
+- The history is read once per file change into arrays sorted by date
+  (in each process; a copy preloaded for gunicorn's workers stops being
+  shared when the file changes, see preload.py),
+  with each fire's cell at FIRE_GRID_MAX_ZOOM. A cell at a lower zoom is
+  the max-zoom cell shifted right by the zoom difference, so every zoom
+  of the pyramid comes from the same integer keys.
+- The grid for a (zoom, date range) is the fires in the range (a slice
+  found by binary search) grouped by cell: fire count and max confidence.
+  The last FIRE_GRID_CACHE_SIZE grids are kept.
+- /api/fire_density returns the cells inside the viewport as JSON, and
+  /tiles/fires/z/x/y.png renders one 256-pixel tile as a PNG. Either way
+  the cost of a response depends on the viewport, not the history size.
+"""
+
+import os
+import math
+import zlib
+import struct
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FIRE_HISTORY_FILE = os.getenv('FIRE_HISTORY_FILE', 'gujarat_fire_history.csv')
+FIRE_GRID_MAX_ZOOM = 18
+FIRE_GRID_CACHE_SIZE = int(os.getenv('FIRE_GRID_CACHE_SIZE', 64))
+TILE_SIZE = 256
+# Cell edge in screen pixels at every zoom (16 × 16 cells per tile)
+CELL_PIXELS = 16
+CELLS_PER_TILE = TILE_SIZE // CELL_PIXELS
+# Web Mercator's latitude limit
+MAX_LATITUDE = 85.05112878
+
+
+def mercator_cells(lats, lons, zoom):
+    """(column, row) of the cells holding each point at `zoom`"""
+    scale = (1 << zoom) * CELLS_PER_TILE
+    lat = np.radians(np.clip(lats, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lons, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0
+    cols = np.clip((x * scale).astype(np.int64), 0, scale - 1)
+    rows = np.clip((y * scale).astype(np.int64), 0, scale - 1)
+    return cols, rows
+
+
+def cell_center(cols, rows, zoom):
+    """(lat, lon) of cell centres at `zoom`"""
+    scale = (1 << zoom) * CELLS_PER_TILE
+    lons = (np.asarray(cols) + 0.5) / scale * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(math.pi * (1.0 - 2.0 * (np.asarray(rows) + 0.5) / scale))))
+    return lats, lons
+
+
+class FireHistory:
+    """The fire history as arrays sorted by acquisition date"""
+
+    def __init__(self, df):
+        df = df.dropna(subset=['acq_date', 'latitude', 'longitude'])
+        dates = pd.to_datetime(df['acq_date'], errors='coerce').values.astype('datetime64[D]')
+        valid = ~np.isnat(dates)
+        order = np.argsort(dates[valid], kind='stable')
+        self.dates = dates[valid][order]
+        lats = df['latitude'].to_numpy(dtype=np.float64)[valid][order]
+        lons = df['longitude'].to_numpy(dtype=np.float64)[valid][order]
+        confidence = pd.to_numeric(df['confidence'], errors='coerce') if 'confidence' in df else pd.Series(0, index=df.index)
+        self.confidence = confidence.fillna(0).to_numpy(dtype=np.float32)[valid][order]
+        self.cols, self.rows = mercator_cells(lats, lons, FIRE_GRID_MAX_ZOOM)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def date_slice(self, start=None, end=None):
+        """Index range of fires acquired from `start` to `end` (dates, inclusive)"""
+        lo = np.searchsorted(self.dates, np.datetime64(start, 'D'), 'left') if start else 0
+        hi = np.searchsorted(self.dates, np.datetime64(end, 'D'), 'right') if end else len(self.dates)
+        return slice(lo, max(lo, hi))
+
+
+class FireGrid:
+    """Fire count and max confidence per cell at one zoom, sorted by (row, column)"""
+
+    def __init__(self, history, zoom, start=None, end=None):
+        self.zoom = zoom
+        span = history.date_slice(start, end)
+        shift = FIRE_GRID_MAX_ZOOM - zoom
+        cols = history.cols[span] >> shift
+        rows = history.rows[span] >> shift
+        confidence = history.confidence[span]
+
+        keys = rows * ((1 << zoom) * CELLS_PER_TILE) + cols
+        order = np.argsort(keys, kind='stable')
+        cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+        self.rows = (cell_keys // ((1 << zoom) * CELLS_PER_TILE)).astype(np.int64)
+        self.cols = (cell_keys % ((1 << zoom) * CELLS_PER_TILE)).astype(np.int64)
+        self.counts = counts.astype(np.int64)
+        self.max_confidence = (np.maximum.reduceat(confidence[order], starts)
+                               if len(starts) else np.zeros(0, dtype=np.float32))
+        self.max_count = int(self.counts.max()) if len(self.counts) else 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _select(self, col_min, col_max, row_min, row_max):
+        """Indices of cells within the inclusive column/row ranges"""
+        lo, hi = np.searchsorted(self.rows, [row_min, row_max + 1])
+        inside = (self.cols[lo:hi] >= col_min) & (self.cols[lo:hi] <= col_max)
+        return lo + np.flatnonzero(inside)
+
+    def cells(self, bbox=None):
+        """[[lat, lon, count, max confidence], ...] for cells in bbox (south, west, north, east)"""
+        if bbox is None:
+            index = np.arange(len(self))
+        else:
+            south, west, north, east = bbox
+            (col_min, col_max), (row_max, row_min) = mercator_cells(
+                np.array([south, north]), np.array([west, east]), self.zoom)
+            index = self._select(col_min, col_max, row_min, row_max)
+        lats, lons = cell_center(self.cols[index], self.rows[index], self.zoom)
+        return [
+            [round(float(lat), 5), round(float(lon), 5), int(count), round(float(confidence), 1)]
+            for lat, lon, count, confidence in zip(lats, lons, self.counts[index], self.max_confidence[index])
+        ]
+
+    def tile(self, x, y):
+        """PNG bytes of map tile (x, y) at this grid's zoom
+
+        Cell opacity grows with the log of its fire count (relative to the
+        busiest cell in the grid) and its colour goes from yellow to red
+        with its max confidence.
+        """
+        index = self._select(x * CELLS_PER_TILE, (x + 1) * CELLS_PER_TILE - 1,
+                             y * CELLS_PER_TILE, (y + 1) * CELLS_PER_TILE - 1)
+        cells = np.zeros((CELLS_PER_TILE, CELLS_PER_TILE, 4), dtype=np.uint8)
+        if len(index):
+            rows = self.rows[index] - y * CELLS_PER_TILE
+            cols = self.cols[index] - x * CELLS_PER_TILE
+            density = np.log1p(self.counts[index]) / math.log1p(self.max_count)
+            heat = np.clip(self.max_confidence[index] / 100.0, 0.0, 1.0)
+            cells[rows, cols, 0] = 255
+            cells[rows, cols, 1] = (220 * (1.0 - heat)).astype(np.uint8)
+            cells[rows, cols, 3] = (90 + 150 * density).astype(np.uint8)
+        pixels = cells.repeat(CELL_PIXELS, axis=0).repeat(CELL_PIXELS, axis=1)
+        return encode_png(pixels)
+
+
+def encode_png(pixels):
+    """PNG bytes of an (height, width, 4) uint8 RGBA array"""
+    height, width = pixels.shape[:2]
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    # Every scanline starts with filter type 0 (none)
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), pixels.reshape(height, width * 4)], axis=1)
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+
+_lock = threading.Lock()
+# (file signature, FireHistory)
+_history = None
+# (file signature, zoom, start, end) -> FireGrid, least recently used first
+_grids = OrderedDict()
+
+
+def _load_history():
+    global _history
+    try:
+        stat = os.stat(FIRE_HISTORY_FILE)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        signature = None
+    if _history is None or _history[0] != signature:
+        if signature is None:
+            df = pd.DataFrame(columns=['acq_date', 'latitude', 'longitude', 'confidence'])
+        else:
+            df = pd.read_csv(FIRE_HISTORY_FILE)
+        _history = (signature, FireHistory(df))
+        _grids.clear()
+        logger.info(f"Loaded {len(_history[1])} fires from {FIRE_HISTORY_FILE}")
+    return _history
+
+
+def get_fire_history():
+    """The FireHistory of the current FIRE_HISTORY_FILE"""
+    with _lock:
+        return _load_history()[1]
+
+
+def get_fire_grid(zoom, start=None, end=None):
+    """The (cached) FireGrid for a zoom and date range (datetime.date or None)"""
+    if not 0 <= zoom <= FIRE_GRID_MAX_ZOOM:
+        raise ValueError(f"zoom must be between 0 and {FIRE_GRID_MAX_ZOOM}")
+    with _lock:
+        signature, history = _load_history()
+        key = (signature, zoom, start, end)
+        grid = _grids.get(key)
+        if grid is not None:
+            _grids.move_to_end(key)
+            metrics.FIRE_GRID_CACHE_LOOKUPS.labels('hit').inc()
+            return grid
+        metrics.FIRE_GRID_CACHE_LOOKUPS.labels('miss').inc()
+        grid = FireGrid(history, zoom, start, end)
+        _grids[key] = grid
+        while len(_grids) > FIRE_GRID_CACHE_SIZE:
+            _grids.popitem(last=False)
+        return grid
+
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Hourly multi-day forecasts for the weather grid and "heat expected" alerts
+
+Forecasts are fetched for the weather grid nodes (see weather_field.py) and
+held as one float32 array of shape (node, hour, variable). The array is
+saved to FORECAST_FILE as .npy with a small JSON header beside it, so a
+restart or another process memory-maps it instead of refetching.
+
+The lookahead check takes each node's maximum over tomorrow's hours,
+interpolates that to the villages and keeps each taluka's hottest village,
+which covers every area in a few milliseconds.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import warnings
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from weather_field import fetch_locations, get_weather_field
+
+logger = logging.getLogger(__name__)
+
+FORECAST_DAYS = int(os.getenv('FORECAST_DAYS', 3))
+FORECAST_FILE = os.getenv('FORECAST_FILE', 'weather_forecast.npy')
+FORECAST_REFRESH_INTERVAL = float(os.getenv('FORECAST_REFRESH_INTERVAL', 3600))
+FORECAST_HOT_THRESHOLD = float(os.getenv('FORECAST_HOT_THRESHOLD', 40))
+
+HOURLY_VARIABLES = ('temperature_2m', 'apparent_temperature', 'relative_humidity_2m', 'wind_speed_10m')
+FORECAST_TIMEZONE = 'Asia/Kolkata'
+
+
+class HourlyForecast:
+    """Hourly values for a set of locations: float32 array (location, hour, variable)"""
+
+    def __init__(self, values, start, lats, lons, variables=HOURLY_VARIABLES, fetched_at=None):
+        self.values = values
+        self.start = start  # local time of hour 0
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.variables = tuple(variables)
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+
+    @property
+    def hours(self):
+        return self.values.shape[1]
+
+    def series(self, variable):
+        """(location, hour) view of one variable"""
+        return self.values[:, :, self.variables.index(variable)]
+
+    def hours_of(self, day):
+        """Slice of the hour axis that falls on a calendar date"""
+        first = int((datetime.combine(day, datetime.min.time()) - self.start).total_seconds() // 3600)
+        return slice(min(max(first, 0), self.hours), min(max(first + 24, 0), self.hours))
+
+    def daily_max(self, variable, day):
+        """Per-location maximum of a variable over a date (NaN where not covered)"""
+        block = self.series(variable)[:, self.hours_of(day)]
+        if block.shape[1] == 0:
+            return np.full(len(self.values), np.nan, dtype=np.float32)
+        with warnings.catch_warnings():
+            # All-NaN rows (failed fetches) are expected and stay NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nanmax(block, axis=1)
+
+    def save(self, path=FORECAST_FILE):
+        """Write the array (.npy) and its header (path + '.json'), each atomically"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.values, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+        header = {
+            'start': self.start.isoformat(),
+            'variables': list(self.variables),
+            'shape': list(self.values.shape),
+            'lats': self.lats.tolist(),
+            'lons': self.lons.tolist(),
+            'fetched_at': self.fetched_at,
+        }
+        with open(tmp_path, 'w') as f:
+            json.dump(header, f)
+        os.replace(tmp_path, f"{path}.json")
+
+    @classmethod
+    def load(cls, path=FORECAST_FILE, mmap=True):
+        """Forecast written by save(), memory-mapped read-only; None if missing or torn"""
+        try:
+            with open(f"{path}.json") as f:
+                header = json.load(f)
+            values = np.load(path, mmap_mode='r' if mmap else None)
+        except (OSError, ValueError) as e:
+            if os.path.exists(path):
+                logger.error(f"Error loading forecast: {e}")
+            return None
+        # The array and header are replaced separately; a writer may be between the two
+        if list(values.shape) != header['shape']:
+            return None
+        return cls(values, datetime.fromisoformat(header['start']), header['lats'], header['lons'],
+                   header['variables'], header['fetched_at'])
+
+
+def fetch_forecast(lats, lons, days=FORECAST_DAYS, variables=HOURLY_VARIABLES, base_url=None):
+    """Fetch an hourly forecast for the given locations (None if nothing came back)"""
+    hours = days * 24
+    values = np.full((len(lats), hours, len(variables)), np.nan, dtype=np.float32)
+    params = {'hourly': ','.join(variables), 'timezone': FORECAST_TIMEZONE, 'forecast_days': days}
+    start = None
+
+    for i, body in fetch_locations(lats, lons, params, base_url):
+        hourly = body.get('hourly') or {}
+        if start is None and hourly.get('time'):
+            start = datetime.fromisoformat(hourly['time'][0])
+        for j, name in enumerate(variables):
+            series = (hourly.get(name) or [])[:hours]
+            values[i, :len(series), j] = np.array(series, dtype=np.float32)
+
+    if start is None:
+        return None
+    logger.info(f"📅 Forecast: {len(lats)} locations x {hours} hours")
+    return HourlyForecast(values, start, lats, lons, variables)
+
+
+_forecast = None
+_forecast_lock = threading.Lock()
+# (district, taluka, date) already alerted from this process
+_alerted = set()
+
+
+def get_forecast(max_age=FORECAST_REFRESH_INTERVAL):
+    """Forecast for the weather grid: kept in memory, read from FORECAST_FILE or fetched"""
+    global _forecast
+    field, _ = get_weather_field()
+    if field is None:
+        return None
+
+    def usable(forecast):
+        return (forecast is not None and time.time() - forecast.fetched_at < max_age
+                and np.array_equal(forecast.lats, field.node_lats)
+                and np.array_equal(forecast.lons, field.node_lons))
+
+    with _forecast_lock:
+        if usable(_forecast):
+            return _forecast
+        saved = HourlyForecast.load(FORECAST_FILE)
+        if usable(saved):
+            _forecast = saved
+            return _forecast
+        fetched = fetch_forecast(field.node_lats, field.node_lons)
+        if fetched is not None:
+            try:
+                fetched.save(FORECAST_FILE)
+            except OSError as e:
+                logger.error(f"Error saving forecast: {e}")
+            _forecast = fetched
+        return _forecast
+
+
+def tomorrow():
+    return datetime.now(ZoneInfo(FORECAST_TIMEZONE)).date() + timedelta(days=1)
+
+
+def expected_heat(day=None, threshold=FORECAST_HOT_THRESHOLD, variable='temperature_2m', forecast=None):
+    """Talukas whose hottest village is forecast to reach threshold on `day` (default tomorrow)
+
+    Returns a DataFrame with District Name, Taluka Name, max_temp and, when
+    the dataset has villages, hottest_village; None without a forecast.
+    """
+    field, points = get_weather_field()
+    forecast = forecast or get_forecast()
+    if field is None or forecast is None:
+        return None
+    day = day or tomorrow()
+
+    village_max = field.interpolate_values(forecast.daily_max(variable, day))
+    columns = [c for c in ('District Name', 'Taluka Name', 'Village Name') if c in points]
+    villages = points[columns].assign(max_temp=village_max).dropna(subset=['max_temp'])
+    hottest = villages.loc[villages.groupby(['District Name', 'Taluka Name'], sort=False, observed=True)['max_temp'].idxmax()]
+    hot = hottest[hottest['max_temp'] >= threshold].rename(columns={'Village Name': 'hottest_village'})
+    hot['max_temp'] = hot['max_temp'].astype(np.float64).round(1)
+    return hot.reset_index(drop=True)
+
+
+def queue_forecast_alerts(day=None, threshold=FORECAST_HOT_THRESHOLD, owner='forecast'):
+    """Queue a "heat expected" alert for each subscribed taluka forecast to reach threshold
+
+    Each (taluka, date) is alerted once. Returns the number of alerts queued.
+    """
+    from shared_data import area_key, claim_alert, get_subscribers_for_area, queue_alert, release_claim
+
+    day = day or tomorrow()
+    hot = expected_heat(day, threshold)
+    if hot is None:
+        return 0
+    _alerted.difference_update([key for key in _alerted if key[2] < day - timedelta(days=1)])
+
+    queued = 0
+    for row in hot.to_dict('records'):
+        district, taluka = row['District Name'], row['Taluka Name']
+        key = (district, taluka, day)
+        if key in _alerted or not get_subscribers_for_area(district, taluka):
+            continue
+        # Every bot node runs this check, and again after a restart; the
+        # claim outlives both, so only one queues each alert
+        claim_id = f"forecast:{area_key(district, taluka)}:{day.isoformat()}"
+        if not claim_alert(claim_id, owner, ttl=2 * 86400):
+            _alerted.add(key)
+            continue
+        where = f"{taluka}, {district}"
+        if row.get('hottest_village'):
+            where += f" (hottest near {row['hottest_village']})"
+        when = 'TOMORROW' if day == tomorrow() else day.strftime('%d %b').upper()
+        message = (f"🔥 HEAT EXPECTED {when}: up to {row['max_temp']}°C in {where}. "
+                   f"Plan outdoor work for early morning and keep water and shade ready.")
+        if queue_alert(district, taluka, message, 'forecast', severity='medium'):
+            _alerted.add(key)
+            queued += 1
+        else:
+            # Let the next check (here or on another node) try again
+            release_claim(claim_id, owner)
+
+    logger.info(f"📅 Forecast check for {day}: {len(hot)} hot talukas, {queued} alerts queued")
+    return queued
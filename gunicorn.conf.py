@@ -0,0 +1,42 @@
+# gunicorn configuration for the web app: gunicorn -c gunicorn.conf.py
+#
+# The master imports the app and builds its read-only data once
+# (preload.py), then forks the workers, which share those pages.
+import os
+import glob
+import tempfile
+
+wsgi_app = 'app:create_app(preload=True)'
+preload_app = True
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('WEB_THREADS', 4))
+# Exports stream for a while; don't kill the worker mid-download
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+accesslog = '-'
+
+# Each process keeps its own metrics; they snapshot them here so /metrics on
+# any worker reports the total (see metrics.enable_multiprocess)
+_metrics_dir = os.environ.setdefault('METRICS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='villagetemp-metrics-'))
+
+
+def on_starting(server):
+    # Snapshots of a previous run's processes would be added to this run's
+    for path in glob.glob(os.path.join(_metrics_dir, '*.json')):
+        os.remove(path)
+
+
+def when_ready(server):
+    # Counts recorded while preloading belong to the master
+    import metrics
+    metrics.write_snapshot(_metrics_dir)
+
+
+def post_fork(server, worker):
+    import metrics
+    metrics.enable_multiprocess(_metrics_dir)
+
+
+def worker_exit(server, worker):
+    import metrics
+    metrics.write_snapshot(_metrics_dir)
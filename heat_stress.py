@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Humidity-aware heat stress for a whole weather snapshot at once
+
+Raw temperature understates the danger of humid heat: 37 °C at 60 %
+humidity on the coast is worse than 41 °C in dry Kutch. For arrays of
+temperature, relative humidity and wind this computes, element-wise:
+
+- heat index (NWS Rothfusz regression with its low/high humidity adjustments)
+- wet-bulb temperature (Stull 2011 approximation)
+- feels-like temperature (Steadman/BoM apparent temperature, which includes wind)
+
+and assigns each location a tier from HEAT_STRESS_TIERS. Everything is plain
+NumPy over the whole array, so a statewide snapshot takes a few milliseconds.
+"""
+
+import os
+
+import numpy as np
+
+# label:heat_index_min:wet_bulb_min, mildest first; a location is in the
+# highest tier whose heat index OR wet-bulb threshold it reaches
+HEAT_STRESS_TIERS = os.getenv('HEAT_STRESS_TIERS', 'medium:41:28,high:46:30,extreme:54:32')
+
+
+def parse_tiers(spec=HEAT_STRESS_TIERS):
+    """[(label, heat_index_min, wet_bulb_min), ...] from a HEAT_STRESS_TIERS string"""
+    tiers = []
+    for item in spec.split(','):
+        label, heat_index, wet_bulb = item.strip().split(':')
+        tiers.append((label, float(heat_index), float(wet_bulb)))
+    for (_, hi_a, wb_a), (_, hi_b, wb_b) in zip(tiers, tiers[1:]):
+        if hi_b <= hi_a or wb_b <= wb_a:
+            raise ValueError(f"HEAT_STRESS_TIERS thresholds must increase: {spec}")
+    return tiers
+
+
+def heat_index(temp_c, humidity):
+    """NWS heat index in °C"""
+    t = np.asarray(temp_c, dtype=np.float64) * 1.8 + 32
+    rh = np.asarray(humidity, dtype=np.float64)
+
+    simple = 0.5 * (t + 61.0 + (t - 68.0) * 1.2 + rh * 0.094)
+    full = (-42.379 + 2.04901523 * t + 10.14333127 * rh - 0.22475541 * t * rh
+            - 0.00683783 * t * t - 0.05481717 * rh * rh + 0.00122874 * t * t * rh
+            + 0.00085282 * t * rh * rh - 0.00000199 * t * t * rh * rh)
+    dry = (rh < 13) & (t >= 80) & (t <= 112)
+    full -= np.where(dry, (13 - rh) / 4 * np.sqrt(np.clip(17 - np.abs(t - 95), 0, None) / 17), 0)
+    muggy = (rh > 85) & (t >= 80) & (t <= 87)
+    full += np.where(muggy, (rh - 85) / 10 * (87 - t) / 5, 0)
+
+    result = np.where((simple + t) / 2 < 80, simple, full)
+    return (result - 32) / 1.8
+
+
+def wet_bulb(temp_c, humidity):
+    """Wet-bulb temperature in °C (Stull 2011, valid for 5-99 % humidity)"""
+    t = np.asarray(temp_c, dtype=np.float64)
+    rh = np.clip(np.asarray(humidity, dtype=np.float64), 5, 99)
+    return (t * np.arctan(0.151977 * np.sqrt(rh + 8.313659)) + np.arctan(t + rh)
+            - np.arctan(rh - 1.676331) + 0.00391838 * rh ** 1.5 * np.arctan(0.023101 * rh) - 4.686035)
+
+
+def feels_like(temp_c, humidity, wind_kmh):
+    """Apparent temperature in °C (shade, Steadman/BoM), lowered by wind"""
+    t = np.asarray(temp_c, dtype=np.float64)
+    vapour_pressure = np.asarray(humidity, dtype=np.float64) / 100 * 6.105 * np.exp(17.27 * t / (237.7 + t))
+    return t + 0.33 * vapour_pressure - 0.70 * np.asarray(wind_kmh, dtype=np.float64) / 3.6 - 4.00
+
+
+def evaluate(temp_c, humidity, wind_kmh, tiers=None):
+    """Heat stress measures and tier for every location
+
+    Returns a dict of arrays: heat_index, wet_bulb, feels_like and level,
+    where level is 0 below every tier and i + 1 for tiers[i]. NaN inputs
+    give level 0.
+    """
+    tiers = tiers or parse_tiers()
+    hi = heat_index(temp_c, humidity)
+    wb = wet_bulb(temp_c, humidity)
+    hi_level = np.searchsorted([t[1] for t in tiers], np.nan_to_num(hi, nan=-np.inf), side='right')
+    wb_level = np.searchsorted([t[2] for t in tiers], np.nan_to_num(wb, nan=-np.inf), side='right')
+    return {
+        'heat_index': hi,
+        'wet_bulb': wb,
+        'feels_like': feels_like(temp_c, humidity, wind_kmh),
+        'level': np.maximum(hi_level, wb_level),
+    }
+
+
+def worst_by_taluka(villages, tiers=None):
+    """Each taluka's most heat-stressed village, for talukas that reach a tier
+
+    `villages` is a frame with District Name, Taluka Name, current_temp,
+    humidity and wind_speed (see weather_field.get_village_weather). Adds
+    the evaluate() columns plus `tier`, the tier's label.
+    """
+    tiers = tiers or parse_tiers()
+    stress = evaluate(villages['current_temp'].to_numpy(), villages['humidity'].to_numpy(),
+                      villages['wind_speed'].to_numpy(), tiers)
+    stressed = villages.assign(**stress)
+    stressed = stressed[stressed['level'] > 0]
+    worst = stressed.sort_values(['level', 'heat_index'], ascending=False).drop_duplicates(
+        ['District Name', 'Taluka Name'])
+    # float64 so rounded values print as e.g. 81.1, not 81.0999984
+    worst = worst.astype({column: np.float64 for column in worst.select_dtypes('float32').columns})
+    return worst.assign(tier=[tiers[level - 1][0] for level in worst['level']])
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Open-Meteo forecast endpoint
+
+Answers GET /v1/forecast with deterministic synthetic weather after a
+configurable delay. Point the app at it with:
+
+    OPEN_METEO_URL=http://127.0.0.1:8082/v1/forecast python app.py
+
+Comma-separated latitude/longitude lists return a list of locations, like
+the real API.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from synthetic import make_open_meteo_response  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+class FakeOpenMeteoState:
+    """Latency/error settings and request counters"""
+
+    def __init__(self, latency_ms=50, jitter_ms=0, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self.locations = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+
+    def delay(self):
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+            fail = self.error_rate and self._rng.random() < self.error_rate
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+        return fail
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; don't let Nagle delay them
+        disable_nagle_algorithm = True
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/_control/stats':
+                return self._reply(200, {
+                    'requests': state.requests,
+                    'locations': state.locations,
+                    'errors': state.errors,
+                })
+            if url.path != '/v1/forecast':
+                return self._reply(404, {'error': True, 'reason': 'Not Found'})
+
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            latitudes = [float(v) for v in params.get('latitude', '').split(',') if v]
+            longitudes = [float(v) for v in params.get('longitude', '').split(',') if v]
+            if not latitudes or len(latitudes) != len(longitudes):
+                return self._reply(400, {'error': True, 'reason': 'latitude and longitude must have the same length'})
+
+            with state._lock:
+                state.requests += 1
+                state.locations += len(latitudes)
+            if state.delay():
+                with state._lock:
+                    state.errors += 1
+                return self._reply(503, {'error': True, 'reason': 'Injected failure'})
+
+            bodies = [make_open_meteo_response(lat, lon, hourly=params.get('hourly'),
+                                               forecast_days=params.get('forecast_days', 1))
+                      for lat, lon in zip(latitudes, longitudes)]
+            self._reply(200, bodies if len(bodies) > 1 else bodies[0])
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class FakeOpenMeteoServer:
+    """Threaded fake forecast server"""
+
+    def __init__(self, host='127.0.0.1', port=0, **state_options):
+        self.state = FakeOpenMeteoState(**state_options)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.state))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/forecast"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-open-meteo', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Open-Meteo forecast server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeOpenMeteoServer(args.host, args.port, latency_ms=args.latency_ms,
+                                 jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+    logger.info(f"🌤️ Fake Open-Meteo on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Redis covering the commands RedisBackend uses
+
+Keeps everything in memory and speaks the Redis protocol, so the Redis
+backend can be exercised without a Redis install:
+
+    python loadtest/fake_redis.py --port 6390
+    SHARED_DATA_BACKEND=redis://127.0.0.1:6390/0 python app.py
+
+Supports strings (with NX/EX), sets, sorted sets, hashes, pub/sub,
+transactions (WATCH/MULTI/EXEC) and a few server commands.
+"""
+
+import time
+import fnmatch
+import logging
+import argparse
+import threading
+import socketserver
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class CommandError(Exception):
+    pass
+
+
+# Commands that modify their key (every key, for DEL), for WATCH
+WRITE_COMMANDS = {'SET', 'DEL', 'EXPIRE', 'INCR', 'INCRBY', 'SADD', 'SREM', 'ZADD', 'ZINCRBY', 'ZREM',
+                  'HSET', 'HSETNX', 'HDEL', 'HINCRBY'}
+
+
+class FakeRedisState:
+    """Keyspace, expiries and pub/sub subscribers"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = {}
+        self.expires = {}
+        self.channels = defaultdict(set)
+        self.commands = 0
+        # key -> number of writes, so EXEC can tell whether a watched key changed
+        self.versions = defaultdict(int)
+        self.generation = 0
+
+    def _get(self, key, kind):
+        if key in self.expires and self.expires[key] <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        value = self.data.get(key)
+        if value is not None and not isinstance(value, kind):
+            raise CommandError('WRONGTYPE Operation against a key holding the wrong kind of value')
+        return value
+
+    def _set_of(self, key):
+        return self._get(key, set) or set()
+
+    def _store(self, key, value):
+        if value:
+            self.data[key] = value
+        else:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    def execute(self, args):
+        name = args[0].upper()
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            raise CommandError(f"ERR unknown command '{args[0]}'")
+        with self.lock:
+            self.commands += 1
+            if name in WRITE_COMMANDS:
+                for key in (args[1:] if name == 'DEL' else args[1:2]):
+                    self.versions[key] += 1
+            return handler(*args[1:])
+
+    def version(self, key):
+        with self.lock:
+            return (self.generation, self.versions[key])
+
+    def exec_transaction(self, commands, watched):
+        """Run queued commands as one unit; None if a watched key changed"""
+        with self.lock:
+            if any(self.version(key) != version for key, version in watched.items()):
+                return None
+            replies = []
+            for args in commands:
+                try:
+                    replies.append(self.execute(args))
+                except CommandError as e:
+                    replies.append(e)
+                except (TypeError, ValueError, IndexError):
+                    replies.append(CommandError(f"ERR wrong arguments for '{args[0]}' command"))
+            return replies
+
+    # Server
+    def cmd_ping(self, *args):
+        return args[0] if args else 'PONG'
+
+    def cmd_auth(self, *args):
+        return 'OK'
+
+    def cmd_select(self, db):
+        return 'OK'
+
+    def cmd_flushall(self):
+        self.data.clear()
+        self.expires.clear()
+        self.generation += 1
+        return 'OK'
+
+    def cmd_keys(self, pattern):
+        return [key for key in list(self.data) if fnmatch.fnmatchcase(key, pattern) and key in self.data]
+
+    def cmd_dbsize(self):
+        return len(self.data)
+
+    # Keys and strings
+    def cmd_get(self, key):
+        return self._get(key, str)
+
+    def cmd_mget(self, *keys):
+        return [self._get(key, str) if isinstance(self.data.get(key), str) else None for key in keys]
+
+    def cmd_set(self, key, value, *options):
+        options = [o.upper() for o in options]
+        if 'NX' in options and self._get(key, object) is not None:
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if 'EX' in options:
+            self.expires[key] = time.monotonic() + int(options[options.index('EX') + 1])
+        return 'OK'
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._get(key, object) is not None:
+                removed += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return removed
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._get(key, object) is not None)
+
+    def cmd_expire(self, key, seconds):
+        if self._get(key, object) is None:
+            return 0
+        self.expires[key] = time.monotonic() + int(seconds)
+        return 1
+
+    def cmd_incrby(self, key, amount):
+        value = int(self._get(key, str) or 0) + int(amount)
+        self.data[key] = str(value)
+        return value
+
+    def cmd_incr(self, key):
+        return self.cmd_incrby(key, 1)
+
+    # Sets
+    def cmd_sadd(self, key, *members):
+        current = self._set_of(key)
+        before = len(current)
+        current.update(members)
+        self._store(key, current)
+        return len(current) - before
+
+    def cmd_srem(self, key, *members):
+        current = self._set_of(key)
+        before = len(current)
+        current.difference_update(members)
+        self._store(key, current)
+        return before - len(current)
+
+    def cmd_smembers(self, key):
+        return sorted(self._set_of(key))
+
+    def cmd_sismember(self, key, member):
+        return int(member in self._set_of(key))
+
+    def cmd_scard(self, key):
+        return len(self._set_of(key))
+
+    def cmd_sunion(self, *keys):
+        result = set()
+        for key in keys:
+            result |= self._set_of(key)
+        return sorted(result)
+
+    # Sorted sets
+    def _zset(self, key):
+        value = self._get(key, ZSet)
+        return value if value is not None else ZSet()
+
+    def cmd_zadd(self, key, *pairs):
+        zset = self._zset(key)
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            added += member not in zset
+            zset[member] = float(score)
+        self._store(key, zset)
+        return added
+
+    def cmd_zincrby(self, key, amount, member):
+        zset = self._zset(key)
+        zset[member] = zset.get(member, 0.0) + float(amount)
+        self._store(key, zset)
+        return _format_score(zset[member])
+
+    def cmd_zrem(self, key, *members):
+        zset = self._zset(key)
+        removed = sum(1 for m in members if zset.pop(m, None) is not None)
+        self._store(key, zset)
+        return removed
+
+    def cmd_zcard(self, key):
+        return len(self._zset(key))
+
+    def cmd_zscore(self, key, member):
+        score = self._zset(key).get(member)
+        return None if score is None else _format_score(score)
+
+    def _zrange(self, key, start, stop, reverse, options):
+        ordered = sorted(self._zset(key).items(), key=lambda item: (item[1], item[0]), reverse=reverse)
+        start, stop = int(start), int(stop)
+        if stop < 0:
+            stop += len(ordered)
+        selected = ordered[start:stop + 1]
+        if 'WITHSCORES' in [o.upper() for o in options]:
+            return [x for member, score in selected for x in (member, _format_score(score))]
+        return [member for member, _ in selected]
+
+    def cmd_zrange(self, key, start, stop, *options):
+        return self._zrange(key, start, stop, False, options)
+
+    def cmd_zrevrange(self, key, start, stop, *options):
+        return self._zrange(key, start, stop, True, options)
+
+    def _zrangebyscore(self, key, low, high, reverse, options):
+        low = float('-inf') if low == '-inf' else float(low)
+        high = float('inf') if high in ('+inf', 'inf') else float(high)
+        ordered = sorted(self._zset(key).items(), key=lambda item: (item[1], item[0]), reverse=reverse)
+        selected = [(member, score) for member, score in ordered if low <= score <= high]
+        upper = [o.upper() for o in options]
+        if 'LIMIT' in upper:
+            offset, count = int(options[upper.index('LIMIT') + 1]), int(options[upper.index('LIMIT') + 2])
+            selected = selected[offset:] if count < 0 else selected[offset:offset + count]
+        if 'WITHSCORES' in upper:
+            return [x for member, score in selected for x in (member, _format_score(score))]
+        return [member for member, _ in selected]
+
+    def cmd_zrangebyscore(self, key, low, high, *options):
+        return self._zrangebyscore(key, low, high, False, options)
+
+    def cmd_zrevrangebyscore(self, key, high, low, *options):
+        return self._zrangebyscore(key, low, high, True, options)
+
+    # Hashes
+    def _hash(self, key):
+        value = self._get(key, Hash)
+        return value if value is not None else Hash()
+
+    def cmd_hset(self, key, *pairs):
+        hash_ = self._hash(key)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in hash_
+            hash_[field] = value
+        self._store(key, hash_)
+        return added
+
+    def cmd_hsetnx(self, key, field, value):
+        hash_ = self._hash(key)
+        if field in hash_:
+            return 0
+        hash_[field] = value
+        self._store(key, hash_)
+        return 1
+
+    def cmd_hget(self, key, field):
+        return self._hash(key).get(field)
+
+    def cmd_hmget(self, key, *fields):
+        hash_ = self._hash(key)
+        return [hash_.get(field) for field in fields]
+
+    def cmd_hgetall(self, key):
+        return [x for item in sorted(self._hash(key).items()) for x in item]
+
+    def cmd_hdel(self, key, *fields):
+        hash_ = self._hash(key)
+        removed = sum(1 for f in fields if hash_.pop(f, None) is not None)
+        self._store(key, hash_)
+        return removed
+
+    def cmd_hlen(self, key):
+        return len(self._hash(key))
+
+    def cmd_hincrby(self, key, field, amount):
+        hash_ = self._hash(key)
+        value = int(hash_.get(field, 0)) + int(amount)
+        hash_[field] = str(value)
+        self._store(key, hash_)
+        return value
+
+    # Pub/sub
+    def cmd_publish(self, channel, message):
+        receivers = list(self.channels.get(channel, ()))
+        for connection in receivers:
+            connection.push(['message', channel, message])
+        return len(receivers)
+
+
+class ZSet(dict):
+    """Sorted set value: member -> score"""
+
+
+class Hash(dict):
+    """Hash value: field -> value"""
+
+
+def _format_score(score):
+    return str(int(score)) if float(score).is_integer() else repr(score)
+
+
+def encode(value):
+    if isinstance(value, CommandError):
+        return b'-%s\r\n' % str(value).encode('utf-8')
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, (list, tuple)):
+        return b'*%d\r\n' % len(value) + b''.join(encode(v) for v in value)
+    if isinstance(value, str) and value in ('OK', 'QUEUED'):
+        return b'+%s\r\n' % value.encode('utf-8')
+    data = str(value).encode('utf-8')
+    return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+def make_handler(state):
+    class Handler(socketserver.StreamRequestHandler):
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            self.write_lock = threading.Lock()
+            self.subscriptions = set()
+            # Transaction state: watched key -> version, and commands queued after MULTI
+            self.watched = {}
+            self.queued = None
+
+        def push(self, value):
+            with self.write_lock:
+                try:
+                    self.wfile.write(encode(value))
+                except OSError:
+                    pass
+
+        def read_command(self):
+            line = self.rfile.readline()
+            if not line:
+                return None
+            if not line.startswith(b'*'):
+                # Inline command (e.g. from telnet/redis-cli ping)
+                return line.decode('utf-8').split()
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2].decode('utf-8'))
+            return args
+
+        def handle(self):
+            try:
+                while True:
+                    args = self.read_command()
+                    if args is None:
+                        break
+                    if not args:
+                        continue
+                    name = args[0].upper()
+                    if name in ('SUBSCRIBE', 'UNSUBSCRIBE'):
+                        self._subscription(name, args[1:])
+                        continue
+                    if name == 'QUIT':
+                        self.push('OK')
+                        break
+                    if name in ('MULTI', 'EXEC', 'DISCARD', 'WATCH', 'UNWATCH'):
+                        self.push(self._transaction(name, args[1:]))
+                        continue
+                    if self.queued is not None:
+                        self.queued.append(args)
+                        self.push('QUEUED')
+                        continue
+                    try:
+                        reply = state.execute(args)
+                    except CommandError as e:
+                        reply = e
+                    except (TypeError, ValueError, IndexError):
+                        reply = CommandError(f"ERR wrong arguments for '{args[0]}' command")
+                    self.push(reply)
+            except (OSError, ValueError):
+                pass
+            finally:
+                with state.lock:
+                    for channel in self.subscriptions:
+                        state.channels[channel].discard(self)
+
+        def _transaction(self, name, keys):
+            if name == 'WATCH':
+                if self.queued is not None:
+                    return CommandError('ERR WATCH inside MULTI is not allowed')
+                self.watched.update((key, state.version(key)) for key in keys)
+                return 'OK'
+            if name == 'MULTI':
+                if self.queued is not None:
+                    return CommandError('ERR MULTI calls can not be nested')
+                self.queued = []
+                return 'OK'
+            if self.queued is None and name != 'UNWATCH':
+                return CommandError(f"ERR {name} without MULTI")
+            queued, watched = self.queued, self.watched
+            if name != 'UNWATCH':
+                self.queued = None
+            self.watched = {}
+            return state.exec_transaction(queued, watched) if name == 'EXEC' else 'OK'
+
+        def _subscription(self, name, channels):
+            with state.lock:
+                for channel in channels:
+                    if name == 'SUBSCRIBE':
+                        self.subscriptions.add(channel)
+                        state.channels[channel].add(self)
+                    else:
+                        self.subscriptions.discard(channel)
+                        state.channels[channel].discard(self)
+                    self.push([name.lower(), channel, len(self.subscriptions)])
+
+    return Handler
+
+
+class ThreadingRespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeRedisServer:
+    """Threaded in-memory Redis protocol server"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.state = FakeRedisState()
+        self.server = ThreadingRespServer((host, port), make_handler(self.state))
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-redis', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='In-memory Redis protocol server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeRedisServer(args.host, args.port)
+    logger.info(f"🗄️ Fake Redis on {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
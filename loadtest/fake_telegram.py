@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the subset of the Telegram Bot API the bot uses
+
+Supports getMe, getUpdates (long polling), sendMessage, callback query and
+message-edit calls, with optional flood-control (429 RetryAfter) injection.
+Point the bot at it with:
+
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot python bot_host.py
+
+Updates can be injected in-process (FakeTelegramServer.inject_*) or over
+HTTP via POST /_control/inject, and sent messages read via GET /_control/sent.
+Injected updates are text messages and commands, inline keyboard presses
+(the district/taluka menus) and shared locations (subscribing by
+location).
+"""
+
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from collections import defaultdict, deque
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {
+    'id': 1000000001,
+    'is_bot': True,
+    'first_name': 'Fake Village Bot',
+    'username': 'fake_village_bot',
+    'can_join_groups': False,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': False,
+}
+
+
+class FakeTelegramState:
+    """Update queue, sent-message log and flood-control settings"""
+
+    def __init__(self, flood_rate=0.0, retry_after=1, rate_limit=None):
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.cond = threading.Condition()
+        self.updates = deque()
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.sent = []
+        self.sent_by_chat = defaultdict(list)
+        self.flood_responses = 0
+        self.calls = defaultdict(int)
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._rng = random.Random(0)
+
+    def _user(self, chat_id):
+        return {'id': chat_id, 'is_bot': False, 'first_name': f"Farmer {chat_id}"}
+
+    def _message(self, chat_id, **fields):
+        with self.cond:
+            message_id = self.next_message_id
+            self.next_message_id += 1
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+        }
+        message.update(fields)
+        return message
+
+    def _push(self, update):
+        with self.cond:
+            update['update_id'] = self.next_update_id
+            self.next_update_id += 1
+            self.updates.append(update)
+            self.cond.notify_all()
+        return update['update_id']
+
+    def inject_message(self, chat_id, text):
+        """Simulate a user sending a text message or /command"""
+        fields = {'from': self._user(chat_id), 'text': text}
+        if text.startswith('/'):
+            command = text.split()[0]
+            fields['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return self._push({'message': self._message(chat_id, **fields)})
+
+    def inject_location(self, chat_id, latitude, longitude):
+        """Simulate a user sharing their location (the bot's location handler)"""
+        fields = {'from': self._user(chat_id), 'location': {'latitude': latitude, 'longitude': longitude}}
+        return self._push({'message': self._message(chat_id, **fields)})
+
+    def inject_callback(self, chat_id, data, message_id=None):
+        """Simulate a user pressing an inline keyboard button (the district/taluka menus)"""
+        message = self._message(chat_id, **{'from': BOT_USER, 'text': '…'})
+        if message_id is not None:
+            message['message_id'] = message_id
+        return self._push({'callback_query': {
+            'id': f"cb{self.next_update_id}",
+            'from': self._user(chat_id),
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': message,
+        }})
+
+    def get_updates(self, offset=None, timeout=0, limit=100):
+        deadline = time.monotonic() + float(timeout or 0)
+        with self.cond:
+            if offset:
+                while self.updates and self.updates[0]['update_id'] < int(offset):
+                    self.updates.popleft()
+            while not self.updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self.cond.wait(remaining)
+            return list(self.updates)[:int(limit or 100)]
+
+    def should_flood(self):
+        """Decide whether this sendMessage gets a 429 response"""
+        with self.cond:
+            if self.flood_rate and self._rng.random() < self.flood_rate:
+                self.flood_responses += 1
+                return True
+            if self.rate_limit:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start = now
+                    self._window_count = 0
+                self._window_count += 1
+                if self._window_count > self.rate_limit:
+                    self.flood_responses += 1
+                    return True
+        return False
+
+    def record_sent(self, chat_id, params, kind='sendMessage'):
+        message = self._message(chat_id, **{'from': BOT_USER, 'text': params.get('text', '')})
+        entry = {
+            'method': kind,
+            'chat_id': chat_id,
+            'text': params.get('text', ''),
+            'reply_markup': params.get('reply_markup'),
+            'message_id': message['message_id'],
+            'time': time.monotonic(),
+        }
+        with self.cond:
+            self.sent.append(entry)
+            self.sent_by_chat[chat_id].append(entry)
+            self.cond.notify_all()
+        return message
+
+    def wait_for_message(self, chat_id, after=0, timeout=10.0):
+        """Block until the bot sends its (after+1)-th message to chat_id"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while len(self.sent_by_chat[chat_id]) <= after:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            return self.sent_by_chat[chat_id][after]
+
+    def sent_count(self, chat_id):
+        with self.cond:
+            return len(self.sent_by_chat[chat_id])
+
+
+def _decode_params(handler):
+    """Read Bot API parameters from the query string, form or JSON body"""
+    params = {k: v[-1] for k, v in parse_qs(urlparse(handler.path).query).items()}
+    length = int(handler.headers.get('Content-Length') or 0)
+    if length:
+        body = handler.rfile.read(length).decode('utf-8')
+        if handler.headers.get('Content-Type', '').startswith('application/json'):
+            params.update(json.loads(body))
+        else:
+            params.update({k: v[-1] for k, v in parse_qs(body).items()})
+    for key in ('reply_markup', 'allowed_updates'):
+        if isinstance(params.get(key), str):
+            try:
+                params[key] = json.loads(params[key])
+            except ValueError:
+                pass
+    return params
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; don't let Nagle delay them
+        disable_nagle_algorithm = True
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _ok(self, result):
+            self._reply(200, {'ok': True, 'result': result})
+
+        def do_GET(self):
+            self._dispatch()
+
+        def do_POST(self):
+            self._dispatch()
+
+        def _dispatch(self):
+            path = urlparse(self.path).path
+            params = _decode_params(self)
+            if path.startswith('/_control/'):
+                return self._control(path[len('/_control/'):], params)
+
+            # /bot<token>/<method>
+            method = path.rsplit('/', 1)[-1]
+            state.calls[method] += 1
+
+            if method == 'getMe':
+                return self._ok(BOT_USER)
+            if method == 'getUpdates':
+                return self._ok(state.get_updates(params.get('offset'), params.get('timeout', 0), params.get('limit')))
+            if method in ('sendMessage', 'editMessageText'):
+                if method == 'sendMessage' and state.should_flood():
+                    return self._reply(429, {
+                        'ok': False,
+                        'error_code': 429,
+                        'description': f"Too Many Requests: retry after {state.retry_after}",
+                        'parameters': {'retry_after': state.retry_after},
+                    })
+                chat_id = int(params['chat_id'])
+                return self._ok(state.record_sent(chat_id, params, method))
+            # deleteWebhook, answerCallbackQuery, setMyCommands, close, ...
+            return self._ok(True)
+
+        def _control(self, action, params):
+            if action == 'inject':
+                kind = params.get('kind', 'message')
+                chat_id = int(params['chat_id'])
+                if kind == 'callback':
+                    update_id = state.inject_callback(chat_id, params['data'])
+                elif kind == 'location':
+                    update_id = state.inject_location(chat_id, float(params['latitude']), float(params['longitude']))
+                else:
+                    update_id = state.inject_message(chat_id, params['text'])
+                return self._ok({'update_id': update_id})
+            if action == 'sent':
+                since = int(params.get('since', 0))
+                return self._ok(state.sent[since:])
+            if action == 'stats':
+                return self._ok({
+                    'sent': len(state.sent),
+                    'flood_responses': state.flood_responses,
+                    'calls': dict(state.calls),
+                })
+            self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class FakeTelegramServer:
+    """Threaded fake Bot API server"""
+
+    def __init__(self, host='127.0.0.1', port=0, **state_options):
+        self.state = FakeTelegramState(**state_options)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.state))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-telegram', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __getattr__(self, name):
+        # inject_*, wait_for_message, ... are provided by the state
+        return getattr(self.state, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Telegram Bot API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--flood-rate', type=float, default=0.0, help='Fraction of sendMessage calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after seconds in 429 responses')
+    parser.add_argument('--rate-limit', type=int, default=None, help='Answer 429 above this many sendMessage/s')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeTelegramServer(args.host, args.port, flood_rate=args.flood_rate,
+                                retry_after=args.retry_after, rate_limit=args.rate_limit)
+    logger.info(f"🤖 Fake Telegram API on {server.base_url}<token>/")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+End-to-end load driver for the bot and the Flask app
+
+Starts the fake Telegram and Open-Meteo servers, runs bot_host.py and
+app.py as subprocesses against them (in a temporary directory with
+synthetic data), then:
+
+  1. simulates N users running /subscribe, /weather and /fire
+  2. fires admin alert bursts through the web app and waits for delivery
+  3. hammers the web app's public and admin endpoints
+
+and reports throughput and latency percentiles for each phase.
+
+Usage:
+    python loadtest/load_driver.py --users 200 --concurrency 50
+    python loadtest/load_driver.py --unified          # single-process runtime
+    python loadtest/load_driver.py --redis            # shared state in the Redis stand-in
+    python loadtest/load_driver.py --flood-rate 0.05 --json results.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+import subprocess
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(LOADTEST_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+
+import synthetic  # noqa: E402
+from alert_tracing import percentile  # noqa: E402
+from fake_telegram import FakeTelegramServer  # noqa: E402
+from fake_open_meteo import FakeOpenMeteoServer  # noqa: E402
+from fake_redis import FakeRedisServer  # noqa: E402
+from backends import create_backend  # noqa: E402
+
+ADMIN_EMAIL = 'loadtest@example.com'
+ADMIN_PASSWORD = 'loadtest'
+
+# Keyboard buttons that navigate instead of choosing something
+NAVIGATION_MARKERS = ('More', '◀', '▶', '❌', 'Cancel', 'Back', '📍 Share')
+
+
+class LatencyRecorder:
+    """Thread-safe latency samples grouped by label"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.timeouts = defaultdict(int)
+
+    def add(self, label, seconds):
+        with self._lock:
+            self.samples[label].append(seconds)
+
+    def timeout(self, label):
+        with self._lock:
+            self.timeouts[label] += 1
+
+    def summary(self, wall_seconds):
+        rows = {}
+        for label in sorted(set(self.samples) | set(self.timeouts)):
+            values = self.samples.get(label, [])
+            rows[label] = {
+                'count': len(values),
+                'timeouts': self.timeouts.get(label, 0),
+                'throughput_per_s': len(values) / wall_seconds if wall_seconds else 0,
+                'p50_ms': _ms(percentile(values, 50)),
+                'p95_ms': _ms(percentile(values, 95)),
+                'p99_ms': _ms(percentile(values, 99)),
+            }
+        return rows
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def _buttons(reply_markup):
+    """Flatten a reply or inline keyboard into (text, callback_data) pairs"""
+    if not reply_markup:
+        return []
+    rows = reply_markup.get('inline_keyboard') or reply_markup.get('keyboard') or []
+    buttons = []
+    for row in rows:
+        for button in row:
+            if isinstance(button, str):
+                buttons.append((button, None))
+            elif not button.get('request_location'):
+                buttons.append((button.get('text', ''), button.get('callback_data')))
+    return buttons
+
+
+def _choose_button(buttons, rng):
+    confirm = [b for b in buttons if b[0].startswith('✅')]
+    if confirm:
+        return confirm[0]
+    choices = [b for b in buttons if not any(marker in b[0] for marker in NAVIGATION_MARKERS)]
+    return rng.choice(choices) if choices else None
+
+
+class BotUser:
+    """One simulated farmer talking to the bot"""
+
+    def __init__(self, telegram, chat_id, recorder, timeout, seed, location=None):
+        self.telegram = telegram
+        self.chat_id = chat_id
+        self.recorder = recorder
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        # (lat, lon) to subscribe by sharing a location instead of the keyboard
+        self.location = location
+
+    def _exchange(self, label, inject):
+        before = self.telegram.sent_count(self.chat_id)
+        start = time.perf_counter()
+        inject()
+        reply = self.telegram.wait_for_message(self.chat_id, before, self.timeout)
+        if reply is None:
+            self.recorder.timeout(label)
+            return None
+        self.recorder.add(label, time.perf_counter() - start)
+        return reply
+
+    def command(self, text):
+        return self._exchange(text, lambda: self.telegram.inject_message(self.chat_id, text))
+
+    def press(self, label, reply):
+        button = _choose_button(_buttons(reply.get('reply_markup')), self.rng)
+        if button is None:
+            return None
+        text, callback_data = button
+        if callback_data is not None:
+            return self._exchange(label, lambda: self.telegram.inject_callback(
+                self.chat_id, callback_data, reply['message_id']))
+        return self._exchange(label, lambda: self.telegram.inject_message(self.chat_id, text))
+
+    def subscribe(self, max_steps=6):
+        start = time.perf_counter()
+        reply = self.command('/subscribe')
+        for step in range(max_steps):
+            if reply is None or not _buttons(reply.get('reply_markup')):
+                break
+            reply = self.press(f"/subscribe step {step + 1}", reply)
+        if reply is not None:
+            self.recorder.add('/subscribe flow', time.perf_counter() - start)
+
+    def share_location(self):
+        lat, lon = self.location
+        self._exchange('location share', lambda: self.telegram.inject_location(self.chat_id, lat, lon))
+
+    def run(self):
+        if self.location:
+            self.share_location()
+        else:
+            self.subscribe()
+        self.command('/weather')
+        self.command('/fire')
+
+
+def _wait_until(predicate, timeout, interval=0.05):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def _web_ready(url):
+    try:
+        return requests.get(url, timeout=1).status_code < 500
+    except requests.RequestException:
+        return False
+
+
+def _login(session, web_url):
+    page = session.get(f"{web_url}/login").text
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    session.post(f"{web_url}/login", data={
+        'email': ADMIN_EMAIL, 'password': ADMIN_PASSWORD, 'csrf_token': token,
+    })
+
+
+def run_bot_phase(telegram, args, locations):
+    recorder = LatencyRecorder()
+    rng = random.Random(0)
+    users = []
+    for i in range(args.users):
+        # Farmers standing near (not exactly at) a village
+        location = None
+        if rng.random() < args.location_share:
+            lat, lon = rng.choice(locations)
+            location = (lat + rng.uniform(-0.02, 0.02), lon + rng.uniform(-0.02, 0.02))
+        users.append(BotUser(telegram, 500000000 + i, recorder, args.timeout, seed=i, location=location))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda user: user.run(), users))
+    wall = time.perf_counter() - start
+    return {'wall_seconds': round(wall, 2), 'users': args.users, 'commands': recorder.summary(wall)}
+
+
+def run_alert_phase(telegram, web_url, backend, args):
+    subscribers = backend.load_subscribers()
+    areas = sorted(((k, len(v)) for k, v in subscribers.items() if v), key=lambda kv: -kv[1])
+    if not areas:
+        return {'error': 'no subscribers after bot phase'}
+
+    session = requests.Session()
+    _login(session, web_url)
+
+    bursts = []
+    for burst in range(args.alert_bursts):
+        expected = {}
+        sent_before = len(telegram.state.sent)
+        start = time.perf_counter()
+        for i, (key, count) in enumerate(areas[:args.burst_size]):
+            district, taluka = key.split('_', 1)
+            marker = f"LOADTEST burst {burst} alert {i}"
+            # Every burst goes to the same areas; skip the alert engine's cooldown
+            session.post(f"{web_url}/send_weather_alert", json={'force': True, 'alert': {
+                'district': district, 'taluka': taluka, 'message': marker,
+            }})
+            expected[marker] = count
+        queued = time.perf_counter() - start
+
+        def delivered():
+            counts = defaultdict(int)
+            for entry in telegram.state.sent[sent_before:]:
+                for marker in expected:
+                    if marker in entry['text']:
+                        counts[marker] += 1
+            return counts
+
+        done = _wait_until(lambda: all(delivered()[m] >= n for m, n in expected.items()), args.alert_timeout)
+        elapsed = time.perf_counter() - start
+        messages = sum(delivered().values())
+        bursts.append({
+            'alerts': len(expected),
+            'recipients': sum(expected.values()),
+            'delivered': messages,
+            'complete': done,
+            'queue_seconds': round(queued, 3),
+            'time_to_last_delivery_seconds': round(elapsed, 3),
+            'messages_per_s': round(messages / elapsed, 1) if elapsed else 0,
+        })
+    return {'bursts': bursts, 'flood_responses': telegram.state.flood_responses}
+
+
+def run_web_phase(web_url, args):
+    areas = synthetic.area_keys(synthetic.make_location_frame(villages=args.villages))
+
+    session = requests.Session()
+    _login(session, web_url)
+    cookies = session.cookies.get_dict()
+    rng = random.Random(0)
+
+    targets = [
+        ('/', lambda: '/'),
+        ('/weather/<district>/<taluka>', lambda: '/weather/%s/%s' % rng.choice(areas)),
+        ('/api/weather_map_data', lambda: '/api/weather_map_data'),
+        ('/api/subscriber_stats', lambda: '/api/subscriber_stats'),
+        ('/metrics', lambda: '/metrics'),
+    ]
+    recorder = LatencyRecorder()
+    local = threading.local()
+
+    def one_request(i):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            local.session.cookies.update(cookies)
+        label, make_path = targets[i % len(targets)]
+        start = time.perf_counter()
+        try:
+            response = local.session.get(f"{web_url}{make_path()}", timeout=args.timeout)
+            if response.status_code >= 500:
+                recorder.timeout(label)
+                return
+        except requests.RequestException:
+            recorder.timeout(label)
+            return
+        recorder.add(label, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.web_concurrency) as pool:
+        list(pool.map(one_request, range(args.web_requests)))
+    wall = time.perf_counter() - start
+    return {'wall_seconds': round(wall, 2), 'requests': args.web_requests, 'endpoints': recorder.summary(wall)}
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"  {'':<32} {'count':>6} {'err':>4} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, row in rows.items():
+        print(f"  {label:<32} {row['count']:>6} {row['timeouts']:>4} {row['throughput_per_s']:>8.1f} "
+              f"{row['p50_ms'] or 0:>9.1f} {row['p95_ms'] or 0:>9.1f} {row['p99_ms'] or 0:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the bot and web app against local fakes')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--location-share', type=float, default=0.3,
+                        help='Fraction of users who subscribe by sharing their location')
+    parser.add_argument('--alert-bursts', type=int, default=3)
+    parser.add_argument('--burst-size', type=int, default=5, help='Alerts per burst (busiest areas)')
+    parser.add_argument('--web-requests', type=int, default=500)
+    parser.add_argument('--web-concurrency', type=int, default=20)
+    parser.add_argument('--villages', type=int, default=5000, help='Synthetic dataset size')
+    parser.add_argument('--flood-rate', type=float, default=0.0, help='Fraction of sendMessage answered with 429')
+    parser.add_argument('--rate-limit', type=int, default=None, help='Fake Telegram sendMessage/s limit')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--meteo-latency-ms', type=float, default=50)
+    parser.add_argument('--meteo-jitter-ms', type=float, default=10)
+    parser.add_argument('--send-interval', type=float, default=0.0, help='ALERT_SEND_INTERVAL for the bot')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='ALERT_POLL_INTERVAL for the bot')
+    parser.add_argument('--timeout', type=float, default=15.0, help='Per-reply timeout in seconds')
+    parser.add_argument('--alert-timeout', type=float, default=120.0)
+    parser.add_argument('--web-port', type=int, default=5055)
+    parser.add_argument('--unified', action='store_true', help='Run unified_runtime.py instead of two processes')
+    parser.add_argument('--redis', action='store_true', help='Share state through the embedded Redis stand-in')
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--verbose', action='store_true', help='Show bot and web app logs')
+    args = parser.parse_args()
+
+    telegram = FakeTelegramServer(flood_rate=args.flood_rate, retry_after=args.retry_after,
+                                  rate_limit=args.rate_limit).start()
+    meteo = FakeOpenMeteoServer(latency_ms=args.meteo_latency_ms, jitter_ms=args.meteo_jitter_ms).start()
+    redis = FakeRedisServer().start() if args.redis else None
+    web_url = f"http://127.0.0.1:{args.web_port}"
+
+    processes = []
+    report = {'settings': vars(args)}
+    with tempfile.TemporaryDirectory(prefix='villagetemp-load-') as workdir:
+        location_df = synthetic.write_location_csv(os.path.join(workdir, 'merged_village_temperature_data.csv'),
+                                                   villages=args.villages)
+        env = dict(os.environ,
+                   PYTHONPATH=REPO_ROOT,
+                   TELEGRAM_BOT_TOKEN='123456:LOADTEST',
+                   TELEGRAM_API_BASE_URL=telegram.base_url,
+                   OPEN_METEO_URL=meteo.url,
+                   ALERT_SEND_INTERVAL=str(args.send_interval),
+                   ALERT_POLL_INTERVAL=str(args.poll_interval),
+                   ADMIN_EMAIL=ADMIN_EMAIL,
+                   ADMIN_PASSWORD=ADMIN_PASSWORD,
+                   SECRET_KEY='loadtest-secret',
+                   SHARED_DATA_BACKEND=redis.url if redis else 'file')
+        backend = create_backend(env['SHARED_DATA_BACKEND'],
+                                 subscribers_file=os.path.join(workdir, 'subscribers.json'),
+                                 alerts_file=os.path.join(workdir, 'pending_alerts.json'))
+        output = None if args.verbose else subprocess.DEVNULL
+        try:
+            if args.unified:
+                processes.append(subprocess.Popen(
+                    [sys.executable, os.path.join(REPO_ROOT, 'unified_runtime.py')],
+                    cwd=workdir, env=dict(env, HOST='127.0.0.1', PORT=str(args.web_port)),
+                    stdout=output, stderr=output))
+            else:
+                processes.append(subprocess.Popen(
+                    [sys.executable, os.path.join(REPO_ROOT, 'bot_host.py')],
+                    cwd=workdir, env=env, stdout=output, stderr=output))
+                processes.append(subprocess.Popen(
+                    [sys.executable, '-c',
+                     f"import app; app.app.run(host='127.0.0.1', port={args.web_port}, threaded=True)"],
+                    cwd=workdir, env=env, stdout=output, stderr=output))
+
+            if not _wait_until(lambda: telegram.state.calls['getUpdates'] > 0, 60):
+                raise RuntimeError('bot did not start polling')
+            if not _wait_until(lambda: _web_ready(web_url), 60):
+                raise RuntimeError('web app did not start')
+
+            print(f"🧪 Bot phase: {args.users} users, concurrency {args.concurrency}")
+            report['bot'] = run_bot_phase(telegram, args, list(zip(location_df['Village Latitude'],
+                                                                   location_df['Village Longitude'])))
+            print_table(f"Bot commands ({report['bot']['wall_seconds']}s)", report['bot']['commands'])
+
+            print(f"\n🚨 Alert phase: {args.alert_bursts} bursts of {args.burst_size} alerts")
+            report['alerts'] = run_alert_phase(telegram, web_url, backend, args)
+            for i, burst in enumerate(report['alerts'].get('bursts', [])):
+                print(f"  burst {i}: {burst['delivered']}/{burst['recipients']} delivered in "
+                      f"{burst['time_to_last_delivery_seconds']}s ({burst['messages_per_s']} msg/s)"
+                      f"{'' if burst['complete'] else '  INCOMPLETE'}")
+            print(f"  429 responses injected: {report['alerts'].get('flood_responses', 0)}")
+
+            print(f"\n🌐 Web phase: {args.web_requests} requests, concurrency {args.web_concurrency}")
+            report['web'] = run_web_phase(web_url, args)
+            print_table(f"Web endpoints ({report['web']['wall_seconds']}s)", report['web']['endpoints'])
+            report['open_meteo'] = {'requests': meteo.state.requests, 'locations': meteo.state.locations}
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            telegram.stop()
+            meteo.stop()
+            if redis:
+                redis.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+Lightweight Prometheus-style metrics shared by the web app, bot and pipelines
+
+Counters, gauges and histograms are kept in plain dicts guarded by a lock, so
+recording a sample costs a dict lookup and an addition. The registry renders
+the Prometheus text exposition format for the /metrics endpoint.
+
+Under a multi-process server (gunicorn workers) each process has its own
+registry, and a scrape reaches one of them. With enable_multiprocess()
+every process writes a snapshot of its metrics to a shared directory
+every METRICS_SNAPSHOT_INTERVAL seconds (and on each scrape), and /metrics
+reports the sum over all snapshots: counters and histograms add up, and
+gauges get a "worker" label (the process id) for each live process.
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds (covers fast routes up to slow fan-outs)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Age buckets in seconds (queue waits range from seconds to hours)
+AGE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 86400)
+
+# How often each process refreshes its snapshot in multi-process mode
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv('METRICS_SNAPSHOT_INTERVAL', 5))
+
+
+def _format_value(value):
+    """Format a sample value the way Prometheus expects"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=None):
+    """Render a label set as {a="x",b="y"}"""
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Metric:
+    """Base class for a metric family with optional labels"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child(())
+
+    def labels(self, *values):
+        """Get the child metric for a label combination"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child(key))
+        return child
+
+    def _new_child(self, key):
+        raise NotImplementedError
+
+    def _empty(self, labelnames):
+        """A family like this one with no samples"""
+        return type(self)(self.name, self.documentation, labelnames)
+
+    def snapshot(self):
+        """{label values: state} of every child"""
+        with self._lock:
+            return {key: child.state() for key, child in self._children.items()}
+
+    def reset(self):
+        with self._lock:
+            for child in self._children.values():
+                child.reset()
+
+    def merged(self, snapshots, live):
+        """The family summed over {pid: snapshot} (see Registry.render_merged)"""
+        total = self._empty(self.labelnames)
+        for snapshot in snapshots.values():
+            for key, state in snapshot.items():
+                total.labels(*key).add(state)
+        return total
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} requires labels {self.labelnames}")
+        return self._children[()]
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _ValueChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self, lock):
+        self._lock = lock
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = float(value)
+
+    def state(self):
+        return self.value
+
+    def reset(self):
+        self.value = 0.0
+
+    def add(self, state):
+        self.value += state
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    kind = 'counter'
+
+    def _new_child(self, key):
+        return _ValueChild(self._lock)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def value(self):
+        """This process's count (for a metric without labels)"""
+        return self._default().value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def _new_child(self, key):
+        return _ValueChild(self._lock)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def merged(self, snapshots, live):
+        # Gauges don't add up across processes; each live one reports its own
+        total = self._empty(self.labelnames + ('worker',))
+        for pid, snapshot in snapshots.items():
+            if pid in live:
+                for key, state in snapshot.items():
+                    total.labels(*key, pid).set(state)
+        return total
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', '_upper_bounds', '_counts', '_sum', '_count')
+
+    def __init__(self, lock, upper_bounds):
+        self._lock = lock
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * (len(upper_bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def state(self):
+        return [list(self._counts), self._sum, self._count]
+
+    def reset(self):
+        self._counts = [0] * len(self._counts)
+        self._sum = 0.0
+        self._count = 0
+
+    def add(self, state):
+        counts, total, count = state
+        self._counts = [a + b for a, b in zip(self._counts, counts)]
+        self._sum += total
+        self._count += count
+
+    def render(self, name, labelnames, key):
+        lines = []
+        cumulative = 0
+        bounds = list(self._upper_bounds) + [float('inf')]
+        for bound, count in zip(bounds, self._counts):
+            cumulative += count
+            labels = _format_labels(labelnames, key, ('le', _format_value(bound)))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, key)
+        lines.append(f"{name}_sum{labels} {_format_value(self._sum)}")
+        lines.append(f"{name}_count{labels} {self._count}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self._upper_bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self, key):
+        return _HistogramChild(self._lock, self._upper_bounds)
+
+    def _empty(self, labelnames):
+        return Histogram(self.name, self.documentation, labelnames, self._upper_bounds)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    """Collection of metric families rendered together"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """Render all metrics in the text exposition format"""
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Every metric's samples as JSON-ready data"""
+        return {name: [[list(key), state] for key, state in metric.snapshot().items()]
+                for name, metric in self._metrics.items()}
+
+    def reset(self):
+        """Zero every metric"""
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def render_merged(self, snapshots, live):
+        """Render the metrics of several processes' snapshots ({pid: snapshot}) as one
+
+        Gauges are reported for the `live` pids only.
+        """
+        lines = []
+        for name in sorted(self._metrics):
+            per_process = {pid: {tuple(key): state for key, state in snapshot.get(name, [])}
+                           for pid, snapshot in snapshots.items()}
+            lines.extend(self._metrics[name].merged(per_process, live).render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Web app
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'villagetemp_http_request_duration_seconds',
+    'Flask route latency in seconds',
+    ('method', 'endpoint', 'status'),
+)
+
+# Open-Meteo
+OPEN_METEO_REQUEST_SECONDS = REGISTRY.histogram(
+    'villagetemp_open_meteo_request_duration_seconds',
+    'Open-Meteo forecast call latency in seconds',
+    ('outcome',),
+)
+WEATHER_CACHE_LOOKUPS = REGISTRY.counter(
+    'villagetemp_weather_cache_lookups_total',
+    'Weather cache lookups by result (hit/miss)',
+    ('result',),
+)
+
+# Alert queue
+ALERT_QUEUE_DEPTH = REGISTRY.gauge(
+    'villagetemp_alert_queue_depth',
+    'Number of alerts waiting to be sent',
+)
+ALERT_OLDEST_AGE_SECONDS = REGISTRY.gauge(
+    'villagetemp_alert_oldest_age_seconds',
+    'Age of the oldest pending alert in seconds',
+)
+ALERTS_SCHEDULED = REGISTRY.gauge(
+    'villagetemp_alerts_scheduled',
+    'Alerts held for a later delivery time',
+)
+ALERT_QUEUED = REGISTRY.counter(
+    'villagetemp_alerts_queued_total',
+    'Alerts added to the queue',
+    ('type',),
+)
+ALERT_AGE_SECONDS = REGISTRY.histogram(
+    'villagetemp_alert_age_seconds',
+    'Time an alert waited in the queue before pickup',
+    ('type',),
+    buckets=AGE_BUCKETS,
+)
+ALERT_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'villagetemp_alert_queue_wait_seconds',
+    'Time from queueing an alert to its first send, by priority class',
+    ('class',),
+    buckets=AGE_BUCKETS,
+)
+ALERT_DEADLINE_MISSED = REGISTRY.counter(
+    'villagetemp_alert_deadline_missed_total',
+    'Alerts whose last send was after their delivery deadline, by priority class',
+    ('class',),
+)
+ALERT_SUPPRESSED = REGISTRY.counter(
+    'villagetemp_alerts_suppressed_total',
+    'Alerts not queued because the same area/type was alerted within its cooldown',
+    ('type',),
+)
+
+# Fan-out
+FANOUT_SENDS = REGISTRY.counter(
+    'villagetemp_fanout_messages_total',
+    'Alert messages sent to subscribers by outcome',
+    ('outcome',),
+)
+FANOUT_SEND_SECONDS = REGISTRY.histogram(
+    'villagetemp_fanout_send_duration_seconds',
+    'Latency of a single alert send_message call',
+)
+FANOUT_RETRY_AFTER = REGISTRY.counter(
+    'villagetemp_fanout_retry_after_total',
+    'Telegram RetryAfter (flood control) responses',
+)
+FANOUT_RETRY_AFTER_SECONDS = REGISTRY.counter(
+    'villagetemp_fanout_retry_after_wait_seconds_total',
+    'Seconds spent waiting because of RetryAfter',
+)
+FANOUT_CPU_SECONDS = REGISTRY.counter(
+    'villagetemp_fanout_cpu_seconds_total',
+    'CPU time spent rendering and serializing alert messages (divide by messages sent for per-send CPU)',
+)
+FANOUT_COALESCED = REGISTRY.counter(
+    'villagetemp_fanout_coalesced_total',
+    'Messages not sent because alerts for the same user were merged into a digest',
+)
+
+# Bot conversations
+CONVERSATIONS_ACTIVE = REGISTRY.gauge(
+    'villagetemp_bot_conversations_active',
+    'Users part-way through a multi-step bot flow such as /subscribe',
+)
+CONVERSATIONS_EVICTED = REGISTRY.counter(
+    'villagetemp_bot_conversations_evicted_total',
+    'Unfinished bot conversations dropped by reason (expired/capacity)',
+    ('reason',),
+)
+
+# Fire ingestion
+FIRE_STAGE_SECONDS = REGISTRY.histogram(
+    'villagetemp_fire_ingest_stage_duration_seconds',
+    'NASA fire ingestion stage timings in seconds',
+    ('stage',),
+    buckets=DEFAULT_BUCKETS + (120.0, 300.0, 600.0),
+)
+FIRE_RECORDS = REGISTRY.gauge(
+    'villagetemp_fire_ingest_records',
+    'Records produced by the last run of each fire ingestion stage',
+    ('stage',),
+)
+
+# Fire map
+FIRE_GRID_CACHE_LOOKUPS = REGISTRY.counter(
+    'villagetemp_fire_grid_cache_lookups_total',
+    'Fire-density grid cache lookups by result (hit/miss)',
+    ('result',),
+)
+
+
+# Snapshot directory once enable_multiprocess() has been called
+_multiprocess_dir = None
+
+
+def write_snapshot(directory=None):
+    """Write this process's metrics to <directory>/<pid>.json"""
+    directory = directory or _multiprocess_dir
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    try:
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(REGISTRY.snapshot(), f, separators=(',', ':'))
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.error(f"Error writing metrics snapshot {path}: {e}")
+
+
+def _read_snapshots(directory):
+    snapshots = {}
+    for filename in os.listdir(directory):
+        pid, ext = os.path.splitext(filename)
+        if ext != '.json' or not pid.isdigit():
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                snapshots[int(pid)] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def enable_multiprocess(directory, interval=METRICS_SNAPSHOT_INTERVAL):
+    """Report metrics summed over every process snapshotting to `directory`
+
+    Call in each worker process once it has forked. Metrics recorded before
+    the fork belong to the parent (which may write its own snapshot), so
+    they are zeroed here rather than counted once per worker.
+    """
+    global _multiprocess_dir
+    _multiprocess_dir = directory
+    REGISTRY.reset()
+    write_snapshot()
+
+    def refresh():
+        while True:
+            time.sleep(interval)
+            write_snapshot()
+    threading.Thread(target=refresh, name='metrics-snapshot', daemon=True).start()
+
+
+def generate_latest():
+    """Get all metrics (of every process, in multi-process mode) in the text exposition format"""
+    if _multiprocess_dir is None:
+        return REGISTRY.render()
+    write_snapshot()
+    snapshots = _read_snapshots(_multiprocess_dir)
+    live = {pid for pid in snapshots if _alive(pid)}
+    return REGISTRY.render_merged(snapshots, live)
+
+
+def write_textfile(path):
+    """Write metrics to a file (for node_exporter's textfile collector)"""
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(generate_latest())
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        logger.error(f"Error writing metrics textfile {path}: {e}")
+        return False
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = generate_latest().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, addr='0.0.0.0'):
+    """Serve /metrics from a background thread (for processes without Flask)"""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    logger.info(f"📈 Metrics available on http://{addr}:{port}/metrics")
+    return server
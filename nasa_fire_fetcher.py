@@ -11,16 +11,17 @@ from datetime import datetime, timedelta
 import requests
 import os
 import logging
+import metrics
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def load_location_data():
-    """Load location data from CSV"""
+    """Load location data (the shared compact copy, see compact_locations.py)"""
     try:
-        df = pd.read_csv('merged_village_temperature_data.csv')
-        return df
+        from shared_data import load_location_data as load_shared_location_data
+        return load_shared_location_data()
     except Exception as e:
         logger.error(f"Error loading location data: {e}")
         return pd.DataFrame()
@@ -93,8 +94,9 @@ def map_fires_to_districts(fire_df, location_df):
     fire_df['district'] = 'Unknown'
     fire_df['taluka'] = 'Unknown'
     
-    # Get unique locations with coordinates
+    # Get unique locations with coordinates (one row per taluka centre, not per village)
     locations = location_df[['District Name', 'Taluka Name', 'Taluka Latitude', 'Taluka Longitude']].dropna()
+    locations = locations.drop_duplicates()
     
     for idx, fire in fire_df.iterrows():
         fire_lat = fire['latitude']
@@ -182,29 +184,37 @@ def update_fire_history():
     logger.info("🔥 Starting NASA fire data update...")
     
     # Load location data
-    location_df = load_location_data()
+    with metrics.FIRE_STAGE_SECONDS.labels('load_locations').time():
+        location_df = load_location_data()
     if location_df.empty:
         logger.error("❌ Could not load location data")
         return False
     
     # Fetch NASA fire data
-    global_fire_df = fetch_nasa_fire_data()
+    with metrics.FIRE_STAGE_SECONDS.labels('fetch').time():
+        global_fire_df = fetch_nasa_fire_data()
+    metrics.FIRE_RECORDS.labels('fetch').set(len(global_fire_df))
     if global_fire_df.empty:
         logger.error("❌ Could not fetch NASA fire data")
         return False
     
     # Filter for Gujarat
-    gujarat_fire_df = filter_gujarat_fires(global_fire_df)
+    with metrics.FIRE_STAGE_SECONDS.labels('filter').time():
+        gujarat_fire_df = filter_gujarat_fires(global_fire_df)
+    metrics.FIRE_RECORDS.labels('filter').set(len(gujarat_fire_df))
     if gujarat_fire_df.empty:
         logger.info("ℹ️ No fire incidents found in Gujarat region today")
         # Still return True as this is not an error
         return True
     
     # Map to districts/talukas
-    mapped_fire_df = map_fires_to_districts(gujarat_fire_df, location_df)
+    with metrics.FIRE_STAGE_SECONDS.labels('map').time():
+        mapped_fire_df = map_fires_to_districts(gujarat_fire_df, location_df)
     
     # Process the data
-    processed_fire_df = process_fire_data(mapped_fire_df)
+    with metrics.FIRE_STAGE_SECONDS.labels('process').time():
+        processed_fire_df = process_fire_data(mapped_fire_df)
+    metrics.FIRE_RECORDS.labels('process').set(len(processed_fire_df))
     
     # Load existing fire history
     fire_history_file = 'gujarat_fire_history.csv'
@@ -233,7 +243,8 @@ def update_fire_history():
     
     # Save updated data
     try:
-        combined_df.to_csv(fire_history_file, index=False)
+        with metrics.FIRE_STAGE_SECONDS.labels('save').time():
+            combined_df.to_csv(fire_history_file, index=False)
         logger.info(f"✅ Fire history updated: {len(combined_df)} total records")
         
         # Also save to static folder for web access
@@ -311,6 +322,11 @@ def main():
     else:
         print("❌ NASA fire data update failed!")
     
+    # Batch job: hand stage timings to node_exporter's textfile collector
+    metrics_textfile = os.getenv('FIRE_METRICS_TEXTFILE')
+    if metrics_textfile:
+        metrics.write_textfile(metrics_textfile)
+    
     print("=" * 50)
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Read-only data built once before WSGI workers fork
+
+Each gunicorn worker used to load the village dataset, the weather grid's
+interpolation weights, the climatology tables and the fire history on its
+first request, so every worker held its own copy. With preloading
+(gunicorn.conf.py, or create_app(preload=True)) the master builds them
+once and the workers inherit them on fork. To keep those pages shared,
+the data must not be written by the workers. CPython writes to an
+object whenever it changes its reference count or the garbage collector
+visits it, so:
+
+- Array data (coordinates, categorical codes, weights, thresholds, fire
+  cells) is copied into private anonymous mmaps, away from the heap pages
+  that hold Python objects, and marked read-only. Reading it never
+  touches a Python object.
+- Text columns of the dataset become categoricals, so a row is a code in
+  such a buffer. Only the small tables of distinct names are Python
+  objects.
+- gc.freeze() moves everything built so far out of the collector's reach,
+  so collections in the workers don't write to it.
+
+Adding a worker then costs its interpreter state and request-time
+allocations rather than another copy of the data.
+
+The fire history is the exception once the fetcher rewrites its file:
+fire_density reloads it in each worker on the next request, and those
+copies are private. Restart the server after a fetch to share it again.
+"""
+
+import gc
+import mmap
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def shared_array(values):
+    """A read-only copy of an array in its own anonymous mapping
+
+    The mapping is private: pages stay shared with forked children until
+    someone writes to them, which the read-only flag prevents.
+    """
+    values = np.ascontiguousarray(values)
+    if values.dtype.hasobject:
+        raise TypeError("shared_array needs a numeric array")
+    buffer = mmap.mmap(-1, max(values.nbytes, 1), flags=mmap.MAP_PRIVATE)
+    shared = np.frombuffer(buffer, dtype=values.dtype, count=values.size).reshape(values.shape)
+    shared[...] = values
+    shared.flags.writeable = False
+    return shared
+
+
+def shared_frame(df):
+    """The frame with every column's data in shared arrays
+
+    Text columns become categoricals; numeric columns and categorical
+    codes are copied into shared_array buffers.
+    """
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        if series.dtype == object:
+            series = series.astype('category')
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = shared_array(series.cat.codes.to_numpy())
+            columns[name] = pd.Categorical.from_codes(codes, dtype=series.dtype, validate=False)
+        else:
+            columns[name] = shared_array(series.to_numpy())
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def _share_location_data():
+    import shared_data
+
+    df = shared_data.load_location_data()
+    if not df.empty:
+        shared_data._location_df = shared_frame(df)
+    return len(df)
+
+
+def _share_weather_field():
+    import weather_field
+
+    field, points = weather_field.get_weather_field()
+    if field is None:
+        return 0
+    for name in ('neighbours', 'weights', 'node_lats', 'node_lons'):
+        setattr(field, name, shared_array(getattr(field, name)))
+    weather_field._village_weather = shared_frame(points)
+    return len(points)
+
+
+def _share_climatology():
+    from climatology import get_climatology
+
+    climatology = get_climatology()
+    if climatology is None:
+        return 0
+    climatology.hot = shared_array(climatology.hot)
+    climatology.cold = shared_array(climatology.cold)
+    return len(climatology.areas)
+
+
+def _share_fire_history():
+    from fire_density import get_fire_history
+
+    history = get_fire_history()
+    for name in ('dates', 'cols', 'rows', 'confidence'):
+        setattr(history, name, shared_array(getattr(history, name)))
+    return len(history)
+
+
+def preload_shared_data():
+    """Build the web app's read-only data in this process and freeze it
+
+    Call in the process that forks the workers (gunicorn's master with
+    preload_app), before any worker starts.
+    """
+    import app
+
+    start = time.perf_counter()
+    counts = {}
+    for name, share in (('locations', _share_location_data), ('weather points', _share_weather_field),
+                        ('climatology talukas', _share_climatology), ('fires', _share_fire_history)):
+        try:
+            counts[name] = share()
+        except Exception as e:
+            logger.error(f"Error preloading {name}: {e}")
+    app.load_taluka_data()
+
+    gc.collect()
+    gc.freeze()
+    summary = ', '.join(f"{count} {name}" for name, count in counts.items())
+    logger.info(f"📦 Preloaded {summary} in {time.perf_counter() - start:.1f}s")
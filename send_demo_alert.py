@@ -18,7 +18,6 @@ def send_demo_alert_ahmedabad_bavla():
     print("=" * 50)
     
     # Configuration
-    bot_token = os.getenv('TELEGRAM_BOT_TOKEN', '8235992714:AAED7tTjm6waV6Ak-L-_LgRz37ZfnuEnE4w')
     district = "AHMEDABAD"
     taluka = "Bavla"
     
@@ -3,104 +3,180 @@
 Shared data system between bot and website
 """
 
-import json
 import os
 import logging
+import threading
 from datetime import datetime
-import asyncio
-import requests
+import pandas as pd
+import metrics
+from compact_locations import read_location_csv
+from backends import (
+    create_backend, FileBackend, area_key, split_area_key, delivery_time, ALERTS_CHANNEL, SUBSCRIBERS_CHANNEL
+)
 
 logger = logging.getLogger(__name__)
 
 # File to store subscriber data
 SUBSCRIBERS_FILE = 'subscribers.json'
 ALERTS_FILE = 'pending_alerts.json'
+ALERT_STATE_FILE = 'alert_state.json'
+SCHEDULED_ALERTS_FILE = 'scheduled_alerts.json'
+SHARD_PROGRESS_FILE = 'shard_progress.json'
+
+# Possible locations of the village dataset
+LOCATION_DATA_FILES = [
+    'merged_village_temperature_data.csv',
+    'static/merged_village_temperature_data.csv',
+    '/app/merged_village_temperature_data.csv'
+]
+
+# Guards one-time loading of shared datasets
+_state_lock = threading.RLock()
+
+_backend = None
+_location_df = None
+
+def get_backend():
+    """Storage backend for subscribers, alerts and notifications (see backends.py)"""
+    global _backend
+    if _backend is None:
+        with _state_lock:
+            if _backend is None:
+                _backend = create_backend(subscribers_file=SUBSCRIBERS_FILE, alerts_file=ALERTS_FILE,
+                                          alert_state_file=ALERT_STATE_FILE,
+                                          scheduled_alerts_file=SCHEDULED_ALERTS_FILE,
+                                          shard_progress_file=SHARD_PROGRESS_FILE)
+    return _backend
+
+def enable_in_process_mode():
+    """Serve subscriber and alert state from memory"""
+    backend = get_backend()
+    if isinstance(backend, FileBackend):
+        backend.in_process = True
+        logger.info("🧠 Shared data running in in-process mode")
+
+def add_alert_listener(callback):
+    """Call callback(alert) whenever an alert is queued
+
+    With the file backend only alerts queued in this process are seen; with
+    Redis, alerts queued on any node are.
+    """
+    get_backend().subscribe(ALERTS_CHANNEL, callback)
+
+def load_location_data():
+    """Load the village dataset once per process, in compact form (see compact_locations.py)"""
+    global _location_df
+    if _location_df is not None:
+        return _location_df
+    
+    with _state_lock:
+        if _location_df is not None:
+            return _location_df
+        for csv_file in LOCATION_DATA_FILES:
+            try:
+                _location_df = read_location_csv(csv_file)
+                logger.info(f"✅ Loaded data from {csv_file}")
+                return _location_df
+            except FileNotFoundError:
+                continue
+    
+    logger.error("❌ Could not find CSV data file")
+    return pd.DataFrame()
 
 def load_subscribers():
-    """Load subscribers from file"""
+    """Load subscribers from the backend"""
     try:
-        if os.path.exists(SUBSCRIBERS_FILE):
-            with open(SUBSCRIBERS_FILE, 'r') as f:
-                return json.load(f)
-        return {}
+        return get_backend().load_subscribers()
     except Exception as e:
         logger.error(f"Error loading subscribers: {e}")
         return {}
 
 def save_subscribers(subscribers):
-    """Save subscribers to file"""
+    """Save subscribers to the backend"""
     try:
-        with open(SUBSCRIBERS_FILE, 'w') as f:
-            json.dump(subscribers, f, indent=2)
+        get_backend().save_subscribers(subscribers)
         return True
     except Exception as e:
         logger.error(f"Error saving subscribers: {e}")
         return False
 
 def add_subscriber(user_id, district, taluka):
-    """Add a subscriber"""
-    subscribers = load_subscribers()
-    key = f"{district}_{taluka}"
-    
-    if key not in subscribers:
-        subscribers[key] = []
-    
-    # Remove user from other subscriptions
-    for sub_key in list(subscribers.keys()):
-        if user_id in subscribers[sub_key]:
-            subscribers[sub_key].remove(user_id)
-    
-    # Add to new subscription
-    if user_id not in subscribers[key]:
-        subscribers[key].append(user_id)
-    
-    save_subscribers(subscribers)
-    logger.info(f"User {user_id} subscribed to {district} -> {taluka}")
+    """Subscribe a user to an area (in addition to any others they follow)"""
+    added = get_backend().add_subscriber(user_id, district, taluka)
+    if added:
+        logger.info(f"User {user_id} subscribed to {district} -> {taluka}")
+        _publish_subscriber_change(user_id)
     return True
 
-def remove_subscriber(user_id):
-    """Remove subscriber from all areas"""
-    subscribers = load_subscribers()
-    removed = False
-    
-    for key in list(subscribers.keys()):
-        if user_id in subscribers[key]:
-            subscribers[key].remove(user_id)
-            removed = True
-    
+def remove_subscriber(user_id, district=None, taluka=None):
+    """Remove subscriber from one area, or from all areas if none is given"""
+    removed = get_backend().remove_subscriber(user_id, district, taluka)
     if removed:
-        save_subscribers(subscribers)
-        logger.info(f"User {user_id} unsubscribed from all areas")
-    
+        if district is None:
+            logger.info(f"User {user_id} unsubscribed from all areas")
+        else:
+            logger.info(f"User {user_id} unsubscribed from {district} -> {taluka}")
+        _publish_subscriber_change(user_id)
     return removed
 
+def _publish_subscriber_change(user_id):
+    try:
+        get_backend().publish(SUBSCRIBERS_CHANNEL, {'user_id': user_id})
+    except Exception as e:
+        logger.error(f"Error publishing subscriber change: {e}")
+
+def get_user_subscriptions(user_id):
+    """Get all areas a user is subscribed to"""
+    subscriptions = []
+    for key in get_backend().get_user_areas(user_id):
+        district, taluka = split_area_key(key)
+        subscriptions.append({'district': district, 'taluka': taluka})
+    return subscriptions
+
 def get_user_subscription(user_id):
-    """Get user's current subscription"""
-    subscribers = load_subscribers()
-    
-    for key, user_list in subscribers.items():
-        if user_id in user_list:
-            district, taluka = key.split('_', 1)
-            return {'district': district, 'taluka': taluka}
-    
-    return None
+    """Get user's first subscription (see get_user_subscriptions for all)"""
+    subscriptions = get_user_subscriptions(user_id)
+    return subscriptions[0] if subscriptions else None
 
 def get_subscribers_for_area(district, taluka):
     """Get all subscribers for a specific area"""
-    subscribers = load_subscribers()
-    key = f"{district}_{taluka}"
-    return subscribers.get(key, [])
+    return get_backend().get_subscribers_for_area(district, taluka)
 
-def queue_alert(district, taluka, message, alert_type="custom"):
-    """Queue an alert to be sent to subscribers"""
+def get_subscribers_for_district(district):
+    """Get everyone subscribed to any taluka of a district, each user once"""
+    backend = get_backend()
+    return backend.get_subscribers_for_areas(backend.get_district_areas(district))
+
+def get_subscriber_stats(top_k=10):
+    """Subscriber totals, per-district counts and the top_k areas (kept up to date, no scan)"""
+    return get_backend().get_subscriber_stats(top_k)
+
+def get_alert_recipients(alert):
+    """Users an alert goes to, each once even if several of their areas are covered
+
+    An alert covers its district/taluka plus any extra [district, taluka]
+    pairs in alert['areas']; a taluka of None means the whole district.
+    """
+    backend = get_backend()
+    area_keys = set()
+    for district, taluka in [(alert['district'], alert.get('taluka'))] + list(alert.get('areas', [])):
+        if taluka:
+            area_keys.add(area_key(district, taluka))
+        else:
+            area_keys |= backend.get_district_areas(district)
+    return backend.get_subscribers_for_areas(area_keys)
+
+def queue_alert(district, taluka, message, alert_type="custom", areas=None, severity=None, deliver_at=None):
+    """Queue an alert to be sent to subscribers
+
+    Pass taluka=None for a district-wide alert, and areas=[(district, taluka), ...]
+    to cover more areas with the same alert (see get_alert_recipients).
+    High and extreme severities skip the digest window (see alert_digest.py).
+    A future deliver_at holds the alert until then (see delivery_timer.py); a
+    naive deliver_at is Gujarat time (backends.DELIVERY_TIMEZONE), not the
+    server's.
+    """
     try:
-        # Load existing alerts
-        alerts = []
-        if os.path.exists(ALERTS_FILE):
-            with open(ALERTS_FILE, 'r') as f:
-                alerts = json.load(f)
-        
-        # Add new alert
         alert = {
             'id': f"{datetime.now().timestamp()}",
             'district': district,
@@ -110,14 +186,29 @@ def queue_alert(district, taluka, message, alert_type="custom"):
             'timestamp': datetime.now().isoformat(),
             'sent': False
         }
+        if areas:
+            alert['areas'] = [list(area) for area in areas]
+        if severity:
+            alert['severity'] = severity
         
-        alerts.append(alert)
+        backend = get_backend()
+        deliver_at = delivery_time(deliver_at) if deliver_at else None
+        if deliver_at and deliver_at > datetime.now(deliver_at.tzinfo):
+            alert['deliver_at'] = deliver_at.isoformat()
+            backend.schedule_alert(alert)
+            logger.info(f"Alert scheduled for {deliver_at:%Y-%m-%d %H:%M} to {district} -> {taluka}: {message}")
+        else:
+            backend.push_alert(alert)
+            logger.info(f"Alert queued for {district} -> {taluka}: {message}")
         
-        # Save alerts
-        with open(ALERTS_FILE, 'w') as f:
-            json.dump(alerts, f, indent=2)
+        metrics.ALERT_QUEUED.labels(alert_type).inc()
+        
+        # Wake dispatchers; they also poll, so a lost notification only delays the alert
+        try:
+            backend.publish(ALERTS_CHANNEL, alert)
+        except Exception as e:
+            logger.error(f"Error publishing alert: {e}")
         
-        logger.info(f"Alert queued for {district} -> {taluka}: {message}")
         return True
         
     except Exception as e:
@@ -127,87 +218,74 @@ def queue_alert(district, taluka, message, alert_type="custom"):
 def get_pending_alerts():
     """Get all pending alerts"""
     try:
-        if os.path.exists(ALERTS_FILE):
-            with open(ALERTS_FILE, 'r') as f:
-                alerts = json.load(f)
-            return [alert for alert in alerts if not alert.get('sent', False)]
-        return []
+        return get_backend().get_pending_alerts()
     except Exception as e:
         logger.error(f"Error getting pending alerts: {e}")
         return []
 
-def mark_alert_sent(alert_id):
-    """Mark an alert as sent"""
+def claim_alert(alert_id, owner, ttl=3600):
+    """Claim an alert for sending; False if another dispatcher already has it"""
     try:
-        if os.path.exists(ALERTS_FILE):
-            with open(ALERTS_FILE, 'r') as f:
-                alerts = json.load(f)
-            
-            for alert in alerts:
-                if alert['id'] == alert_id:
-                    alert['sent'] = True
-                    alert['sent_at'] = datetime.now().isoformat()
-            
-            with open(ALERTS_FILE, 'w') as f:
-                json.dump(alerts, f, indent=2)
-            
-            return True
+        return get_backend().claim_alert(alert_id, owner, ttl)
     except Exception as e:
-        logger.error(f"Error marking alert as sent: {e}")
+        logger.error(f"Error claiming alert: {e}")
         return False
 
-async def send_telegram_message(bot_token, chat_id, message):
-    """Send message via Telegram Bot API"""
+def renew_claim(alert_id, owner, ttl=3600):
+    """Extend a claim while still sending; False if it was lost (or can't be checked)"""
     try:
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        data = {
-            'chat_id': chat_id,
-            'text': message,
-            'parse_mode': 'HTML'
-        }
-        
-        response = requests.post(url, data=data, timeout=10)
-        response.raise_for_status()
-        
-        return True
+        return get_backend().renew_claim(alert_id, owner, ttl)
     except Exception as e:
-        logger.error(f"Error sending Telegram message to {chat_id}: {e}")
+        logger.error(f"Error renewing alert claim: {e}")
         return False
 
-def send_alert_to_subscribers(district, taluka, message, bot_token):
-    """Send alert to all subscribers of an area"""
+def release_claim(alert_id, owner):
+    """Give up a claim once the alert is sent"""
     try:
-        subscribers = get_subscribers_for_area(district, taluka)
-        
-        if not subscribers:
-            logger.info(f"No subscribers for {district} -> {taluka}")
-            return 0
-        
-        sent_count = 0
-        alert_text = f"⚠️ WEATHER ALERT\n\n{message}\n\n📍 Location: {taluka}, {district}\n🕐 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        
-        for user_id in subscribers:
-            try:
-                # Use requests to send via Telegram API
-                url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-                data = {
-                    'chat_id': user_id,
-                    'text': alert_text
-                }
-                
-                response = requests.post(url, data=data, timeout=10)
-                if response.status_code == 200:
-                    sent_count += 1
-                    logger.info(f"Alert sent to user {user_id}")
-                else:
-                    logger.error(f"Failed to send alert to user {user_id}: {response.text}")
-                    
-            except Exception as e:
-                logger.error(f"Error sending alert to user {user_id}: {e}")
-        
-        logger.info(f"Alert sent to {sent_count}/{len(subscribers)} subscribers in {district} -> {taluka}")
-        return sent_count
-        
+        get_backend().release_claim(alert_id, owner)
     except Exception as e:
-        logger.error(f"Error sending alert to subscribers: {e}")
-        return 0
\ No newline at end of file
+        logger.error(f"Error releasing alert claim: {e}")
+
+def get_schedule_version():
+    """Changes whenever alerts are scheduled or released"""
+    try:
+        return get_backend().get_schedule_version()
+    except Exception as e:
+        logger.error(f"Error checking scheduled alerts: {e}")
+        return None
+
+def get_scheduled_alert_times():
+    """[(deliver_at epoch seconds, alert id), ...] for every scheduled alert"""
+    try:
+        return get_backend().get_scheduled_times()
+    except Exception as e:
+        logger.error(f"Error loading scheduled alerts: {e}")
+        return []
+
+def release_due_alerts():
+    """Move scheduled alerts that are due into the queue; returns them"""
+    try:
+        return get_backend().release_due_alerts()
+    except Exception as e:
+        logger.error(f"Error releasing scheduled alerts: {e}")
+        return []
+
+def mark_alert_sent(alert_id):
+    """Mark an alert as sent"""
+    try:
+        return get_backend().mark_alert_sent(alert_id)
+    except Exception as e:
+        logger.error(f"Error marking alert as sent: {e}")
+        return False
+
+def send_alert_to_subscribers(district, taluka, message, bot_token=None):
+    """Queue an alert for an area's subscribers; returns how many it will reach
+
+    Alerts are sent only by the bot's dispatcher (see fanout.py), so this
+    no longer posts to Telegram itself; bot_token is ignored.
+    """
+    subscribers = get_subscribers_for_area(district, taluka)
+    if not subscribers:
+        logger.info(f"No subscribers for {district} -> {taluka}")
+        return 0
+    return len(subscribers) if queue_alert(district, taluka, message, "weather") else 0
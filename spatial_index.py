@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Nearest-location lookup over the village/taluka coordinates
+
+Points are bucketed once into a uniform lat/lon grid (sized for about two
+points per cell). A lookup scans rings of cells outward from the query's
+cell and stops as soon as no unvisited cell can hold a closer point, so it
+touches a handful of points whatever the dataset size.
+"""
+
+import math
+
+import numpy as np
+
+# Kilometres per degree of latitude
+KM_PER_DEGREE = 111.195
+
+
+class GridIndex:
+    """Uniform-grid nearest-neighbour index over (lat, lon) points"""
+
+    def __init__(self, lats, lons, cell_deg=None, points_per_cell=2):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        if len(self.lats) == 0:
+            raise ValueError("GridIndex needs at least one point")
+
+        self.min_lat = float(self.lats.min())
+        self.min_lon = float(self.lons.min())
+        if cell_deg is None:
+            area = max(np.ptp(self.lats), 0.01) * max(np.ptp(self.lons), 0.01)
+            cell_deg = math.sqrt(area * points_per_cell / len(self.lats))
+        self.cell_deg = cell_deg
+
+        rows = ((self.lats - self.min_lat) // cell_deg).astype(np.int64)
+        cols = ((self.lons - self.min_lon) // cell_deg).astype(np.int64)
+        self.n_rows = int(rows.max()) + 1
+        self.n_cols = int(cols.max()) + 1
+
+        # Points sorted by cell; each cell maps to a slice of self.order
+        keys = rows * self.n_cols + cols
+        self.order = np.argsort(keys, kind='stable')
+        cell_keys, starts, counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.cells = {
+            int(key): (int(start), int(start + count))
+            for key, start, count in zip(cell_keys, starts, counts)
+        }
+
+    def _ring(self, row, col, radius):
+        """Point indices in the cells at Chebyshev distance `radius` from (row, col)"""
+        if radius == 0:
+            cells = [(row, col)]
+        else:
+            top, bottom = row - radius, row + radius
+            cells = [(top, c) for c in range(col - radius, col + radius + 1)]
+            cells += [(bottom, c) for c in range(col - radius, col + radius + 1)]
+            cells += [(r, col - radius) for r in range(top + 1, bottom)]
+            cells += [(r, col + radius) for r in range(top + 1, bottom)]
+        slices = [
+            self.cells.get(r * self.n_cols + c)
+            for r, c in cells
+            if 0 <= r < self.n_rows and 0 <= c < self.n_cols
+        ]
+        slices = [s for s in slices if s]
+        if not slices:
+            return None
+        if len(slices) == 1:
+            return self.order[slices[0][0]:slices[0][1]]
+        return np.concatenate([self.order[start:stop] for start, stop in slices])
+
+    def nearest(self, lat, lon, max_km=None):
+        """Index of the point closest to (lat, lon) and its distance in km
+
+        Returns (None, None) if no point lies within max_km.
+        """
+        row = int((lat - self.min_lat) // self.cell_deg)
+        col = int((lon - self.min_lon) // self.cell_deg)
+        lon_scale = math.cos(math.radians(lat))
+        # A ring `radius` cells out is at least this many degrees (scaled) away
+        step = self.cell_deg * min(1.0, lon_scale)
+        max_deg = max_km / KM_PER_DEGREE if max_km is not None else math.inf
+        # Rings beyond this cover no cells at all
+        max_radius = max(abs(row), abs(row - self.n_rows), abs(col), abs(col - self.n_cols)) + 1
+
+        best, best_d2 = None, math.inf
+        for radius in range(max_radius + 1):
+            bound = max(radius - 1, 0) * step
+            if bound * bound >= best_d2 or bound > max_deg:
+                break
+            candidates = self._ring(row, col, radius)
+            if candidates is None:
+                continue
+            dy = self.lats[candidates] - lat
+            dx = (self.lons[candidates] - lon) * lon_scale
+            d2 = dy * dy + dx * dx
+            i = int(d2.argmin())
+            if d2[i] < best_d2:
+                best, best_d2 = int(candidates[i]), float(d2[i])
+
+        distance_km = math.sqrt(best_d2) * KM_PER_DEGREE if best is not None else None
+        if best is None or (max_km is not None and distance_km > max_km):
+            return None, None
+        return best, distance_km
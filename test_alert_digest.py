@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for digest formatting, splitting and grouping
+"""
+
+from datetime import datetime
+
+from alert_digest import MAX_MESSAGE_LENGTH, format_alert, format_digest, group_by_recipient, release_at
+
+NOW = datetime(2026, 5, 1, 14, 30)
+
+
+def alert(n, message=None):
+    return {'district': 'Kutch', 'taluka': f"Taluka {n}", 'message': message or f"Heat wave warning {n}"}
+
+
+def test_single_alert_is_the_plain_alert():
+    assert format_digest([alert(1)], NOW) == [format_alert(alert(1), NOW)]
+
+
+def test_several_alerts_fit_in_one_message():
+    [text] = format_digest([alert(1), alert(2), alert(3)], NOW)
+    assert text.startswith('🚨 3 WEATHER ALERTS\n\n1. 📍 Taluka 1, Kutch')
+    assert '3. 📍 Taluka 3, Kutch\nHeat wave warning 3' in text
+    assert text.endswith('🕒 2026-05-01 14:30')
+
+
+def test_long_digest_splits_at_alert_boundaries():
+    alerts = [alert(n, f"{n}: " + 'x' * 900) for n in range(1, 11)]
+    texts = format_digest(alerts, NOW)
+    assert len(texts) > 1
+    for n, text in enumerate(texts, start=1):
+        assert len(text) <= MAX_MESSAGE_LENGTH
+        assert text.startswith(f"🚨 10 WEATHER ALERTS ({n}/{len(texts)})")
+    # Every alert appears once, whole and in order
+    joined = '\n'.join(texts)
+    positions = [joined.index(f"{n}. 📍 Taluka {n}, Kutch\n{n}: " + 'x' * 900) for n in range(1, 11)]
+    assert positions == sorted(positions)
+
+
+def test_oversized_alerts_are_truncated_to_the_limit():
+    texts = format_digest([alert(1, 'y' * 5000), alert(2)], NOW, limit=1000)
+    assert all(len(text) <= 1000 for text in texts)
+    assert texts[0].count('…') == 1
+    assert format_digest([alert(1, 'y' * 5000)], NOW, limit=1000)[0].endswith('…')
+
+
+def test_recipients_with_the_same_alerts_share_a_digest():
+    groups = group_by_recipient([{}, {}, {}], [{1, 2, 3}, {2, 3}, {3}])
+    assert {indices: sorted(users) for indices, users in groups.items()} == {
+        (0,): [1], (0, 1): [2], (0, 1, 2): [3],
+    }
+
+
+def test_release_at():
+    queued = {'timestamp': '2026-05-01T14:30:00'}
+    start = datetime(2026, 5, 1, 14, 30).timestamp()
+    assert release_at(queued, window=60) == start + 60
+    assert release_at(dict(queued, severity='extreme'), window=60) == start
+    assert release_at(dict(queued, deliver_at='2026-05-01T14:30:00'), window=60) == start
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for AlertEngine hysteresis, cooldown, escalation and rollback
+"""
+
+import pytest
+
+import shared_data
+from alert_engine import AlertEngine, Reading, alert_key
+from backends import FileBackend
+
+HOUR = 3600
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    backend = FileBackend(subscribers_file=str(tmp_path / 'subscribers.json'),
+                          alerts_file=str(tmp_path / 'pending_alerts.json'),
+                          alert_state_file=str(tmp_path / 'alert_state.json'),
+                          scheduled_alerts_file=str(tmp_path / 'scheduled_alerts.json'),
+                          shard_progress_file=str(tmp_path / 'shard_progress.json'))
+    monkeypatch.setattr(shared_data, '_backend', backend)
+    return AlertEngine(backend, cooldown=6 * HOUR, hysteresis=2.0)
+
+
+def heat(value, severity='medium'):
+    return Reading('Kutch', 'Bhuj', 'heat', value, 40.0, severity)
+
+
+def test_episode_opens_at_threshold_and_clears_below_hysteresis(engine):
+    key = alert_key('Kutch', 'Bhuj', 'heat')
+    assert engine.observe([heat(39.9)], now=1000) == []
+    assert engine.observe([heat(40.0)], now=1000) == [key]
+    # Hovering just under the threshold keeps the same episode open
+    assert engine.observe([heat(38.5)], now=1100) == []
+    assert engine.observe([heat(40.5)], now=1200) == []
+    # Clearing needs the reading more than 2 °C back on the safe side
+    engine.observe([heat(37.9)], now=1300)
+    assert engine.observe([heat(40.1)], now=1400) == [key]
+
+
+def test_cold_readings_open_when_falling(engine):
+    reading = Reading('Kutch', 'Bhuj', 'cold', 4.0, 5.0, 'medium', False)
+    assert engine.observe([reading], now=1000) == [alert_key('Kutch', 'Bhuj', 'cold')]
+
+
+def test_one_alert_per_episode_until_cooldown(engine):
+    engine.observe([heat(41)], now=1000)
+    assert engine.claim('Kutch', 'Bhuj', 'heat', now=1000)
+    assert not engine.claim('Kutch', 'Bhuj', 'heat', now=1000 + HOUR)
+    assert engine.claim('Kutch', 'Bhuj', 'heat', now=1000 + 6 * HOUR)
+    assert engine.last_sent('Kutch', 'Bhuj', 'heat') == 1000 + 6 * HOUR
+
+
+def test_new_episode_alerts_again(engine):
+    engine.observe([heat(41)], now=1000)
+    assert engine.claim('Kutch', 'Bhuj', 'heat', now=1000)
+    engine.observe([heat(30)], now=2000)
+    engine.observe([heat(41)], now=3000)
+    assert engine.claim('Kutch', 'Bhuj', 'heat', now=3000)
+
+
+def test_higher_severity_goes_out_at_once(engine):
+    engine.observe([heat(41)], now=1000)
+    assert engine.claim('Kutch', 'Bhuj', 'heat', severity='medium', now=1000)
+    assert not engine.claim('Kutch', 'Bhuj', 'heat', severity='low', now=1100)
+    assert engine.claim('Kutch', 'Bhuj', 'heat', severity='high', now=1100)
+    assert not engine.claim('Kutch', 'Bhuj', 'heat', severity='high', now=1200)
+
+
+def test_force_skips_the_cooldown(engine):
+    assert engine.claim('Kutch', 'Bhuj', 'custom', now=1000)
+    assert engine.claim('Kutch', 'Bhuj', 'custom', force=True, now=1100)
+
+
+def test_rollback_restores_the_state_before_the_claim(engine):
+    engine.observe([heat(41)], now=1000)
+    assert engine.claim('Kutch', 'Bhuj', 'heat', now=1000)
+    engine.rollback('Kutch', 'Bhuj', 'heat')
+    assert engine.last_sent('Kutch', 'Bhuj', 'heat') == 0
+    assert engine.claim('Kutch', 'Bhuj', 'heat', now=1100)
+    # Only the last claim can be rolled back
+    engine.rollback('Kutch', 'Bhuj', 'heat')
+    engine.rollback('Kutch', 'Bhuj', 'heat')
+    assert engine.last_sent('Kutch', 'Bhuj', 'heat') == 0
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for PriorityScheduler: weighted fair order, deadlines and overdue flows
+"""
+
+from alert_scheduler import PriorityScheduler, alert_deadline
+
+FAR = 1e12
+
+
+def drain(scheduler, now=0, limit=None):
+    """Flow keys in the order their jobs are picked"""
+    order = []
+    while limit is None or len(order) < limit:
+        picked = scheduler.next(now)
+        if picked is None:
+            break
+        order.append(picked[0].key)
+    return order
+
+
+def test_jobs_of_a_flow_go_in_order():
+    scheduler = PriorityScheduler()
+    scheduler.add('a', 'normal', FAR, [1, 2, 3])
+    assert len(scheduler) == 3
+    assert [scheduler.next(0)[1] for _ in range(3)] == [1, 2, 3]
+    assert scheduler.next(0) is None
+    assert len(scheduler) == 0
+
+
+def test_no_jobs_no_flow():
+    scheduler = PriorityScheduler()
+    assert scheduler.add('a', 'normal', FAR, []) is None
+    assert scheduler.next(0) is None
+
+
+def test_classes_share_by_weight():
+    scheduler = PriorityScheduler(weights={'urgent': 16, 'normal': 4, 'routine': 1})
+    scheduler.add('routine', 'routine', FAR, list(range(1000)))
+    scheduler.add('normal', 'normal', FAR, list(range(1000)))
+    scheduler.add('urgent', 'urgent', FAR, list(range(1000)))
+    order = drain(scheduler, limit=210)
+    assert order.count('urgent') == 160
+    assert order.count('normal') == 40
+    assert order.count('routine') == 10
+
+
+def test_new_urgent_flow_is_not_stuck_behind_a_big_one():
+    scheduler = PriorityScheduler()
+    scheduler.add('advisory', 'routine', FAR, list(range(50000)))
+    drain(scheduler, limit=100)
+    scheduler.add('fire', 'urgent', FAR, list(range(200)))
+    order = drain(scheduler, limit=220)
+    assert order.count('fire') == 200
+
+
+def test_equal_flows_alternate_in_the_order_added():
+    scheduler = PriorityScheduler()
+    scheduler.add('a', 'normal', FAR, [1, 2])
+    scheduler.add('b', 'normal', FAR, [1, 2])
+    assert drain(scheduler) == ['a', 'b', 'a', 'b']
+
+
+def test_flow_at_risk_goes_first_within_its_class():
+    scheduler = PriorityScheduler(send_interval=1)
+    scheduler.add('big', 'normal', FAR, list(range(100)))
+    # 40 jobs at 1 s each only just fit before a deadline 50 s away
+    scheduler.add('tight', 'normal', 50, list(range(40)))
+    assert drain(scheduler, now=20, limit=5) == ['tight'] * 5
+
+
+def test_earliest_deadline_first_among_flows_at_risk():
+    scheduler = PriorityScheduler(send_interval=1)
+    scheduler.add('later', 'normal', 30, list(range(30)))
+    scheduler.add('sooner', 'normal', 20, list(range(20)))
+    assert drain(scheduler, now=5, limit=3) == ['sooner'] * 3
+
+
+def test_late_routine_flow_does_not_jump_urgent_alerts():
+    scheduler = PriorityScheduler(send_interval=1)
+    scheduler.add('urgent', 'urgent', FAR, list(range(10)))
+    scheduler.add('routine', 'routine', 50, list(range(100)))
+    assert drain(scheduler, now=0, limit=10) == ['urgent'] * 10
+
+
+def test_overdue_flow_falls_back_to_fair_share():
+    scheduler = PriorityScheduler(send_interval=1)
+    scheduler.add('hopeless', 'normal', 10, list(range(100)))
+    scheduler.add('other', 'normal', FAR, list(range(100)))
+    # At risk: served ahead of the fair order
+    assert drain(scheduler, now=0, limit=4) == ['hopeless'] * 4
+    # Past its deadline it no longer starves the other flow
+    order = drain(scheduler, now=11, limit=20)
+    assert abs(order.count('hopeless') - order.count('other')) <= 4
+
+
+def test_alert_deadline():
+    alert = {'severity': 'high', 'timestamp': '2026-01-01T00:00:00'}
+    queued = alert_deadline(dict(alert, deadline='2026-01-01T00:00:00'))
+    assert alert_deadline(alert, deadlines={'urgent': 300, 'normal': 1800, 'routine': 7200}) == queued + 300
+    assert alert_deadline({'severity': 'low'}, now=100,
+                          deadlines={'urgent': 300, 'normal': 1800, 'routine': 7200}) == 7300
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests for bucketed send durations, trace file rotation and latency reports
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import alert_tracing
+from alert_tracing import (SEND_MS_BUCKETS, AlertTrace, build_latency_report, histogram_percentile, load_traces,
+                           percentile, send_ms_histogram)
+
+
+@pytest.fixture
+def traces_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'alert_traces.jsonl')
+    monkeypatch.setattr(alert_tracing, 'ALERT_TRACES_FILE', path)
+    monkeypatch.setattr(alert_tracing, '_parsed', {})
+    return path
+
+
+def trace(alert_id='1', alert_type='heat', recipients=3, durations=(0.004, 0.02, 0.3), queued=None,
+          pickup=1.0, deliver=5.0):
+    queued = queued or datetime(2026, 5, 1, 9, 0)
+    result = AlertTrace({'id': alert_id, 'type': alert_type, 'timestamp': queued.isoformat()},
+                        picked_up_at=queued + timedelta(seconds=pickup))
+    result.recipients = recipients
+    for duration in durations:
+        result.record_send(duration)
+    result.first_sent_at = (queued + timedelta(seconds=pickup + 0.5)).isoformat()
+    result.last_sent_at = (queued + timedelta(seconds=deliver)).isoformat()
+    return result
+
+
+def test_sends_are_counted_in_buckets():
+    counts, maximum = send_ms_histogram(trace(durations=(0.004, 0.005, 0.0051, 0.02, 31.0)).to_dict())
+    assert len(counts) == len(SEND_MS_BUCKETS) + 1
+    # Bucket bounds are inclusive: 5 ms counts as <= 5
+    assert counts[:3] == [2, 1, 1]
+    assert counts[-1] == 1
+    assert maximum == 31000.0
+
+
+def test_failed_sends_are_timed_but_not_sent():
+    result = trace(durations=())
+    result.record_send(0.1, success=False)
+    assert (result.sent, result.failed, sum(result.send_ms_buckets)) == (0, 1, 1)
+
+
+def test_old_traces_with_every_duration():
+    counts, maximum = send_ms_histogram({'send_durations_ms': [3.0, 40.0, 40.0, 700.0]})
+    assert counts[0] == 1 and counts[3] == 2 and counts[7] == 1
+    assert maximum == 700.0
+
+
+def test_histogram_percentile():
+    counts = [0] * (len(SEND_MS_BUCKETS) + 1)
+    counts[1], counts[4], counts[-1] = 90, 9, 1
+    assert histogram_percentile(counts, 50) == 10
+    assert histogram_percentile(counts, 95) == 100
+    assert histogram_percentile(counts, 99) == 100
+    # The slowest send stands in for the open-ended bucket and caps the others
+    assert histogram_percentile(counts, 100, maximum=45000) == 45000
+    assert histogram_percentile(counts, 95, maximum=60) == 60
+    assert histogram_percentile([0] * len(counts), 50) is None
+
+
+def test_bucket_percentiles_bound_the_exact_ones():
+    durations = [0.001 * (i % 700) for i in range(1000)]
+    counts, maximum = send_ms_histogram(trace(durations=durations).to_dict())
+    exact = [round(d * 1000, 1) for d in durations]
+    for pct in (50, 95, 99):
+        estimate = histogram_percentile(counts, pct, maximum)
+        assert percentile(exact, pct) <= estimate <= max(exact)
+        # Within one bucket of the exact value
+        assert estimate <= min(b for b in SEND_MS_BUCKETS if b >= percentile(exact, pct))
+
+
+def test_saved_traces_are_read_incrementally(traces_file):
+    assert trace('1').save()
+    assert [t['alert_id'] for t in load_traces()] == ['1']
+    trace('2').save()
+    with open(traces_file, 'a') as f:
+        f.write('{"alert_id": "partial"')
+    assert [t['alert_id'] for t in load_traces()] == ['1', '2']
+    # The line is finished later
+    with open(traces_file, 'a') as f:
+        f.write(', "queued_at": "2026-05-02T00:00:00"}\n')
+    assert [t['alert_id'] for t in load_traces()] == ['1', '2', 'partial']
+    assert [t['alert_id'] for t in load_traces(since=datetime(2026, 5, 1, 12))] == ['partial']
+
+
+def test_full_file_is_rotated(traces_file, monkeypatch):
+    line_bytes = len(json.dumps(trace('1').to_dict())) + 1
+    monkeypatch.setattr(alert_tracing, 'ALERT_TRACES_MAX_BYTES', 3 * line_bytes)
+    for i in range(1, 5):
+        trace(str(i)).save()
+    assert [t['alert_id'] for t in load_traces()] == ['1', '2', '3', '4']
+    with open(traces_file + '.1') as f:
+        assert len(f.readlines()) == 3
+
+    # The next rotation replaces the previous one
+    for i in range(5, 8):
+        trace(str(i)).save()
+    assert [t['alert_id'] for t in load_traces()] == ['4', '5', '6', '7']
+    # A new reader parses both files from scratch
+    monkeypatch.setattr(alert_tracing, '_parsed', {})
+    assert [t['alert_id'] for t in load_traces()] == ['4', '5', '6', '7']
+
+
+def test_latency_report(traces_file):
+    for i in range(100):
+        trace(str(i), recipients=50, durations=[0.004] * 9 + [0.2], pickup=1.0, deliver=1.0 + i).save()
+    trace('big', recipients=5000, durations=[0.03], deliver=600.0).save()
+    trace('cold', alert_type='cold', recipients=0, durations=()).save()
+
+    rows = build_latency_report(load_traces())
+    assert [(row['type'], row['area_size'], row['alerts']) for row in rows] == [
+        ('cold', '0', 1), ('heat', '11-100', 100), ('heat', '1k-10k', 1)]
+    small = rows[1]
+    assert small['recipients'] == 5000
+    assert small['time_to_pickup'] == {'p50': 1.0, 'p95': 1.0, 'p99': 1.0}
+    assert small['time_to_first_send']['p50'] == 1.5
+    assert small['time_to_deliver'] == {'p50': 50.0, 'p95': 95.0, 'p99': 99.0}
+    assert small['send_ms'] == {'p50': 5, 'p95': 200.0, 'p99': 200.0}
+    assert rows[2]['time_to_deliver']['p99'] == 600.0
+    assert rows[0]['send_ms'] == {'p50': None, 'p95': None, 'p99': None}
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Tests for the storage backends: the Redis protocol client and RedisBackend
+(against loadtest/fake_redis.py), FileBackend and the subscriber indexes
+"""
+
+import os
+import random
+import threading
+import time
+
+import pytest
+
+from backends import FileBackend, RankedCounter, RespClient, RespError, SubscriberIndex, compute_subscriber_stats
+from loadtest.fake_redis import FakeRedisServer
+
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedisServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def file_backend(tmp_path):
+    return FileBackend(subscribers_file=str(tmp_path / 'subscribers.json'),
+                       alerts_file=str(tmp_path / 'pending_alerts.json'),
+                       alert_state_file=str(tmp_path / 'alert_state.json'),
+                       scheduled_alerts_file=str(tmp_path / 'scheduled_alerts.json'),
+                       shard_progress_file=str(tmp_path / 'shard_progress.json'))
+
+
+@pytest.fixture
+def client(redis_server):
+    client = RespClient(redis_server.url)
+    yield client
+    client.close()
+
+
+def test_reply_types(client):
+    assert client.execute('PING') == 'PONG'
+    assert client.execute('SET', 'name', 'ગુજરાત') == 'OK'
+    assert client.execute('GET', 'name') == 'ગુજરાત'
+    assert client.execute('GET', 'missing') is None
+    assert client.execute('INCRBY', 'count', 5) == 5
+    assert client.execute('SADD', 'users', 1, 2, 2) == 2
+    assert sorted(client.execute('SMEMBERS', 'users')) == ['1', '2']
+    assert client.execute('SMEMBERS', 'nobody') == []
+
+
+def test_binary_safe_values(client):
+    value = 'line one\r\nline two $3 *1'
+    client.execute('SET', 'text', value)
+    assert client.execute('GET', 'text') == value
+
+
+def test_error_reply_raises(client):
+    client.execute('SET', 'name', 'x')
+    with pytest.raises(RespError):
+        client.execute('SADD', 'name', 1)
+    # The connection is still usable after an error reply
+    assert client.execute('GET', 'name') == 'x'
+
+
+def test_pipeline_replies_in_order(client):
+    replies = client.pipeline([('SET', 'a', 1), ('INCR', 'a'), ('GET', 'a'), ('ZADD', 'z', 2, 'b', 1, 'a'),
+                               ('ZRANGE', 'z', 0, -1, 'WITHSCORES')])
+    assert replies == ['OK', 2, '2', 2, ['a', '1', 'b', '2']]
+
+
+def test_transaction_runs_commands_atomically(client):
+    client.execute('SET', 'balance', 10)
+    replies = client.transaction(['balance'], [('GET', 'balance')],
+                                 lambda replies: [('INCRBY', 'balance', -int(replies[0]))])
+    assert replies == [0]
+    assert client.transaction(['balance'], [('GET', 'balance')], lambda replies: None) is None
+
+
+def test_transaction_retries_after_conflict(redis_server, client):
+    other = RespClient(redis_server.url)
+    client.execute('SET', 'counter', 0)
+    attempts = []
+
+    def build(replies):
+        attempts.append(replies[0])
+        if len(attempts) == 1:
+            # Someone else writes the watched key before EXEC
+            other.execute('INCR', 'counter')
+        return [('SET', 'counter', int(replies[0]) + 10)]
+
+    assert client.transaction(['counter'], [('GET', 'counter')], build) == ['OK']
+    assert attempts == ['0', '1']
+    assert client.execute('GET', 'counter') == '11'
+    other.close()
+
+
+def test_concurrent_clients(redis_server):
+    def work():
+        client = RespClient(redis_server.url)
+        for _ in range(100):
+            client.execute('INCR', 'hits')
+        client.close()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert RespClient(redis_server.url).execute('GET', 'hits') == '400'
+
+
+def test_subscriber_index_matches_its_subscriptions():
+    rng = random.Random(3)
+    index = SubscriberIndex()
+    subscribers = {}
+    for _ in range(1000):
+        user_id = rng.randrange(50)
+        key = f"D{rng.randrange(4)}_T{rng.randrange(6)}"
+        roll = rng.random()
+        if roll < 0.6:
+            assert index.add(user_id, key) == (user_id not in subscribers.get(key, set()))
+            subscribers.setdefault(key, set()).add(user_id)
+        elif roll < 0.95:
+            assert index.remove(user_id, key) == (user_id in subscribers.get(key, set()))
+            subscribers.get(key, set()).discard(user_id)
+        else:
+            removed = index.remove_user(user_id)
+            assert removed == {k for k, users in subscribers.items() if user_id in users}
+            for users in subscribers.values():
+                users.discard(user_id)
+
+    assert index.to_dict() == {key: sorted(users) for key, users in subscribers.items() if users}
+    assert SubscriberIndex(index.to_dict()).to_dict() == index.to_dict()
+    for user_id in range(50):
+        assert index.users.get(user_id, set()) == {k for k, users in subscribers.items() if user_id in users}
+    for district in {key.split('_')[0] for key, users in subscribers.items() if users}:
+        assert {key for key, users in subscribers.items() if users and key.startswith(district + '_')} \
+            <= index.districts[district]
+
+
+def test_subscriber_index_changes_leave_readers_sets_alone():
+    index = SubscriberIndex({'KUTCH_Bhuj': [1, 2]})
+    members, areas = index.areas['KUTCH_Bhuj'], index.users[1]
+    index.add(3, 'KUTCH_Bhuj')
+    index.remove(1, 'KUTCH_Bhuj')
+    index.remove_user(2)
+    assert members == {1, 2}
+    assert areas == {'KUTCH_Bhuj'}
+    assert index.areas['KUTCH_Bhuj'] == {3}
+
+
+def test_file_backend_subscriptions(file_backend):
+    assert file_backend.add_subscriber(1, 'KUTCH', 'Bhuj')
+    assert not file_backend.add_subscriber(1, 'KUTCH', 'Bhuj')
+    assert file_backend.add_subscriber(1, 'KUTCH', 'Anjar')
+    assert file_backend.add_subscriber(2, 'KUTCH', 'Bhuj')
+    assert file_backend.get_user_areas(1) == ['KUTCH_Anjar', 'KUTCH_Bhuj']
+    assert file_backend.get_subscribers_for_areas(['KUTCH_Bhuj', 'KUTCH_Anjar']) == {1, 2}
+    assert file_backend.remove_subscriber(1, 'KUTCH', 'Bhuj')
+    assert file_backend.remove_subscriber(1)
+    assert not file_backend.remove_subscriber(1)
+    assert file_backend.load_subscribers() == {'KUTCH_Bhuj': [2]}
+
+
+def test_failed_write_leaves_the_index_as_the_file(file_backend, monkeypatch):
+    file_backend.add_subscriber(1, 'KUTCH', 'Bhuj')
+
+    def fail(path, data):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(file_backend, '_write_json', fail)
+    with pytest.raises(OSError):
+        file_backend.add_subscriber(2, 'KUTCH', 'Bhuj')
+    with pytest.raises(OSError):
+        file_backend.remove_subscriber(1)
+    assert file_backend.get_subscribers_for_area('KUTCH', 'Bhuj') == [1]
+    assert file_backend.get_user_areas(1) == ['KUTCH_Bhuj']
+    assert file_backend.get_subscriber_stats()['total_subscriptions'] == 1
+
+
+def test_replaced_file_is_seen_at_the_same_size_and_mtime(file_backend):
+    file_backend.add_subscriber(1, 'KUTCH', 'Bhuj')
+    path = file_backend.subscribers_file
+    stat = os.stat(path)
+    with open(path + '.new', 'w') as f:
+        f.write(open(path).read().replace('1', '7'))
+    os.utime(path + '.new', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(path + '.new', path)
+    assert file_backend.get_subscribers_for_area('KUTCH', 'Bhuj') == [7]
+
+
+def test_file_backend_claims(file_backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    assert file_backend.claim_alert('a', 'bot-1', ttl=60)
+    assert not file_backend.claim_alert('a', 'bot-2', ttl=60)
+    assert not file_backend.renew_claim('a', 'bot-2', ttl=60)
+    file_backend.release_claim('a', 'bot-2')
+    # Another process sees the claim
+    other = FileBackend(alerts_file=file_backend.alerts_file)
+    assert not other.claim_alert('a', 'bot-2', ttl=60)
+
+    now[0] += 50
+    assert file_backend.renew_claim('a', 'bot-1', ttl=60)
+    now[0] += 50
+    assert not other.claim_alert('a', 'bot-2', ttl=60)
+    now[0] += 11
+    assert other.claim_alert('a', 'bot-2', ttl=60)
+    assert not file_backend.renew_claim('a', 'bot-1', ttl=60)
+    other.release_claim('a', 'bot-2')
+    assert file_backend.claim_alert('a', 'bot-1', ttl=60)
+
+
+def test_ranked_counter_top_k():
+    rng = random.Random(7)
+    counter = RankedCounter()
+    counts = {}
+    for _ in range(2000):
+        key = f"area{rng.randrange(30)}"
+        if counts.get(key) and rng.random() < 0.4:
+            counter.decrement(key)
+            counts[key] -= 1
+        else:
+            counter.increment(key)
+            counts[key] = counts.get(key, 0) + 1
+
+        top = counter.top(5)
+        expected = sorted((c for c in counts.values() if c), reverse=True)[:5]
+        assert [count for _, count in top] == expected
+        assert all(counts[key] == count for key, count in top)
+
+
+def test_ranked_counter_skips_zero_counts():
+    counter = RankedCounter()
+    counter.increment('a')
+    counter.increment('b')
+    counter.decrement('a')
+    assert counter.top(5) == [('b', 1)]
+    assert counter.get('a') == 0
+    assert counter.get('unknown') == 0
+
+
+def test_maintained_stats_match_a_full_scan():
+    rng = random.Random(11)
+    index = SubscriberIndex()
+    subscribers = {}
+    for _ in range(1000):
+        user_id, key = rng.randrange(50), f"D{rng.randrange(4)}_T{rng.randrange(6)}"
+        if rng.random() < 0.6:
+            index.add(user_id, key)
+            subscribers.setdefault(key, set()).add(user_id)
+        elif rng.random() < 0.9:
+            index.remove(user_id, key)
+            subscribers.get(key, set()).discard(user_id)
+        else:
+            index.remove_user(user_id)
+            for users in subscribers.values():
+                users.discard(user_id)
+
+    stats, expected = index.stats(top_k=5), compute_subscriber_stats(subscribers, top_k=5)
+    for name in ('total_subscribers', 'total_subscriptions', 'areas_with_subscribers', 'districts'):
+        assert stats[name] == expected[name]
+    # Areas with equal counts may be listed in either order
+    assert [area['count'] for area in stats['top_areas']] == [area['count'] for area in expected['top_areas']]
+
+
+def test_file_backend_rebuilds_stats(file_backend):
+    file_backend.add_subscriber(1, 'KUTCH', 'Bhuj')
+    file_backend.add_subscriber(2, 'KUTCH', 'Bhuj')
+    file_backend.add_subscriber(2, 'SURAT', 'Olpad')
+    before, after = file_backend.rebuild_subscriber_stats()
+    assert before == after
+    assert after['top_areas'][0] == {'district': 'KUTCH', 'taluka': 'Bhuj', 'count': 2}
+    assert after['districts'] == {'KUTCH': 2, 'SURAT': 1}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for the /subscribe inline keyboards and their callback data
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import bot_host
+from conversation_store import ConversationStore
+
+AREAS = {
+    'AHMEDABAD': ['Bavla', 'Daskroi', 'Dholka', 'Sanand'],
+    'KUTCH': [f"Taluka {i:02d}" for i in range(30)],
+}
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    """bot_host with its data loaded from AREAS and subscriptions kept in a dict"""
+    for name, value in (('districts', []), ('talukas_data', {}), ('district_ids', {}), ('taluka_ids', {}),
+                        ('district_pages', []), ('taluka_pages', {}), ('location_index', None),
+                        ('conversations', ConversationStore(path=None))):
+        monkeypatch.setattr(bot_host, name, value)
+    rows = [(d, t) for d, talukas in AREAS.items() for t in talukas]
+    monkeypatch.setattr(bot_host, 'load_location_data',
+                        lambda: pd.DataFrame(rows, columns=['District Name', 'Taluka Name']))
+    subscriptions = {}
+    monkeypatch.setattr(bot_host, 'add_subscriber',
+                        lambda user_id, d, t: subscriptions.setdefault(user_id, []).append((d, t)))
+    monkeypatch.setattr(bot_host, 'get_user_subscriptions', lambda user_id: [
+        {'district': d, 'taluka': t} for d, t in subscriptions.get(user_id, [])])
+    bot_host.load_data()
+    monkeypatch.setattr(bot_host, 'subscriptions', subscriptions, raising=False)
+    return bot_host
+
+
+def buttons(markup):
+    return [button for row in markup.inline_keyboard for button in row]
+
+
+def press(bot, data, user_id=7):
+    """Run subscribe_button for a press; returns (text, reply_markup) of the edited message"""
+    edits = []
+
+    async def answer():
+        pass
+
+    async def edit_message_text(text, reply_markup=None):
+        edits.append((text, reply_markup))
+
+    query = SimpleNamespace(data=data, answer=answer, edit_message_text=edit_message_text)
+    update = SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=user_id))
+    asyncio.run(bot.subscribe_button(update, None))
+    return edits[0]
+
+
+def test_every_button_parses(bot):
+    pages = bot.district_pages + [page for pages in bot.taluka_pages.values() for page in pages]
+    for page in pages:
+        for button in buttons(page):
+            assert len(button.callback_data.encode()) <= 64
+            assert bot.parse_callback_data(button.callback_data) is not None
+
+
+def test_taluka_pages(bot):
+    kutch = bot.districts.index('KUTCH')
+    assert len(bot.taluka_pages[kutch]) == 3
+    labels = [b.text for page in bot.taluka_pages[kutch] for b in buttons(page) if b.callback_data.startswith('t:')]
+    assert labels == AREAS['KUTCH']
+
+
+@pytest.mark.parametrize('data', [
+    None, '', 'x:1', 'dp', 'dp:5', 'd:-1', 'd:2', 'd:a', 'tp:0:1', 't:0:4', 't:1:30', 't:0', 'zz:0',
+])
+def test_stale_or_malformed_data_is_rejected(bot, data):
+    assert bot.parse_callback_data(data) is None
+
+
+def test_parsed_ids(bot):
+    assert bot.parse_callback_data('x') == ('x', [])
+    assert bot.parse_callback_data('d:1') == ('d', [1])
+    assert bot.parse_callback_data('tp:1:2') == ('tp', [1, 2])
+    assert bot.parse_callback_data('t:1:29') == ('t', [1, 29])
+
+
+def test_keyboard_round_trip_subscribes(bot):
+    district = next(b for b in buttons(bot.district_pages[0]) if b.text == 'KUTCH')
+    text, markup = press(bot, district.callback_data)
+    assert text.startswith('✅ Selected: KUTCH')
+
+    more = next(b for b in buttons(markup) if b.text.startswith('More'))
+    _, markup = press(bot, more.callback_data)
+    taluka = next(b for b in buttons(markup) if b.text == 'Taluka 12')
+    text, markup = press(bot, taluka.callback_data)
+
+    assert markup is None
+    assert '🎉 Successfully subscribed!' in text and 'Taluka 12, KUTCH' in text
+    assert bot.subscriptions == {7: [('KUTCH', 'Taluka 12')]}
+    assert bot.conversations.get(7) is None
+
+
+def test_expired_menu(bot):
+    text, _ = press(bot, 't:9:9')
+    assert text.startswith('⌛')
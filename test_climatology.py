@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-taluka threshold tables and the recorded weather history
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import climatology
+from climatology import Climatology, build_climatology, day_index, record_observations
+
+LOCATIONS = pd.DataFrame({
+    'District Name': ['KUTCH', 'KUTCH', 'KUTCH', 'DANG'],
+    'Taluka Name': ['Bhuj', 'Bhuj', 'Anjar', 'Ahwa'],
+    'temperature': [36.0, 38.0, 35.0, 31.0],
+})
+
+
+def history_for(district, taluka, first, highs, lows):
+    days = [first + timedelta(days=i) for i in range(len(highs))]
+    return pd.DataFrame({'date': [d.isoformat() for d in days], 'district': district, 'taluka': taluka,
+                         'max_temp': highs, 'min_temp': lows})
+
+
+def test_day_index():
+    assert day_index(date(2025, 1, 1)) == 0
+    assert day_index(date(2024, 2, 29)) == 59
+    assert day_index(date(2025, 3, 1)) == 60
+    assert day_index(date(2025, 12, 31)) == 365
+
+
+def test_history_percentiles_within_the_window():
+    # 21 days of maxima 30..50 centred on 10 May
+    history = history_for('KUTCH', 'Bhuj', date(2025, 4, 30), np.arange(30.0, 51.0), np.arange(0.0, 21.0))
+    table = build_climatology(LOCATIONS, history, window=10, min_samples=21)
+    hot, cold = table.thresholds('KUTCH', 'Bhuj', date(2026, 5, 10))
+    assert hot == pytest.approx(np.percentile(np.arange(30.0, 51.0), 95), abs=0.05)
+    assert cold == pytest.approx(np.percentile(np.arange(0.0, 21.0), 5), abs=0.05)
+
+
+def test_too_few_samples_fall_back_to_the_dataset_offset():
+    history = history_for('KUTCH', 'Bhuj', date(2025, 4, 30), np.arange(30.0, 51.0), np.arange(0.0, 21.0))
+    table = build_climatology(LOCATIONS, history, window=10, min_samples=21)
+    # One day further out the window holds only 20 of the days
+    state = LOCATIONS['temperature'].mean()
+    assert table.thresholds('KUTCH', 'Bhuj', date(2026, 5, 11)) == (round(40 + 37 - state, 1),
+                                                                    round(5 + 37 - state, 1))
+    # Talukas with no history at all are shifted by how warm they run
+    assert table.thresholds('DANG', 'Ahwa', date(2026, 5, 10)) == (round(40 + 31 - state, 1),
+                                                                   round(5 + 31 - state, 1))
+
+
+def test_without_temperatures_the_global_thresholds_apply():
+    table = build_climatology(LOCATIONS.drop(columns='temperature'), None, hot_base=42, cold_base=4)
+    assert table.thresholds('DANG', 'Ahwa', date(2026, 1, 1)) == (42.0, 4.0)
+    assert table.thresholds('SURAT', 'Olpad', date(2026, 1, 1)) == (None, None)
+
+
+def test_lookup_matches_thresholds_and_survives_save(tmp_path):
+    history = history_for('KUTCH', 'Anjar', date(2025, 12, 25), [45.0] * 14, [8.0] * 14)
+    table = build_climatology(LOCATIONS, history, window=3, min_samples=5)
+    path = str(tmp_path / 'climatology.npz')
+    table.save(path)
+    loaded = Climatology.load(path)
+    assert loaded.areas == table.areas
+
+    # The window wraps round the turn of the year
+    day = date(2026, 1, 2)
+    hot, cold = loaded.lookup(['KUTCH', 'DANG', 'SURAT'], ['Anjar', 'Ahwa', 'Olpad'], day)
+    assert hot[0] == pytest.approx(45.0) and cold[0] == pytest.approx(8.0)
+    assert (hot[1], cold[1]) == pytest.approx(loaded.thresholds('DANG', 'Ahwa', day))
+    assert np.isnan(hot[2]) and np.isnan(cold[2])
+    assert Climatology.load(str(tmp_path / 'missing.npz')) is None
+
+
+@pytest.fixture
+def history_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'weather_history.csv')
+    monkeypatch.setattr(climatology, 'WEATHER_HISTORY_FILE', path)
+    return path
+
+
+def observations(high, low):
+    return pd.DataFrame({'District Name': ['KUTCH', 'KUTCH'], 'Taluka Name': ['Bhuj', 'Anjar'],
+                         'max_temp': [high, np.nan], 'min_temp': [low, 20.0]})
+
+
+def test_daily_extremes_are_appended_when_the_day_changes(history_file):
+    record_observations(observations(38.0, 24.0), day=date(2026, 5, 1))
+    record_observations(observations(41.0, 26.0), day=date(2026, 5, 1))
+    record_observations(observations(36.0, 22.0), day=date(2026, 5, 1))
+    history = climatology.load_history(history_file)
+    assert history is None
+
+    record_observations(observations(35.0, 25.0), day=date(2026, 5, 2))
+    history = climatology.load_history(history_file)
+    assert history.to_dict('records') == [
+        {'date': '2026-05-01', 'district': 'KUTCH', 'taluka': 'Bhuj', 'max_temp': 41.0, 'min_temp': 22.0}]
+
+
+def test_every_process_appends_a_day_once(history_file):
+    record_observations(observations(38.0, 24.0), day=date(2026, 5, 1))
+    with open(f"{history_file}.today.json") as f:
+        yesterday = f.read()
+    record_observations(observations(35.0, 25.0), day=date(2026, 5, 2))
+    # A second worker still holding yesterday's running extremes
+    with open(f"{history_file}.today.json", 'w') as f:
+        f.write(yesterday)
+    record_observations(observations(36.0, 25.0), day=date(2026, 5, 2))
+    # A worker whose clock hasn't reached the new day yet
+    record_observations(observations(50.0, 10.0), day=date(2026, 5, 1))
+    record_observations(observations(35.0, 25.0), day=date(2026, 5, 3))
+
+    history = climatology.load_history(history_file)
+    assert history[['date', 'taluka', 'max_temp']].values.tolist() == [
+        ['2026-05-01', 'Bhuj', 38.0], ['2026-05-02', 'Bhuj', 36.0]]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact village dataset: same values, smaller dtypes
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from compact_locations import compact_frame, memory_usage, read_location_csv
+
+
+@pytest.fixture
+def villages():
+    rng = np.random.default_rng(2)
+    n = 600
+    talukas = [f"Taluka {i}" for i in range(40)]
+    taluka = rng.integers(0, len(talukas), n)
+    return pd.DataFrame({
+        'District Name': [f"DISTRICT {t % 8}" for t in taluka],
+        'Taluka Name': [talukas[t] for t in taluka],
+        # Built at runtime so equal names are different objects, as read_csv makes them
+        'Village Name': [''.join(['Village ', str(i % 450)]) for i in range(n)],
+        'Taluka Latitude': 20 + taluka / 10,
+        'Taluka Longitude': 68 + taluka / 7,
+        'Village Latitude': rng.uniform(20.1, 24.7, n),
+        'Village Longitude': rng.uniform(68.2, 74.4, n),
+        'Soil': rng.choice(['black', 'red', 'sandy', None], n),
+        'Temperature': rng.normal(38, 3, n),
+    })
+
+
+def test_values_are_kept(villages):
+    compact = compact_frame(villages)
+    assert compact.columns.tolist() == villages.columns.tolist()
+    for column in ['District Name', 'Taluka Name', 'Village Name', 'Soil']:
+        assert compact[column].astype(object).where(compact[column].notna(), None).tolist() == \
+            villages[column].tolist()
+    for column in ['Taluka Latitude', 'Taluka Longitude', 'Village Latitude', 'Village Longitude']:
+        # float32 keeps coordinates to well under a metre (1e-5 degrees)
+        np.testing.assert_allclose(compact[column], villages[column], rtol=0, atol=1e-5)
+    pd.testing.assert_series_equal(compact['Temperature'], villages['Temperature'])
+
+
+def test_dtypes(villages):
+    compact = compact_frame(villages)
+    assert isinstance(compact['District Name'].dtype, pd.CategoricalDtype)
+    assert compact['District Name'].cat.codes.dtype == np.int8
+    assert compact['Taluka Name'].cat.categories.tolist() == sorted(villages['Taluka Name'].unique())
+    # Few distinct values: categorical; mostly distinct: interned strings
+    assert isinstance(compact['Soil'].dtype, pd.CategoricalDtype)
+    assert compact['Village Name'].dtype == object
+    assert compact['Village Name'][0] is compact['Village Name'][450]
+    assert (compact.dtypes[['Taluka Latitude', 'Village Longitude']] == np.float32).all()
+    assert compact['Temperature'].dtype == np.float64
+    assert memory_usage(compact) < memory_usage(villages)
+    # The input frame is left alone
+    assert villages['District Name'].dtype == object
+
+
+def test_groupby_areas(villages):
+    compact = compact_frame(villages)
+    expected = villages.groupby(['District Name', 'Taluka Name'])['Temperature'].mean()
+    grouped = compact.groupby(['District Name', 'Taluka Name'], observed=True)['Temperature'].mean()
+    assert grouped.to_dict() == expected.to_dict()
+
+
+def test_read_location_csv(villages, tmp_path):
+    path = tmp_path / 'villages.csv'
+    villages.to_csv(path, index=False)
+    loaded = read_location_csv(path)
+    default = pd.read_csv(path)
+    assert loaded.dtypes.to_dict() == compact_frame(default).dtypes.to_dict()
+    assert loaded['Village Name'].tolist() == default['Village Name'].tolist()
+    assert loaded['Soil'].astype(object).where(loaded['Soil'].notna(), None).tolist() == \
+        default['Soil'].where(default['Soil'].notna(), None).tolist()
+    np.testing.assert_allclose(loaded['Village Latitude'], default['Village Latitude'], rtol=0, atol=1e-5)
+    assert loaded['Taluka Name'][loaded['Taluka Name'] == 'Taluka 3'].index.tolist() == \
+        default.index[default['Taluka Name'] == 'Taluka 3'].tolist()
+
+
+def test_unparseable_coordinates_become_nan():
+    compact = compact_frame(pd.DataFrame({'District Name': ['KUTCH', 'KUTCH'], 'Taluka Latitude': ['23.2', 'n/a']}))
+    assert compact['Taluka Latitude'].dtype == np.float32
+    assert compact['Taluka Latitude'][0] == pytest.approx(23.2)
+    assert np.isnan(compact['Taluka Latitude'][1])
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for ConversationStore expiry, size cap and persistence
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import conversation_store
+from conversation_store import STEP_DISTRICT, STEP_TALUKA, ConversationStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(conversation_store, 'time', SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_entries_expire_after_inactivity(clock):
+    store = ConversationStore(ttl=60, max_entries=10, path=None)
+    store.set(1, STEP_DISTRICT)
+    clock[0] += 59
+    assert store.get(1).step == STEP_DISTRICT
+    # Activity refreshes the TTL
+    store.set(1, STEP_TALUKA, district_id=4)
+    clock[0] += 59
+    state = store.get(1)
+    assert (state.step, state.district_id) == (STEP_TALUKA, 4)
+    clock[0] += 1
+    assert store.get(1) is None
+    assert len(store) == 0
+
+
+def test_expired_entries_are_dropped_on_the_next_change(clock):
+    store = ConversationStore(ttl=60, max_entries=10, path=None)
+    store.set(1, STEP_DISTRICT)
+    store.set(2, STEP_DISTRICT)
+    clock[0] += 61
+    store.set(3, STEP_DISTRICT)
+    assert len(store) == 1
+
+
+def test_least_recently_active_are_dropped_over_capacity(clock):
+    store = ConversationStore(ttl=60, max_entries=3, path=None)
+    for user_id in (1, 2, 3):
+        store.set(user_id, STEP_DISTRICT)
+        clock[0] += 1
+    store.set(1, STEP_TALUKA, district_id=0)
+    store.set(4, STEP_DISTRICT)
+    assert len(store) == 3
+    assert store.get(2) is None
+    assert all(store.get(user_id) is not None for user_id in (1, 3, 4))
+
+
+def test_pop_ends_the_conversation(clock):
+    store = ConversationStore(ttl=60, max_entries=10, path=None)
+    store.set(1, STEP_TALUKA, district_id=2)
+    assert store.pop(1).district_id == 2
+    assert store.pop(1) is None
+    assert store.get(1) is None
+
+
+def test_save_and_load_keep_unexpired_entries(clock, tmp_path):
+    path = str(tmp_path / 'conversations.json')
+    store = ConversationStore(ttl=60, max_entries=10, path=path)
+    store.set(1, STEP_DISTRICT)
+    clock[0] += 30
+    store.set(2, STEP_TALUKA, district_id=7)
+    store.save()
+
+    clock[0] += 40
+    restored = ConversationStore(ttl=60, max_entries=10, path=path)
+    restored.load()
+    # User 1 expired while the bot was down
+    assert restored.get(1) is None
+    state = restored.get(2)
+    assert (state.step, state.district_id) == (STEP_TALUKA, 7)
+    assert state.expires_at == pytest.approx(1090)
+
+
+def test_load_respects_the_size_cap(clock, tmp_path):
+    path = str(tmp_path / 'conversations.json')
+    store = ConversationStore(ttl=60, max_entries=10, path=path)
+    for user_id in range(5):
+        store.set(user_id, STEP_DISTRICT)
+        clock[0] += 1
+    store.save()
+    restored = ConversationStore(ttl=60, max_entries=2, path=path)
+    restored.load()
+    assert len(restored) == 2
+    assert restored.get(4) is not None
+
+
+def test_missing_or_bad_file_loads_nothing(tmp_path):
+    path = tmp_path / 'conversations.json'
+    ConversationStore(path=str(path)).load()
+    path.write_text('not json')
+    store = ConversationStore(path=str(path))
+    store.load()
+    assert len(store) == 0
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for export row filters, the weather join and the streamed CSV/Parquet
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_export import export_rows, parquet_available, select_rows
+
+VILLAGES = pd.DataFrame({
+    'District Name': ['KUTCH', 'KUTCH', 'KUTCH', 'DANG', 'DANG'],
+    'Taluka Name': ['Bhuj', 'Bhuj', 'Anjar', 'Ahwa', 'Ahwa'],
+    'Village Name': ['Madhapar', 'Kukma', 'Ratnal', 'Pipri', 'Waghai'],
+    'Village Latitude': [23.22, 23.28, np.nan, 20.75, 20.77],
+    'Village Longitude': [69.68, 69.78, 70.10, 73.69, 73.49],
+    'Temperature': [41.5, 40.9, 42.0, 35.2, 34.8],
+})
+
+
+def village_weather():
+    """Weather as weather_field.get_village_weather returns it: one row per village with coordinates"""
+    points = VILLAGES.dropna(subset=['Village Latitude', 'Village Longitude'])
+    return points[['District Name', 'Taluka Name', 'Village Name']].reset_index(drop=True).assign(
+        current_temp=[38.0, 39.0, 30.0, 31.0], max_temp=[42.0, 43.0, 33.0, 34.0], timestamp='2026-05-01T12:00')
+
+
+def read_csv(parts):
+    return pd.read_csv(io.StringIO(''.join(parts)))
+
+
+@pytest.mark.parametrize('filters, expected', [
+    ({}, [0, 1, 2, 3, 4]),
+    ({'district': 'KUTCH'}, [0, 1, 2]),
+    ({'district': 'KUTCH', 'taluka': 'Bhuj'}, [0, 1]),
+    ({'taluka': 'Ahwa'}, [3, 4]),
+    ({'district': 'DANG', 'taluka': 'Bhuj'}, []),
+    # Villages without coordinates fall outside every box
+    ({'bbox': (23.0, 69.0, 24.0, 71.0)}, [0, 1]),
+    ({'bbox': (20.7, 73.6, 20.8, 73.7)}, [3]),
+    ({'district': 'KUTCH', 'bbox': (20.0, 68.0, 24.0, 75.0)}, [0, 1]),
+])
+def test_select_rows(filters, expected):
+    assert select_rows(VILLAGES, **filters).tolist() == expected
+
+
+def test_bbox_uses_taluka_centres_without_village_coordinates():
+    talukas = pd.DataFrame({'District Name': ['KUTCH', 'DANG'], 'Taluka Name': ['Bhuj', 'Ahwa'],
+                            'Taluka Latitude': [23.25, 20.76], 'Taluka Longitude': [69.67, 73.69]})
+    assert select_rows(talukas, bbox=(20.0, 73.0, 21.0, 74.0)).tolist() == [1]
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 100])
+def test_csv_is_the_selected_rows(chunk_rows):
+    rows = select_rows(VILLAGES, district='KUTCH')
+    parts = list(export_rows(VILLAGES, rows, chunk_rows=chunk_rows))
+    assert len(parts) == 1 + -(-len(rows) // chunk_rows)
+    assert ''.join(parts) == VILLAGES.iloc[rows].to_csv(index=False)
+
+
+def test_no_matching_rows_is_just_the_header():
+    assert list(export_rows(VILLAGES, np.array([], dtype=np.int64))) == [VILLAGES.iloc[:0].to_csv(index=False)]
+
+
+def test_weather_joins_each_village_by_position():
+    rows = np.array([4, 2, 0, 1])
+    exported = read_csv(export_rows(VILLAGES, rows, weather=village_weather(), chunk_rows=3))
+    assert exported['Village Name'].tolist() == ['Waghai', 'Ratnal', 'Madhapar', 'Kukma']
+    assert exported['Temperature'].tolist() == [34.8, 42.0, 41.5, 40.9]
+    # Ratnal has no coordinates, so no weather
+    assert exported['current_temp'].fillna(0).tolist() == [31.0, 0, 38.0, 39.0]
+    assert exported.columns.tolist() == VILLAGES.columns.tolist() + ['current_temp', 'max_temp', 'timestamp']
+
+
+def test_weather_joins_by_taluka_without_villages():
+    talukas = VILLAGES.drop(columns=['Village Name', 'Village Latitude', 'Village Longitude'])
+    weather = pd.DataFrame({'District Name': ['DANG', 'KUTCH'], 'Taluka Name': ['Ahwa', 'Bhuj'],
+                            'current_temp': [30.5, 38.5], 'humidity': [70.0, 20.0]})
+    exported = read_csv(export_rows(talukas, np.arange(5), weather=weather, chunk_rows=2))
+    assert exported['current_temp'].fillna(0).tolist() == [38.5, 38.5, 0, 30.5, 30.5]
+    assert exported['humidity'].fillna(0).tolist() == [20.0, 20.0, 0, 70.0, 70.0]
+    assert len(exported) == 5
+
+
+@pytest.mark.skipif(not parquet_available(), reason='pyarrow is not installed')
+def test_parquet_has_a_row_group_per_chunk():
+    import pyarrow.parquet as pq
+
+    rows = np.array([0, 1, 2, 3, 4])
+    data = b''.join(export_rows(VILLAGES, rows, fmt='parquet', weather=village_weather(), chunk_rows=2))
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.num_row_groups == 3
+    table = parquet.read().to_pandas()
+    assert table['Village Name'].tolist() == VILLAGES['Village Name'].tolist()
+    assert table['max_temp'].fillna(0).tolist() == [42.0, 43.0, 0, 33.0, 34.0]
+
+    empty = b''.join(export_rows(VILLAGES, np.array([], dtype=np.int64), fmt='parquet'))
+    assert pq.ParquetFile(io.BytesIO(empty)).schema_arrow.names == VILLAGES.columns.tolist()
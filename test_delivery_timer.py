@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for scheduled alerts: the delivery heap, Gujarat-time deliver_at and
+moving due alerts into the queue
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from backends import FileBackend, RedisBackend, deliver_at_seconds, delivery_time, released_alert
+from delivery_timer import DeliveryTimer
+from loadtest.fake_redis import FakeRedisServer
+
+# 09:00 in Gujarat (UTC+05:30)
+NINE_IST = datetime(2026, 5, 1, 3, 30, tzinfo=timezone.utc).timestamp()
+
+
+def scheduled(alert_id, deliver_at):
+    return {'id': alert_id, 'district': 'KUTCH', 'taluka': 'Bhuj', 'message': alert_id, 'type': 'custom',
+            'timestamp': '2026-04-30T18:00:00', 'sent': False, 'deliver_at': deliver_at}
+
+
+def test_timer_pops_due_alerts_earliest_first():
+    timer = DeliveryTimer([(30.0, 'c'), (10.0, 'a')])
+    timer.add(20.0, 'b')
+    timer.add(40.0, 'd')
+    assert timer.next_due() == 10.0
+    assert timer.pop_due(5.0) == []
+    assert timer.pop_due(30.0) == ['a', 'b', 'c']
+    assert (len(timer), timer.next_due()) == (1, 40.0)
+    timer.reset([])
+    assert timer.next_due() is None
+    assert timer.pop_due(100.0) == []
+
+
+def test_naive_deliver_at_is_gujarat_time():
+    assert delivery_time('2026-05-01T09:00:00').timestamp() == NINE_IST
+    assert delivery_time(datetime(2026, 5, 1, 9, 0)).timestamp() == NINE_IST
+    # Aware times keep their own zone
+    assert delivery_time('2026-05-01T03:30:00+00:00').timestamp() == NINE_IST
+    assert deliver_at_seconds(scheduled('a', '2026-05-01T09:00:00')) == NINE_IST
+
+
+def test_released_alert_is_queued_at_its_delivery_time():
+    alert = released_alert(scheduled('a', '2026-05-01T09:00:00'))
+    # The queue's timestamps are naive server-local times
+    assert datetime.fromisoformat(alert['timestamp']) == datetime.fromtimestamp(NINE_IST)
+    assert alert['created_at'] == '2026-04-30T18:00:00'
+    assert alert['deliver_at'] == '2026-05-01T09:00:00'
+
+
+@pytest.fixture(params=['file', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'file':
+        yield FileBackend(subscribers_file=str(tmp_path / 'subscribers.json'),
+                          alerts_file=str(tmp_path / 'pending_alerts.json'),
+                          alert_state_file=str(tmp_path / 'alert_state.json'),
+                          scheduled_alerts_file=str(tmp_path / 'scheduled_alerts.json'),
+                          shard_progress_file=str(tmp_path / 'shard_progress.json'))
+    else:
+        server = FakeRedisServer().start()
+        yield RedisBackend(server.url, prefix='test:')
+        server.stop()
+
+
+def test_release_due_alerts_moves_each_alert_once(backend):
+    backend.schedule_alert(scheduled('later', '2026-05-01T10:00:00'))
+    backend.schedule_alert(scheduled('nine', '2026-05-01T09:00:00'))
+    backend.schedule_alert(scheduled('utc', '2026-05-01T03:00:00+00:00'))
+    assert sorted(backend.get_scheduled_times()) == [
+        (NINE_IST - 1800, 'utc'), (NINE_IST, 'nine'), (NINE_IST + 3600, 'later')]
+
+    assert backend.release_due_alerts(now=NINE_IST - 1801) == []
+    released = backend.release_due_alerts(now=NINE_IST)
+    assert sorted(alert['id'] for alert in released) == ['nine', 'utc']
+    assert backend.release_due_alerts(now=NINE_IST) == []
+    assert backend.get_scheduled_times() == [(NINE_IST + 3600, 'later')]
+
+    pending = sorted(backend.get_pending_alerts(), key=lambda alert: alert['timestamp'])
+    assert [alert['id'] for alert in pending] == ['utc', 'nine']
+    assert datetime.fromisoformat(pending[1]['timestamp']) == datetime.fromtimestamp(NINE_IST)
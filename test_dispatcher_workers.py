@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for finishing sharded alerts: each shard is counted once and the last
+one sees every shard's totals
+"""
+
+import threading
+from datetime import datetime
+
+import pytest
+
+import dispatcher_workers
+from alert_tracing import AlertTrace
+from backends import FileBackend, RedisBackend
+from loadtest.fake_redis import FakeRedisServer
+
+
+@pytest.fixture(params=['file', 'redis'])
+def backend(request, tmp_path, monkeypatch):
+    if request.param == 'file':
+        backend = FileBackend(subscribers_file=str(tmp_path / 'subscribers.json'),
+                              alerts_file=str(tmp_path / 'pending_alerts.json'),
+                              alert_state_file=str(tmp_path / 'alert_state.json'),
+                              scheduled_alerts_file=str(tmp_path / 'scheduled_alerts.json'),
+                              shard_progress_file=str(tmp_path / 'shard_progress.json'))
+        server = None
+    else:
+        server = FakeRedisServer().start()
+        backend = RedisBackend(server.url, prefix='test:')
+    monkeypatch.setattr(dispatcher_workers, 'get_backend', lambda: backend)
+    monkeypatch.setattr(dispatcher_workers, 'DISPATCHER_SHARDS', 3)
+    yield backend
+    if server:
+        server.stop()
+
+
+def shard_trace(shard, sent, failed, picked_up, first, last):
+    trace = AlertTrace({'id': 'a1', 'type': 'heat'}, picked_up_at=datetime(2026, 5, 1, 9, picked_up))
+    trace.recipients = sent + failed
+    trace.sent, trace.failed = sent, failed
+    trace.first_sent_at = first and datetime(2026, 5, 1, 9, first).isoformat()
+    trace.last_sent_at = last and datetime(2026, 5, 1, 9, last).isoformat()
+    return shard, trace
+
+
+def complete(monkeypatch, shard, trace):
+    monkeypatch.setattr(dispatcher_workers, 'DISPATCHER_SHARD', shard)
+    return dispatcher_workers.complete_shard(trace)
+
+
+def test_last_shard_gets_every_shards_totals(backend, monkeypatch):
+    shards = [shard_trace(0, 10, 1, 2, 3, 8), shard_trace(1, 0, 4, 1, None, None), shard_trace(2, 7, 0, 3, 4, 9)]
+    assert not complete(monkeypatch, *shards[0])
+    # A shard still sending doesn't count
+    backend.update_shard_progress('a1', 2, dispatcher_workers.progress(shards[2][1]))
+    assert not complete(monkeypatch, *shards[1])
+    # Finishing a shard again (e.g. after a lost lease) doesn't complete the alert
+    assert not complete(monkeypatch, *shards[0])
+    assert dispatcher_workers.finished_here(['a1', 'a2']) == {'a1'}
+    monkeypatch.setattr(dispatcher_workers, 'DISPATCHER_SHARD', 2)
+    assert dispatcher_workers.finished_here(['a1', 'a2']) == set()
+
+    last = shards[2][1]
+    assert complete(monkeypatch, 2, last)
+    assert (last.recipients, last.sent, last.failed) == (22, 17, 5)
+    assert last.picked_up_at == datetime(2026, 5, 1, 9, 1).isoformat()
+    assert last.first_sent_at == datetime(2026, 5, 1, 9, 3).isoformat()
+    assert last.last_sent_at == datetime(2026, 5, 1, 9, 9).isoformat()
+    assert dispatcher_workers.finished_here(['a1']) == {'a1'}
+    assert not complete(monkeypatch, *shards[2])
+
+
+def test_exactly_one_shard_completes_each_alert(backend):
+    alert_ids = [f"alert{i}" for i in range(20)]
+    completed = []
+
+    def worker(shard):
+        for alert_id in alert_ids:
+            if backend.complete_shard(alert_id, shard, 3, {'sent': shard}) is not None:
+                completed.append(alert_id)
+
+    threads = [threading.Thread(target=worker, args=(shard,)) for shard in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(completed) == sorted(alert_ids)
+    progress = backend.get_shard_progress(alert_ids[:1])['alert0']
+    assert sorted((shard, p['sent'], p['done']) for shard, p in progress.items()) == [
+        ('0', 0, True), ('1', 1, True), ('2', 2, True)]
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for pre-serialized sendMessage bodies and how send errors are raised
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from fanout import FanoutClient, RenderedMessage
+
+TEXTS = [
+    'plain',
+    '🔥 <b>HEAT ALERT</b>\n📍 ભુજ, કચ્છ\n🌡️ 45.2°C',
+    'quotes " and \\ backslashes, tabs\tand \r\n line ends',
+    'control \x00\x1f and separators    and % signs %d %s',
+    '',
+]
+
+
+@pytest.mark.parametrize('text', TEXTS)
+@pytest.mark.parametrize('chat_id', [7, -1001234567890, '123456789'])
+def test_payload_matches_json_dumps(text, chat_id):
+    expected = json.dumps({'chat_id': int(chat_id), 'text': text, 'parse_mode': 'HTML'},
+                          ensure_ascii=False, separators=(',', ':')).encode()
+    assert RenderedMessage(text).payload(chat_id) == expected
+    assert json.loads(expected) == {'chat_id': int(chat_id), 'text': text, 'parse_mode': 'HTML'}
+
+
+def test_parse_mode():
+    assert json.loads(RenderedMessage('x', parse_mode='MarkdownV2').payload(1))['parse_mode'] == 'MarkdownV2'
+
+
+def send(status, reply, message=RenderedMessage('hello')):
+    """Send through a FanoutClient whose server answers with (status, reply); returns (result, request)"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(status, json=reply)
+
+    async def run():
+        client = FanoutClient(SimpleNamespace(base_url='https://api.telegram.org/bot123:abc'))
+        await client._client.aclose()
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await client.send(42, message)
+        finally:
+            await client.close()
+
+    return asyncio.run(run()), requests[0]
+
+
+def test_send_posts_the_payload():
+    result, request = send(200, {'ok': True, 'result': {}})
+    assert result is True
+    assert str(request.url) == 'https://api.telegram.org/bot123:abc/sendMessage'
+    assert request.content == RenderedMessage('hello').payload(42)
+
+
+@pytest.mark.parametrize('status, reply, error', [
+    (429, {'ok': False, 'description': 'Too Many Requests', 'parameters': {'retry_after': 5}}, RetryAfter),
+    (403, {'ok': False, 'description': 'Forbidden: bot was blocked by the user'}, Forbidden),
+    (400, {'ok': False, 'description': 'Bad Request: chat not found'}, BadRequest),
+    (502, None, TelegramError),
+])
+def test_errors_map_to_telegram_exceptions(status, reply, error):
+    with pytest.raises(error):
+        send(status, reply)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for the fire-density grids, their viewport queries and map tiles
+"""
+
+import struct
+import zlib
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fire_density import (CELL_PIXELS, CELLS_PER_TILE, TILE_SIZE, FireGrid, FireHistory, cell_center,
+                          encode_png, mercator_cells)
+
+
+@pytest.fixture(scope='module')
+def history_df():
+    rng = np.random.default_rng(11)
+    n = 2000
+    days = pd.date_range('2026-03-01', '2026-03-31')
+    return pd.DataFrame({
+        'acq_date': days[rng.integers(0, len(days), n)].strftime('%Y-%m-%d'),
+        'latitude': rng.uniform(20.1, 24.7, n),
+        'longitude': rng.uniform(68.2, 74.4, n),
+        'confidence': rng.integers(0, 101, n),
+    })
+
+
+@pytest.fixture(scope='module')
+def history(history_df):
+    return FireHistory(history_df)
+
+
+def brute_force(df, zoom, start=None, end=None):
+    """{(col, row): [count, max confidence]} straight from the rows"""
+    dates = pd.to_datetime(df['acq_date']).dt.date
+    df = df[(dates >= (start or date.min)) & (dates <= (end or date.max))]
+    cols, rows = mercator_cells(df['latitude'].to_numpy(), df['longitude'].to_numpy(), zoom)
+    cells = defaultdict(lambda: [0, 0.0])
+    for col, row, confidence in zip(cols, rows, df['confidence']):
+        cells[(col, row)][0] += 1
+        cells[(col, row)][1] = max(cells[(col, row)][1], confidence)
+    return cells
+
+
+def decode_png(data):
+    """(height, width, 4) pixels of a PNG written by encode_png"""
+    width, height = struct.unpack('>II', data[16:24])
+    idat_length = struct.unpack('>I', data[33:37])[0]
+    raw = np.frombuffer(zlib.decompress(data[41:41 + idat_length]), dtype=np.uint8)
+    return raw.reshape(height, width * 4 + 1)[:, 1:].reshape(height, width, 4)
+
+
+def test_date_slice_is_inclusive(history, history_df):
+    dates = pd.to_datetime(history_df['acq_date']).dt.date
+    span = history.date_slice(date(2026, 3, 10), date(2026, 3, 12))
+    assert span.stop - span.start == ((dates >= date(2026, 3, 10)) & (dates <= date(2026, 3, 12))).sum()
+    assert history.dates[span.start] == np.datetime64('2026-03-10')
+    assert history.dates[span.stop - 1] == np.datetime64('2026-03-12')
+
+    assert history.date_slice() == slice(0, len(history))
+    assert history.date_slice(end=date(2026, 2, 28)) == slice(0, 0)
+    assert history.date_slice(start=date(2026, 4, 1)) == slice(len(history), len(history))
+    reversed_span = history.date_slice(date(2026, 3, 12), date(2026, 3, 10))
+    assert reversed_span.stop == reversed_span.start
+
+
+def test_rows_without_a_valid_date_or_position_are_dropped():
+    history = FireHistory(pd.DataFrame({'acq_date': ['2026-03-02', 'not a date', '2026-03-01', None],
+                                        'latitude': [22.0, 22.0, np.nan, 22.0],
+                                        'longitude': [70.0, 70.0, 70.0, 70.0]}))
+    assert len(history) == 1
+    assert history.confidence.tolist() == [0]
+
+
+@pytest.mark.parametrize('zoom', [6, 11])
+def test_grid_matches_a_direct_count(history, history_df, zoom):
+    start, end = date(2026, 3, 5), date(2026, 3, 20)
+    grid = FireGrid(history, zoom, start, end)
+    expected = brute_force(history_df, zoom, start, end)
+    got = {(col, row): [count, confidence] for col, row, count, confidence
+           in zip(grid.cols, grid.rows, grid.counts, grid.max_confidence)}
+    assert got == expected
+    assert grid.max_count == max(count for count, _ in expected.values())
+    assert list(zip(grid.rows, grid.cols)) == sorted(zip(grid.rows, grid.cols))
+
+
+@pytest.mark.parametrize('zoom', [6, 11])
+def test_cells_in_a_viewport(history, history_df, zoom):
+    grid = FireGrid(history, zoom)
+    bbox = (21.0, 69.0, 22.5, 71.0)
+    cells = grid.cells(bbox)
+    (col_min, col_max), (row_max, row_min) = mercator_cells(np.array([21.0, 22.5]), np.array([69.0, 71.0]), zoom)
+    expected = {key: value for key, value in brute_force(history_df, zoom).items()
+                if col_min <= key[0] <= col_max and row_min <= key[1] <= row_max}
+    assert len(cells) == len(expected)
+    assert sum(cell[2] for cell in cells) == sum(count for count, _ in expected.values())
+    for lat, lon, count, confidence in cells:
+        # Each cell centre maps back to its own cell
+        (col,), (row,) = mercator_cells(np.array([lat]), np.array([lon]), zoom)
+        assert expected[(col, row)] == [count, confidence]
+    assert len(grid.cells()) == len(grid)
+
+
+def test_lower_zooms_merge_cells(history):
+    fine, coarse = FireGrid(history, 11), FireGrid(history, 6)
+    assert len(coarse) < len(fine)
+    assert coarse.counts.sum() == fine.counts.sum() == len(history)
+    assert coarse.max_count >= fine.max_count
+
+
+@pytest.mark.parametrize('zoom', [6, 11])
+def test_tile_draws_its_cells(history, zoom):
+    grid = FireGrid(history, zoom)
+    col, row = grid.cols[grid.counts.argmax()], grid.rows[grid.counts.argmax()]
+    x, y = col // CELLS_PER_TILE, row // CELLS_PER_TILE
+    pixels = decode_png(grid.tile(x, y))
+    assert pixels.shape == (TILE_SIZE, TILE_SIZE, 4)
+
+    inside = (grid.cols // CELLS_PER_TILE == x) & (grid.rows // CELLS_PER_TILE == y)
+    drawn = pixels[::CELL_PIXELS, ::CELL_PIXELS, 3] > 0
+    assert drawn.sum() == inside.sum()
+    assert drawn[grid.rows[inside] % CELLS_PER_TILE, grid.cols[inside] % CELLS_PER_TILE].all()
+    # The busiest cell is the most opaque
+    top, left = (row % CELLS_PER_TILE) * CELL_PIXELS, (col % CELLS_PER_TILE) * CELL_PIXELS
+    assert pixels[top:top + CELL_PIXELS, left:left + CELL_PIXELS, 3].min() == pixels[..., 3].max() == 240
+
+
+def test_empty_tile_is_transparent(history):
+    pixels = decode_png(FireGrid(history, 6).tile(0, 0))
+    assert not pixels.any()
+
+
+def test_cell_center_round_trips():
+    lats, lons = np.array([20.5, 23.1]), np.array([68.9, 72.4])
+    for zoom in (4, 12, 18):
+        cols, rows = mercator_cells(lats, lons, zoom)
+        centre_lats, centre_lons = cell_center(cols, rows, zoom)
+        assert (mercator_cells(centre_lats, centre_lons, zoom)[0] == cols).all()
+        assert (mercator_cells(centre_lats, centre_lons, zoom)[1] == rows).all()
+
+
+def test_encode_png_round_trips():
+    pixels = np.arange(4 * 3 * 4, dtype=np.uint8).reshape(4, 3, 4)
+    data = encode_png(pixels)
+    assert data.startswith(b'\x89PNG\r\n\x1a\n')
+    np.testing.assert_array_equal(decode_png(data), pixels)
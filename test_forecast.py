@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for saved hourly forecasts, the heat lookahead and its alerts
+"""
+
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecast
+import shared_data
+from backends import FileBackend
+from forecast import HOURLY_VARIABLES, HourlyForecast
+from weather_field import WeatherField
+
+DAY = date(2026, 5, 2)
+
+
+def make_forecast(field, temps):
+    """Two days from DAY - 1 with temperature_2m peaking at temps[node] on DAY"""
+    values = np.full((field.node_count, 48, len(HOURLY_VARIABLES)), 30, dtype=np.float32)
+    values[:, 24 + 14, 0] = temps
+    return HourlyForecast(values, datetime(2026, 5, 1), field.node_lats, field.node_lons, fetched_at=1000.0)
+
+
+@pytest.fixture
+def field(monkeypatch):
+    # Bhuj's villages sit on grid nodes
+    field = WeatherField([23.0, 23.5, 23.25], [69.5, 69.5, 70.0], step=0.5)
+    points = pd.DataFrame({'District Name': ['KUTCH'] * 3, 'Taluka Name': ['Bhuj', 'Bhuj', 'Anjar'],
+                           'Village Name': ['A', 'B', 'C']})
+    monkeypatch.setattr(forecast, 'get_weather_field', lambda: (field, points))
+    return field
+
+
+def node_temps(field, hot):
+    """41 °C at the nodes in `hot`, 35 °C elsewhere"""
+    return np.array([41 if (lat, lon) in hot else 35 for lat, lon in zip(field.node_lats, field.node_lons)])
+
+
+def test_save_and_load_round_trip(tmp_path, field):
+    path = str(tmp_path / 'forecast.npy')
+    saved = make_forecast(field, node_temps(field, {(23.5, 69.5)}))
+    saved.save(path)
+
+    loaded = HourlyForecast.load(path)
+    assert isinstance(loaded.values, np.memmap)
+    assert not loaded.values.flags.writeable
+    np.testing.assert_array_equal(loaded.values, saved.values)
+    assert loaded.start == saved.start
+    assert loaded.variables == HOURLY_VARIABLES
+    assert loaded.fetched_at == 1000.0
+    np.testing.assert_array_equal(loaded.lats, field.node_lats)
+    assert not isinstance(HourlyForecast.load(path, mmap=False).values, np.memmap)
+
+
+def test_missing_or_torn_forecast_loads_nothing(tmp_path, field):
+    path = str(tmp_path / 'forecast.npy')
+    assert HourlyForecast.load(path) is None
+    make_forecast(field, 35).save(path)
+    # A writer replaced the array but not yet the header
+    np.save(path, np.zeros((1, 24, 4), dtype=np.float32))
+    assert HourlyForecast.load(path) is None
+
+
+def test_daily_max_covers_only_that_date(field):
+    saved = make_forecast(field, 42)
+    saved.values[:, 10, 0] = 45
+    assert saved.daily_max('temperature_2m', DAY).tolist() == [42] * field.node_count
+    assert saved.daily_max('temperature_2m', date(2026, 5, 1)).tolist() == [45] * field.node_count
+    assert np.isnan(saved.daily_max('temperature_2m', date(2026, 5, 3))).all()
+
+
+def test_expected_heat_keeps_each_talukas_hottest_village(field):
+    hot = forecast.expected_heat(DAY, 40, forecast=make_forecast(field, node_temps(field, {(23.5, 69.5)})))
+    assert hot.to_dict('records') == [
+        {'District Name': 'KUTCH', 'Taluka Name': 'Bhuj', 'hottest_village': 'B', 'max_temp': 41.0}]
+
+    # Anjar's village is off the nodes and gets their weighted mix
+    temps = node_temps(field, {(23.5, 69.5), (23.0, 70.0)})
+    hot = forecast.expected_heat(DAY, 37, forecast=make_forecast(field, temps))
+    anjar = round(float(field.interpolate_values(temps.astype(np.float32))[2]), 1)
+    assert 35 < anjar < 41
+    assert hot.set_index('Taluka Name')['max_temp'].to_dict() == {'Bhuj': 41.0, 'Anjar': anjar}
+    assert forecast.expected_heat(DAY, 42, forecast=make_forecast(field, 41)).empty
+
+
+def test_alerts_are_queued_once_per_taluka_and_day(tmp_path, field, monkeypatch):
+    def backend():
+        return FileBackend(subscribers_file=str(tmp_path / 'subscribers.json'),
+                           alerts_file=str(tmp_path / 'pending_alerts.json'),
+                           alert_state_file=str(tmp_path / 'alert_state.json'),
+                           scheduled_alerts_file=str(tmp_path / 'scheduled_alerts.json'),
+                           shard_progress_file=str(tmp_path / 'shard_progress.json'))
+
+    monkeypatch.setattr(shared_data, '_backend', backend())
+    monkeypatch.setattr(forecast, '_alerted', set())
+    shared_data.get_backend().add_subscriber(7, 'KUTCH', 'Bhuj')
+    monkeypatch.setattr(forecast, 'get_forecast', lambda: make_forecast(field, 41))
+
+    assert forecast.queue_forecast_alerts(DAY, 40) == 1
+    assert forecast.queue_forecast_alerts(DAY, 40) == 0
+    # A restarted bot, or another node, doesn't queue it again
+    monkeypatch.setattr(shared_data, '_backend', backend())
+    monkeypatch.setattr(forecast, '_alerted', set())
+    assert forecast.queue_forecast_alerts(DAY, 40, owner='other') == 0
+    alerts = shared_data.get_backend().get_pending_alerts()
+    assert [(a['taluka'], a['type']) for a in alerts] == [('Bhuj', 'forecast')]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for heat stress measures against published reference values
+"""
+
+import numpy as np
+import pytest
+
+from heat_stress import evaluate, heat_index, parse_tiers, wet_bulb
+
+
+def fahrenheit_to_celsius(f):
+    return (f - 32) / 1.8
+
+
+@pytest.mark.parametrize('temp_f, humidity, expected_f', [
+    # NWS heat index chart
+    (90, 70, 106),
+    (100, 40, 109),
+    (86, 90, 105),
+    # Below 80 °F the simple formula applies
+    (80, 40, 80),
+    # Low humidity adjustment
+    (104, 10, 98),
+])
+def test_heat_index_matches_nws_chart(temp_f, humidity, expected_f):
+    result = heat_index(fahrenheit_to_celsius(temp_f), humidity)
+    assert result == pytest.approx(fahrenheit_to_celsius(expected_f), abs=0.5)
+
+
+@pytest.mark.parametrize('temp_c, humidity, expected', [
+    # Stull (2011)'s worked example
+    (20, 50, 13.7),
+    # Psychrometric values at sea level
+    (30, 50, 22.0),
+    (35, 75, 31.0),
+])
+def test_wet_bulb_matches_reference(temp_c, humidity, expected):
+    assert wet_bulb(temp_c, humidity) == pytest.approx(expected, abs=0.4)
+
+
+def test_level_is_the_highest_tier_reached():
+    tiers = parse_tiers('medium:41:28,high:46:30,extreme:54:32')
+    result = evaluate([30, 39, 35, np.nan], [40, 40, 80, 50], [10, 10, 10, 10], tiers)
+    # Mild; heat index 45.8 °C; heat index 56.5 °C; no data
+    assert result['level'].tolist() == [0, 1, 3, 0]
+
+
+def test_wet_bulb_alone_can_set_the_level():
+    # Heat index thresholds out of reach: only the 31.9 °C wet-bulb counts
+    tiers = parse_tiers('medium:100:25,high:110:28,extreme:120:30')
+    assert evaluate([35], [80], [10], tiers)['level'].tolist() == [3]
+
+
+def test_tiers_must_increase():
+    with pytest.raises(ValueError):
+        parse_tiers('medium:41:28,high:40:30')
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the read-only arrays and frames preloaded before workers fork
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from preload import shared_array, shared_frame
+
+
+def test_shared_array_is_a_read_only_copy():
+    values = np.arange(12, dtype=np.float32).reshape(3, 4)
+    shared = shared_array(values)
+    np.testing.assert_array_equal(shared, values)
+    assert (shared.dtype, shared.shape) == (np.float32, (3, 4))
+    assert not np.shares_memory(shared, values)
+    with pytest.raises(ValueError):
+        shared[0, 0] = 1
+    values[0, 0] = 99
+    assert shared[0, 0] == 0
+
+
+def test_shared_array_edge_cases():
+    assert shared_array(np.array([], dtype=np.int64)).shape == (0,)
+    # Non-contiguous input is copied in order
+    np.testing.assert_array_equal(shared_array(np.arange(10)[::3]), [0, 3, 6, 9])
+    with pytest.raises(TypeError):
+        shared_array(np.array(['a', None], dtype=object))
+
+
+def test_shared_array_survives_fork_read_only():
+    shared = shared_array(np.arange(100_000, dtype=np.int64))
+    pid = os.fork()
+    if pid == 0:
+        # Child: report through the exit status; pytest must not carry on here
+        status = 1
+        try:
+            if shared.sum() == 99_999 * 100_000 // 2 and not shared.flags.writeable:
+                try:
+                    shared[0] = 5
+                except ValueError:
+                    status = 0
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert shared[0] == 0
+
+
+def test_shared_frame():
+    df = pd.DataFrame({
+        'District Name': pd.Categorical(['KUTCH', 'DANG', 'KUTCH']),
+        'Village Name': ['Madhapar', 'Pipri', None],
+        'Village Latitude': np.array([23.2, 20.7, 23.3], dtype=np.float32),
+        'Population': [5200, 1800, 950],
+    }, index=[10, 11, 12])
+    shared = shared_frame(df)
+    assert shared.index.tolist() == [10, 11, 12]
+    assert shared['District Name'].tolist() == ['KUTCH', 'DANG', 'KUTCH']
+    # Text becomes a categorical over the shared codes; missing values stay missing
+    assert isinstance(shared['Village Name'].dtype, pd.CategoricalDtype)
+    assert shared['Village Name'].tolist()[:2] == ['Madhapar', 'Pipri']
+    assert pd.isna(shared['Village Name'][12])
+    assert (shared.dtypes[['Village Latitude', 'Population']] == df.dtypes[['Village Latitude', 'Population']]).all()
+    np.testing.assert_array_equal(shared['Population'], df['Population'])
+    assert not shared['Village Name'].array.codes.flags.writeable
+    assert not shared['Population'].to_numpy().flags.writeable
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for GridIndex nearest-location lookups
+"""
+
+import math
+import random
+
+import numpy as np
+import pytest
+
+from spatial_index import KM_PER_DEGREE, GridIndex
+
+
+def brute_force(lats, lons, lat, lon):
+    scale = math.cos(math.radians(lat))
+    d2 = (lats - lat) ** 2 + ((lons - lon) * scale) ** 2
+    i = int(d2.argmin())
+    return i, math.sqrt(d2[i]) * KM_PER_DEGREE
+
+
+def test_nearest_matches_brute_force():
+    rng = np.random.default_rng(5)
+    # Clustered like villages, with empty stretches between clusters
+    centres = rng.uniform([20.1, 68.2], [24.7, 74.4], size=(40, 2))
+    points = centres[rng.integers(0, 40, 3000)] + rng.normal(0, 0.05, size=(3000, 2))
+    lats, lons = points[:, 0], points[:, 1]
+    index = GridIndex(lats, lons)
+
+    queries = random.Random(5)
+    for _ in range(500):
+        lat, lon = queries.uniform(19.5, 25.5), queries.uniform(67.5, 75.0)
+        found, distance = index.nearest(lat, lon)
+        expected, expected_distance = brute_force(lats, lons, lat, lon)
+        assert distance == pytest.approx(expected_distance)
+        # Equally close points may be picked either way
+        assert found == expected or brute_force(lats[[found]], lons[[found]], lat, lon)[1] == \
+            pytest.approx(expected_distance)
+
+
+def test_query_far_outside_the_grid():
+    index = GridIndex([22.0, 23.0], [70.0, 71.0])
+    assert index.nearest(30.0, 80.0)[0] == 1
+    assert index.nearest(10.0, 60.0)[0] == 0
+
+
+def test_max_km():
+    index = GridIndex([22.0, 23.0], [70.0, 71.0])
+    found, distance = index.nearest(22.1, 70.0, max_km=20)
+    assert found == 0
+    assert distance == pytest.approx(0.1 * KM_PER_DEGREE)
+    assert index.nearest(22.5, 70.5, max_km=20) == (None, None)
+
+
+def test_single_point():
+    index = GridIndex([22.3], [70.8])
+    assert index.nearest(22.3, 70.8) == (0, 0.0)
+
+
+def test_needs_points():
+    with pytest.raises(ValueError):
+        GridIndex([], [])
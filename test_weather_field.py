@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for grid interpolation and the shared village weather refresh
+"""
+
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import shared_data
+import weather_field
+from weather_field import WeatherField
+
+
+def node_values(field, corners):
+    """Per-node array taking corners[(lat, lon)] at each node, NaN elsewhere"""
+    return np.array([corners.get((lat, lon), np.nan) for lat, lon in zip(field.node_lats, field.node_lons)],
+                    dtype=np.float32)
+
+
+CORNERS = {(22.0, 70.0): 30.0, (22.5, 70.0): 32.0, (22.0, 70.5): 34.0, (22.5, 70.5): 40.0}
+
+
+def test_cell_centre_is_the_corner_mean():
+    field = WeatherField([22.25], [70.25], step=0.5)
+    assert field.node_count == 4
+    assert field.weights[0] == pytest.approx([0.25] * 4)
+    assert field.interpolate_values(node_values(field, CORNERS))[0] == pytest.approx(34.0)
+
+
+def test_point_on_a_node_takes_its_value():
+    field = WeatherField([22.0, 22.25], [70.5, 70.25], step=0.5)
+    values = field.interpolate_values(node_values(field, CORNERS))
+    assert values.tolist() == pytest.approx([34.0, 34.0])
+
+
+def test_closer_corner_weighs_more():
+    field = WeatherField([22.05], [70.05], step=0.5)
+    weights = dict(zip(zip(field.node_lats[field.neighbours[0]], field.node_lons[field.neighbours[0]]),
+                       field.weights[0]))
+    assert weights[(22.0, 70.0)] == max(weights.values())
+    assert weights[(22.5, 70.5)] == min(weights.values())
+    assert sum(weights.values()) == pytest.approx(1.0)
+
+
+def test_missing_nodes_are_left_out():
+    field = WeatherField([22.25], [70.25], step=0.5)
+    values = node_values(field, CORNERS)
+    values[(field.node_lats == 22.5) & (field.node_lons == 70.5)] = np.nan
+    assert field.interpolate_values(values)[0] == pytest.approx(32.0)
+
+
+def test_categorical_values_take_the_closest_node():
+    field = WeatherField([22.05], [70.05], step=0.5)
+    field.node_values = {'weather_code': node_values(field, {k: v // 10 for k, v in CORNERS.items()})}
+    assert field.interpolate()['weather_code'][0] == 3
+
+
+@pytest.fixture
+def villages(monkeypatch):
+    df = pd.DataFrame({'District Name': ['KUTCH', 'KUTCH'], 'Taluka Name': ['Bhuj', 'Anjar'],
+                       'Village Name': ['A', 'B'], 'Village Latitude': [23.1, 23.3],
+                       'Village Longitude': [69.6, 70.0]})
+    monkeypatch.setattr(shared_data, 'load_location_data', lambda: df)
+    for name in ('_field', '_village_weather', '_fetched_at', '_failed_at'):
+        monkeypatch.setattr(weather_field, name, None)
+    monkeypatch.setattr(weather_field, '_record_history', lambda villages: None)
+    fetches = []
+    succeed = [False]
+
+    def fetch(field):
+        fetches.append(threading.current_thread().name)
+        time.sleep(0.2)
+        if not succeed[0]:
+            return 0
+        field.node_values = {name: np.full(field.node_count, 35, dtype=np.float32)
+                             for name in ('current_temp', 'humidity', 'wind_speed', 'max_temp', 'min_temp',
+                                          'weather_code')}
+        return field.node_count
+
+    monkeypatch.setattr(WeatherField, 'fetch', fetch)
+    return fetches, succeed
+
+
+def test_one_fetch_at_a_time_and_back_off_after_failure(villages):
+    fetches, succeed = villages
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(weather_field.get_village_weather()))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(fetches) == 1
+    assert results == [None] * 4
+
+    # Within WEATHER_RETRY_DELAY of the failure nothing is fetched
+    succeed[0] = True
+    assert weather_field.get_village_weather() is None
+    assert len(fetches) == 1
+
+    weather_field._failed_at -= weather_field.WEATHER_RETRY_DELAY
+    weather = weather_field.get_village_weather()
+    assert weather['current_temp'].tolist() == pytest.approx([35, 35])
+    assert len(fetches) == 2
+
+
+def test_stale_weather_is_served_during_a_refresh(villages):
+    fetches, succeed = villages
+    succeed[0] = True
+    weather_field.get_village_weather()
+    refresh = threading.Thread(target=weather_field.get_village_weather, kwargs={'max_age': 0})
+    refresh.start()
+    time.sleep(0.05)
+    start = time.perf_counter()
+    assert weather_field.get_village_weather(max_age=0) is not None
+    assert time.perf_counter() - start < 0.1
+    refresh.join()
+    assert len(fetches) == 2
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Single-process runtime: web app, Telegram bot and alert dispatcher together
+
+Instead of `python bot_host.py & python app.py` (two processes that talk
+through JSON files), this runs everything in one process:
+
+- the bot and the alert dispatcher share one asyncio event loop
+- the Flask app is served by a threaded WSGI server from the same process
+- subscriber/alert state, the village dataset and the weather cache are
+  held in memory once and shared by all three
+- alerts queued from the website wake the dispatcher through an in-process
+  asyncio.Queue instead of waiting for the next file poll
+
+bot_host.py and app.py still run on their own as before.
+
+Usage:
+    python unified_runtime.py
+"""
+
+import os
+import signal
+import asyncio
+import logging
+import threading
+
+from dotenv import load_dotenv
+from werkzeug.serving import make_server
+
+load_dotenv()
+
+import shared_data  # noqa: E402
+import bot_host  # noqa: E402
+import metrics  # noqa: E402
+from app import app  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+WEB_HOST = os.environ.get('HOST', '0.0.0.0')
+WEB_PORT = int(os.environ.get('PORT', 5000))
+
+
+async def run_dispatcher(application, alert_queue):
+    """Send queued alerts as soon as they are queued
+
+    Alerts queued in this process arrive on alert_queue immediately. Waiting
+    times out every ALERT_POLL_INTERVAL seconds so alerts written to the
+    JSON file by other processes (e.g. send_demo_alert.py) still go out.
+    """
+    while True:
+        try:
+            await asyncio.wait_for(alert_queue.get(), timeout=bot_host.ALERT_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+        # One pass sends everything pending, so collapse a burst of wake-ups
+        while not alert_queue.empty():
+            alert_queue.get_nowait()
+
+        await bot_host.process_pending_alerts(application, wait=True)
+
+
+async def run_forecast_checks():
+    """Check the forecast for heat every FORECAST_REFRESH_INTERVAL seconds"""
+    delay = min(60, bot_host.FORECAST_REFRESH_INTERVAL)
+    while True:
+        await asyncio.sleep(delay)
+        await bot_host.check_forecast_alerts()
+        delay = bot_host.FORECAST_REFRESH_INTERVAL
+
+
+def start_web_server():
+    """Serve the Flask app from a background thread of this process"""
+    server = make_server(WEB_HOST, WEB_PORT, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='flask', daemon=True)
+    thread.start()
+    logger.info(f"🌐 Web app on http://{WEB_HOST}:{WEB_PORT}")
+    return server
+
+
+async def run():
+    shared_data.enable_in_process_mode()
+    bot_host.load_data()
+
+    loop = asyncio.get_running_loop()
+    alert_queue = asyncio.Queue()
+    # Flask handlers run in worker threads, so hand alerts to the loop thread-safely
+    shared_data.add_alert_listener(lambda alert: loop.call_soon_threadsafe(alert_queue.put_nowait, alert))
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    if bot_host.METRICS_PORT:
+        metrics.start_http_server(int(bot_host.METRICS_PORT))
+
+    web_server = start_web_server()
+    application = bot_host.build_application()
+
+    async with application:
+        await application.start()
+        await application.updater.start_polling()
+        dispatcher = asyncio.create_task(run_dispatcher(application, alert_queue))
+        forecast_checks = (asyncio.create_task(run_forecast_checks())
+                           if bot_host.FORECAST_REFRESH_INTERVAL > 0 else None)
+        logger.info("✅ Unified runtime is LIVE (web + bot + dispatcher)")
+
+        await stop.wait()
+
+        logger.info("🛑 Shutting down...")
+        dispatcher.cancel()
+        if forecast_checks:
+            forecast_checks.cancel()
+        web_server.shutdown()
+        await application.updater.stop()
+        await application.stop()
+    bot_host.conversations.save()
+
+
+def main():
+    logger.info("🚀 Starting unified runtime...")
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
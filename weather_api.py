@@ -3,20 +3,45 @@
 Real weather data fetcher using Open-Meteo API
 """
 
+import os
+import time
+import threading
 import requests
 import pandas as pd
 import logging
 from datetime import datetime, timedelta
 import json
+from collections import OrderedDict
+import metrics
 
 logger = logging.getLogger(__name__)
 
+# Open-Meteo updates current conditions every 15 minutes, so short-lived
+# caching avoids refetching the same point on every page load
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', 600))
+# Points kept; lookups can come from any village, so the least recently used go
+WEATHER_CACHE_SIZE = int(os.getenv('WEATHER_CACHE_SIZE', 2048))
+
+_weather_cache_lock = threading.Lock()
+# (rounded lat, rounded lon) -> (fetched_at, weather_info), least recently used first
+_weather_cache = OrderedDict()
+
 class WeatherAPI:
     def __init__(self):
-        self.base_url = "https://api.open-meteo.com/v1/forecast"
+        self.base_url = os.getenv('OPEN_METEO_URL', "https://api.open-meteo.com/v1/forecast")
         
     def get_weather_data(self, latitude, longitude, location_name=""):
         """Get current weather data for a location"""
+        cache_key = (round(float(latitude), 4), round(float(longitude), 4))
+        with _weather_cache_lock:
+            cached = _weather_cache.get(cache_key)
+            if cached and time.monotonic() - cached[0] < WEATHER_CACHE_TTL:
+                _weather_cache.move_to_end(cache_key)
+                metrics.WEATHER_CACHE_LOOKUPS.labels('hit').inc()
+                return dict(cached[1], location=location_name)
+        metrics.WEATHER_CACHE_LOOKUPS.labels('miss').inc()
+        
+        start = time.perf_counter()
         try:
             params = {
                 'latitude': latitude,
@@ -31,6 +56,7 @@ class WeatherAPI:
             response.raise_for_status()
             
             data = response.json()
+            metrics.OPEN_METEO_REQUEST_SECONDS.labels('success').observe(time.perf_counter() - start)
             current = data.get('current', {})
             daily = data.get('daily', {})
             
@@ -48,9 +74,15 @@ class WeatherAPI:
                 'weather_description': self.get_weather_description(current.get('weather_code', 0))
             }
             
+            with _weather_cache_lock:
+                _weather_cache[cache_key] = (time.monotonic(), weather_info)
+                _weather_cache.move_to_end(cache_key)
+                while len(_weather_cache) > WEATHER_CACHE_SIZE:
+                    _weather_cache.popitem(last=False)
             return weather_info
             
         except Exception as e:
+            metrics.OPEN_METEO_REQUEST_SECONDS.labels('error').observe(time.perf_counter() - start)
             logger.error(f"Error fetching weather for {location_name}: {e}")
             return None
     
@@ -120,9 +152,6 @@ class WeatherAPI:
 def get_weather_for_locations():
     """Get weather data for major Gujarat locations"""
     try:
-        # Load location data
-        df = pd.read_csv('merged_village_temperature_data.csv')
-        
         # Get unique district centers (sample some major ones)
         major_locations = [
             {'name': 'Ahmedabad', 'lat': 23.0225, 'lon': 72.5714},
@@ -156,7 +185,9 @@ def get_weather_for_locations():
 def get_weather_for_taluka(district, taluka):
     """Get weather data for specific taluka"""
     try:
-        df = pd.read_csv('merged_village_temperature_data.csv')
+        from shared_data import load_location_data
+        
+        df = load_location_data()
         
         # Find the taluka coordinates
         taluka_data = df[
@@ -167,8 +198,9 @@ def get_weather_for_taluka(district, taluka):
         if pd.isna(taluka_data['Taluka Latitude']) or pd.isna(taluka_data['Taluka Longitude']):
             return None
             
-        lat = float(taluka_data['Taluka Latitude'])
-        lon = float(taluka_data['Taluka Longitude'])
+        # Coordinates are float32 in the dataset; round off the conversion noise
+        lat = round(float(taluka_data['Taluka Latitude']), 5)
+        lon = round(float(taluka_data['Taluka Longitude']), 5)
         
         weather_api = WeatherAPI()
         return weather_api.get_weather_data(lat, lon, f"{taluka}, {district}")
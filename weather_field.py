@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Village-level weather interpolated from a coarse Open-Meteo grid
+
+Fetching every village separately would take tens of thousands of API
+calls. Instead, weather is fetched for the nodes of a regular lat/lon grid
+(WEATHER_GRID_STEP degrees, only the nodes surrounding some village) in
+batched multi-location requests, and each village gets an inverse-distance
+weighted mix of its four surrounding nodes. Node indices and weights are
+computed once per dataset, so a refresh is a few HTTP calls plus one
+vectorised gather.
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+import requests
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Grid spacing in degrees (0.25 deg ~ 28 km, about the model resolution)
+WEATHER_GRID_STEP = float(os.getenv('WEATHER_GRID_STEP', 0.25))
+# Locations per Open-Meteo request
+WEATHER_GRID_BATCH = int(os.getenv('WEATHER_GRID_BATCH', 100))
+# Inverse-distance weighting exponent
+IDW_POWER = 2.0
+# Seconds to wait after a grid fetch got nothing before trying again
+WEATHER_RETRY_DELAY = float(os.getenv('WEATHER_RETRY_DELAY', 60))
+
+CURRENT_VARIABLES = {
+    'current_temp': 'temperature_2m',
+    'humidity': 'relative_humidity_2m',
+    'wind_speed': 'wind_speed_10m',
+}
+DAILY_VARIABLES = {
+    'max_temp': 'temperature_2m_max',
+    'min_temp': 'temperature_2m_min',
+}
+
+
+class WeatherField:
+    """Grid nodes around a set of points plus each point's interpolation weights"""
+
+    def __init__(self, lats, lons, step=WEATHER_GRID_STEP):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        self.step = step
+        lat0 = math.floor(lats.min() / step) * step
+        lon0 = math.floor(lons.min() / step) * step
+
+        rows = np.floor((lats - lat0) / step).astype(np.int64)
+        cols = np.floor((lons - lon0) / step).astype(np.int64)
+        n_cols = int(cols.max()) + 2
+        corner_rows = np.stack([rows, rows + 1, rows, rows + 1], axis=1)
+        corner_cols = np.stack([cols, cols, cols + 1, cols + 1], axis=1)
+
+        # Keep only nodes some point needs; neighbours index into them
+        node_keys, inverse = np.unique(corner_rows * n_cols + corner_cols, return_inverse=True)
+        self.neighbours = inverse.reshape(-1, 4).astype(np.int32)
+        self.node_lats = np.round(lat0 + (node_keys // n_cols) * step, 4)
+        self.node_lons = np.round(lon0 + (node_keys % n_cols) * step, 4)
+
+        dy = self.node_lats[self.neighbours] - lats[:, None]
+        dx = (self.node_lons[self.neighbours] - lons[:, None]) * np.cos(np.radians(lats))[:, None]
+        distance = np.hypot(dx, dy)
+        with np.errstate(divide='ignore'):
+            weights = distance ** -IDW_POWER
+        # A point sitting on a node takes that node's value
+        exact = distance < 1e-9
+        weights[exact.any(axis=1)] = exact[exact.any(axis=1)]
+        self.weights = (weights / weights.sum(axis=1, keepdims=True)).astype(np.float32)
+
+        self.node_values = None
+
+    @property
+    def node_count(self):
+        return len(self.node_lats)
+
+    def fetch(self, base_url=None, batch_size=WEATHER_GRID_BATCH):
+        """Fetch current conditions for all grid nodes in batched requests"""
+        values = {name: np.full(self.node_count, np.nan, dtype=np.float32)
+                  for name in list(CURRENT_VARIABLES) + list(DAILY_VARIABLES) + ['weather_code']}
+        params = {
+            'current': ','.join(list(CURRENT_VARIABLES.values()) + ['weather_code']),
+            'daily': ','.join(DAILY_VARIABLES.values()),
+            'timezone': 'Asia/Kolkata',
+            'forecast_days': 1
+        }
+
+        for i, node in fetch_locations(self.node_lats, self.node_lons, params, base_url, batch_size):
+            current = node.get('current', {})
+            daily = node.get('daily', {})
+            for name, key in CURRENT_VARIABLES.items():
+                values[name][i] = current.get(key, np.nan)
+            values['weather_code'][i] = current.get('weather_code', np.nan)
+            for name, key in DAILY_VARIABLES.items():
+                values[name][i] = (daily.get(key) or [np.nan])[0]
+
+        fetched = int(np.isfinite(values['current_temp']).sum())
+        logger.info(f"🌐 Weather grid: {fetched}/{self.node_count} nodes fetched")
+        if fetched:
+            self.node_values = values
+        return fetched
+
+    def interpolate_values(self, node_values):
+        """Interpolate one per-node array to the points, skipping NaN nodes"""
+        gathered = node_values[self.neighbours]
+        # Leave out nodes whose fetch failed and renormalise the rest
+        valid = ~np.isnan(gathered)
+        weights = np.where(valid, self.weights, 0)
+        total = weights.sum(axis=1)
+        with np.errstate(invalid='ignore'):
+            return (np.where(valid, gathered, 0) * weights).sum(axis=1) / total
+
+    def interpolate(self):
+        """Per-point weather arrays (None until a fetch succeeds)"""
+        if self.node_values is None:
+            return None
+        result = {}
+        for name, node_values in self.node_values.items():
+            gathered = node_values[self.neighbours]
+            if name == 'weather_code':
+                # Categorical: take the closest node that has a value
+                weights = np.where(np.isnan(gathered), -1, self.weights)
+                result[name] = gathered[np.arange(len(gathered)), weights.argmax(axis=1)]
+                continue
+            result[name] = self.interpolate_values(node_values)
+        return result
+
+
+def fetch_locations(lats, lons, params, base_url=None, batch_size=WEATHER_GRID_BATCH):
+    """Yield (index, response body) for each location, batching Open-Meteo requests
+
+    Locations in a batch that fails are skipped (and logged).
+    """
+    base_url = base_url or os.getenv('OPEN_METEO_URL', "https://api.open-meteo.com/v1/forecast")
+    for first in range(0, len(lats), batch_size):
+        last = min(first + batch_size, len(lats))
+        start = time.perf_counter()
+        try:
+            response = requests.get(base_url, params=dict(
+                params,
+                latitude=','.join(f"{v:.4f}" for v in lats[first:last]),
+                longitude=','.join(f"{v:.4f}" for v in lons[first:last]),
+            ), timeout=30)
+            response.raise_for_status()
+            data = response.json()
+            metrics.OPEN_METEO_REQUEST_SECONDS.labels('success').observe(time.perf_counter() - start)
+        except Exception as e:
+            metrics.OPEN_METEO_REQUEST_SECONDS.labels('error').observe(time.perf_counter() - start)
+            logger.error(f"Error fetching weather for locations {first}-{last}: {e}")
+            continue
+
+        # A single location comes back as an object, several as a list
+        yield from enumerate(data if isinstance(data, list) else [data], start=first)
+
+
+_field = None
+_village_weather = None
+# When the weather in _village_weather was fetched, and when a fetch last
+# got nothing (time.monotonic())
+_fetched_at = None
+_failed_at = None
+_field_lock = threading.Lock()
+# Held by the one thread fetching the grid
+_fetch_lock = threading.Lock()
+
+
+def location_points(df):
+    """Coordinates to interpolate to: villages, or taluka centres if the dataset has none"""
+    if {'Village Latitude', 'Village Longitude'} <= set(df.columns):
+        return df.dropna(subset=['Village Latitude', 'Village Longitude']), 'Village Latitude', 'Village Longitude'
+    points = df.dropna(subset=['Taluka Latitude', 'Taluka Longitude'])
+    return points.drop_duplicates(subset=['District Name', 'Taluka Name']), 'Taluka Latitude', 'Taluka Longitude'
+
+
+def get_weather_field():
+    """The process-wide WeatherField and a frame describing its points
+
+    The frame has District Name, Taluka Name, (Village Name,) latitude and
+    longitude, one row per interpolated point. (None, None) without data.
+    """
+    global _field, _village_weather
+    from shared_data import load_location_data
+
+    with _field_lock:
+        if _field is None:
+            df = load_location_data()
+            if df.empty:
+                return None, None
+            points, lat_col, lon_col = location_points(df)
+            _field = WeatherField(points[lat_col].to_numpy(), points[lon_col].to_numpy())
+            columns = [c for c in ('District Name', 'Taluka Name', 'Village Name') if c in points]
+            _village_weather = points[columns].reset_index(drop=True)
+            _village_weather['latitude'] = points[lat_col].to_numpy()
+            _village_weather['longitude'] = points[lon_col].to_numpy()
+            logger.info(f"🌐 Weather grid: {_field.node_count} nodes for {len(points)} locations")
+        return _field, _village_weather
+
+
+def _fetch_due(max_age):
+    now = time.monotonic()
+    if _failed_at is not None and now - _failed_at < WEATHER_RETRY_DELAY:
+        return False
+    return _fetched_at is None or now - _fetched_at >= max_age
+
+
+def get_village_weather(max_age=None):
+    """Interpolated weather for every village as a DataFrame
+
+    Columns: District Name, Taluka Name, (Village Name,) latitude, longitude,
+    current_temp, humidity, wind_speed, max_temp, min_temp, weather_code.
+    Refetched when older than max_age (default WEATHER_CACHE_TTL); None if
+    no weather could be fetched.
+
+    One thread fetches at a time, without holding _field_lock: the others
+    get the previous weather meanwhile, or wait if there is none yet. After
+    a fetch that got nothing, the next waits WEATHER_RETRY_DELAY.
+    """
+    global _village_weather, _fetched_at, _failed_at
+    from weather_api import WEATHER_CACHE_TTL
+
+    field, _ = get_weather_field()
+    if field is None:
+        return None
+    max_age = WEATHER_CACHE_TTL if max_age is None else max_age
+    with _field_lock:
+        due = _fetch_due(max_age)
+        have_weather = _fetched_at is not None
+
+    if due and _fetch_lock.acquire(blocking=not have_weather):
+        try:
+            with _field_lock:
+                due = _fetch_due(max_age)
+            if due and field.fetch():
+                villages = _village_weather.assign(**field.interpolate(), timestamp=datetime.now().isoformat())
+                with _field_lock:
+                    _village_weather, _fetched_at, _failed_at = villages, time.monotonic(), None
+                _record_history(villages)
+            elif due:
+                with _field_lock:
+                    _failed_at = time.monotonic()
+        finally:
+            _fetch_lock.release()
+
+    with _field_lock:
+        return _village_weather if _fetched_at is not None else None
+
+
+def _record_history(villages):
+    """Keep daily per-taluka extremes for the climatology build (see climatology.py)"""
+    from climatology import record_observations
+    try:
+        record_observations(summarise_by_taluka(villages))
+    except Exception as e:
+        logger.error(f"Error recording weather history: {e}")
+
+
+def summarise_by_taluka(villages):
+    """Per-taluka extremes over the village weather frame
+
+    current_temp/max_temp are the taluka's hottest village, min_temp its
+    coldest; hottest_village names the village with the highest max_temp.
+    """
+    villages = villages.dropna(subset=['current_temp', 'max_temp', 'min_temp'])
+    grouped = villages.groupby(['District Name', 'Taluka Name'], sort=False, observed=True)
+    summary = grouped.agg(
+        current_temp=('current_temp', 'max'),
+        max_temp=('max_temp', 'max'),
+        min_temp=('min_temp', 'min'),
+        humidity=('humidity', 'mean'),
+        wind_speed=('wind_speed', 'max'),
+        weather_code=('weather_code', 'first'),
+    )
+    summary['weather_code'] = summary['weather_code'].fillna(0)
+    # float64 so rounded values print as e.g. 40.1, not 40.099998
+    summary = summary.astype(np.float64).round(1)
+    if 'Village Name' in villages:
+        summary['hottest_village'] = villages.loc[grouped['max_temp'].idxmax(), 'Village Name'].to_numpy()
+    return summary.reset_index()